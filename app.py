@@ -1,8 +1,14 @@
 #!/usr/bin/env python3
 """
 Aplicación web para crear videos a partir de imágenes y audio.
+
+El stack de render (MoviePy, PIL, NumPy y los módulos del pipeline) se importa
+dentro de las funciones que renderizan: un proceso que solo sirve páginas,
+estado o marca de agua arranca sin cargarlo.
 """
 
+from __future__ import annotations
+
 import os
 import sys
 import subprocess
@@ -46,7 +52,6 @@ def check_nvenc_available() -> bool:
         return False
 
 SYSTEM_FFMPEG = shutil.which('ffmpeg')
-NVENC_AVAILABLE = check_nvenc_available()
 
 # Forzar MoviePy/imageio a usar el FFmpeg del sistema ANTES de importar
 if SYSTEM_FFMPEG:
@@ -61,31 +66,48 @@ if os.path.exists(WSL_LIB_PATH):
     print(f"LD_LIBRARY_PATH configurado para CUDA: {os.environ['LD_LIBRARY_PATH']}")
 
 print(f"FFmpeg: {SYSTEM_FFMPEG}")
-print(f"NVENC disponible: {NVENC_AVAILABLE}")
 # === FIN CONFIGURACIÓN FFMPEG ===
 
 import uuid
 import json
 import threading
-import re
 from pathlib import Path
 from flask import Flask, request, jsonify, send_file, render_template, Response
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
-from moviepy import (
-    ImageClip,
-    AudioFileClip,
-    CompositeVideoClip,
-    concatenate_videoclips,
-    TextClip,
-    ColorClip,
-)
-from moviepy.video.fx import CrossFadeIn, CrossFadeOut, FadeIn, FadeOut, SlideIn, SlideOut
-from PIL import ImageFont
-from functools import lru_cache
+from functools import lru_cache, partial
 import multiprocessing
-import time as time_module
-from proglog import ProgressBarLogger
+from timeline import (
+    build_timeline,
+    dirty_intervals,
+    keyframe_frames,
+    align_to_keyframes,
+    render_segments,
+    total_frames,
+    hold_frame_keys,
+    typewriter_steps,
+    SUBTITLE_TYPEWRITER_RATIO,
+    SUBTITLE_MAX_STEPS,
+)
+from media_probe import probe_media
+from instrumentation import METRICS, stage
+from profiling import SamplingProfiler
+from render_cache import RenderCache, render_key
+from render_spec import AssetStore, SpecError, merge_spec, resolve_spec, spec_hash
+from subtitle_parser import CueIndex, parse_subtitles
+from watermark import WATERMARK_FILE, WATERMARK_WORKERS, preload_watermark, stream_watermark, watermark_audio
+from concurrent.futures import ThreadPoolExecutor
+import zipfile
+import io
+import hmac
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    # Solo para las anotaciones: los renders importan el stack pesado al ejecutarse
+    import numpy as np
+    from moviepy import VideoClip
+    from PIL import ImageFont
+    from slideshow import FrameCache
 
 app = Flask(__name__, static_folder='static', template_folder='templates')
 
@@ -95,83 +117,13 @@ class JobCancelledException(Exception):
     pass
 
 
-class JobProgressLogger(ProgressBarLogger):
-    """Logger personalizado que actualiza el progreso del job con información detallada de moviepy."""
-
-    def __init__(self, job_id: str, jobs_dict: dict, cancel_event: threading.Event = None,
-                 base_progress: int = 80, max_progress: int = 95):
-        super().__init__()
-        self.job_id = job_id
-        self.jobs_dict = jobs_dict
-        self.cancel_event = cancel_event
-        self.base_progress = base_progress
-        self.max_progress = max_progress
-        self.start_time = None
-        self.current_bar_total = 0
-
-    def bars_callback(self, bar, attr, value, old_value=None):
-        """Callback llamado cuando hay cambios en las barras de progreso."""
-        # Verificar cancelación
-        if self.cancel_event and self.cancel_event.is_set():
-            raise JobCancelledException("Trabajo cancelado por el usuario")
-
-        super().bars_callback(bar, attr, value, old_value)
-
-        # Solo procesar la barra de frames
-        if bar != 'frame_index':
-            return
-
-        # Obtener información de la barra actual
-        bar_state = self.state.get('bars', {}).get(bar, {})
-        current = bar_state.get('index', 0)
-        total = bar_state.get('total', 0)
-
-        if attr == 'total' and value:
-            self.current_bar_total = value
-            self.start_time = time_module.time()
-            return
-
-        if attr == 'index' and self.current_bar_total > 0:
-            current = value
-            total = self.current_bar_total
-
-            render_progress = current / total if total > 0 else 0
-            actual_progress = self.base_progress + int(render_progress * (self.max_progress - self.base_progress))
-
-            # Calcular velocidad (frames por segundo)
-            elapsed = time_module.time() - self.start_time if self.start_time else 1
-            fps_speed = current / elapsed if elapsed > 0 else 0
-
-            # Calcular tiempo restante
-            remaining_frames = total - current
-            eta = remaining_frames / fps_speed if fps_speed > 0 else 0
-            eta_min = int(eta // 60)
-            eta_sec = int(eta % 60)
-
-            # Crear barra de progreso visual
-            bar_width = 20
-            filled = int(bar_width * render_progress)
-            progress_bar = '█' * filled + '░' * (bar_width - filled)
-
-            # Actualizar mensaje con información detallada
-            message = f"Renderizando: {current}/{total} [{progress_bar}] {render_progress*100:.0f}% | {fps_speed:.1f} fps | ETA: {eta_min}:{eta_sec:02d}"
-
-            self.jobs_dict[self.job_id]['progress'] = actual_progress
-            self.jobs_dict[self.job_id]['message'] = message
-            self.jobs_dict[self.job_id]['render_info'] = {
-                'current_frame': current,
-                'total_frames': total,
-                'fps_speed': round(fps_speed, 2),
-                'eta_seconds': round(eta, 1),
-                'percent': round(render_progress * 100, 1),
-            }
-
-
 # Cache de fuentes PIL para evitar cargarlas repetidamente
 _font_cache = {}
 
 def get_cached_font(font_path: str, font_size: int) -> ImageFont.FreeTypeFont:
     """Obtiene una fuente del cache o la carga si no existe."""
+    from PIL import ImageFont
+
     key = (font_path, font_size)
     if key not in _font_cache:
         try:
@@ -182,6 +134,29 @@ def get_cached_font(font_path: str, font_size: int) -> ImageFont.FreeTypeFont:
 
 # Número óptimo de threads para FFmpeg
 FFMPEG_THREADS = max(4, multiprocessing.cpu_count())
+
+# Token de administración (cabecera X-Admin-Token) para perfilar trabajos;
+# sin token configurado el perfilado queda deshabilitado
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+
+# Presupuesto de memoria por render (ventana activa de frames), en MB; 0 = sin límite
+RENDER_MEMORY_BUDGET_MB = int(os.environ.get('RENDER_MEMORY_BUDGET_MB', 1024))
+
+# Renders simultáneos de los lotes (el resto espera turno en el pool)
+RENDER_WORKERS = int(os.environ.get('RENDER_WORKERS', 2))
+
+# Tamaño máximo del cache de videos terminados, en MB; 0 = sin cache
+RENDER_CACHE_MB = int(os.environ.get('RENDER_CACHE_MB', 2048))
+
+# Bitrate del audio cuando hay que convertirlo a AAC al combinar
+AUDIO_BITRATE = os.environ.get('AUDIO_BITRATE', '128k')
+
+# Códecs de audio que se copian al MP4 sin re-codificar
+AUDIO_COPY_CODECS = {'aac'}
+
+# Duración fija del GOP en segundos. Los keyframes caen siempre en múltiplos de
+# este valor, lo que permite reemplazar tramos del video sin re-codificar el resto.
+GOP_SECONDS = 2
 CORS(app)
 
 # Configuración
@@ -190,6 +165,12 @@ UPLOAD_FOLDER.mkdir(parents=True, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = str(UPLOAD_FOLDER)
 app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB máximo
 
+# Archivos subidos una vez y referenciados por hash desde las specs
+asset_store = AssetStore(UPLOAD_FOLDER / 'assets')
+
+# Videos terminados por clave de render (pedidos idénticos no se re-renderizan)
+render_cache = RenderCache(UPLOAD_FOLDER / 'render_cache', RENDER_CACHE_MB * 1024 * 1024)
+
 # Almacén de progreso de trabajos
 jobs = {}
 
@@ -255,36 +236,6 @@ FONTS = {
 }
 
 
-def parse_srt(srt_path: str) -> list[dict]:
-    """Parsea un archivo de subtítulos .srt"""
-    subtitles = []
-
-    with open(srt_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-
-    pattern = r'(\d+)\s*\n(\d{2}):(\d{2}):(\d{2})[,.](\d{3})\s*-->\s*(\d{2}):(\d{2}):(\d{2})[,.](\d{3})\s*\n(.*?)(?=\n\n|\n*$)'
-    matches = re.findall(pattern, content, re.DOTALL)
-
-    for match in matches:
-        start_h, start_m, start_s, start_ms = int(match[1]), int(match[2]), int(match[3]), int(match[4])
-        end_h, end_m, end_s, end_ms = int(match[5]), int(match[6]), int(match[7]), int(match[8])
-
-        start_time = start_h * 3600 + start_m * 60 + start_s + start_ms / 1000
-        end_time = end_h * 3600 + end_m * 60 + end_s + end_ms / 1000
-
-        text = re.sub(r'<[^>]+>', '', match[9].strip())
-        text = text.replace('\n', ' ')
-
-        subtitles.append({
-            'start': start_time,
-            'end': end_time,
-            'text': text
-        })
-
-    return subtitles
-
-
-
 def wrap_text(text: str, font_size: int, width: int, font_path: str) -> str:
     """
     Envuelve el texto para que quepan palabras completas sin partir.
@@ -334,408 +285,395 @@ def wrap_text(text: str, font_size: int, width: int, font_path: str) -> str:
     return '\n'.join(lines)
 
 
-def create_subtitle_clips(
-    subtitles: list[dict],
+def render_subtitle_sprite(text: str, resolution: tuple[int, int], font_size: int, font_color: str,
+                           stroke_color: str, stroke_width: int, font_path: str) -> tuple[np.ndarray, np.ndarray]:
+    """Rasteriza el texto de un subtítulo (envuelto por palabras) como sprite rgb + alfa."""
+    from moviepy import TextClip
+    from title_cards import clip_sprite
+
+    wrapped_text = wrap_text(text, font_size, resolution[0] - 80, font_path)
+
+    txt_clip = TextClip(
+        text=wrapped_text,
+        font_size=font_size,
+        color=font_color,
+        stroke_color=stroke_color,
+        stroke_width=stroke_width,
+        font=font_path,
+        method='caption',
+        size=(resolution[0] - 80, None),
+        text_align='center',
+        margin=(stroke_width + 10, stroke_width + int(font_size * 0.3)),
+    )
+    return clip_sprite(txt_clip)
+
+
+def create_subtitle_overlay(
+    video,
+    cues: list,
     resolution: tuple[int, int],
     font_size: int = 75,
     font_color: str = 'white',
     stroke_color: str = 'black',
     stroke_width: int = 2,
     font_path: str = '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf',
-    typewriter_ratio: float = 0.7,
-    max_clips_per_subtitle: int = 30,
+    typewriter_ratio: float = SUBTITLE_TYPEWRITER_RATIO,
+    max_clips_per_subtitle: int = SUBTITLE_MAX_STEPS,
     typewriter_enabled: bool = True,
     position: str = 'center',
-) -> list:
+) -> VideoClip:
     """
-    Crea clips de texto para cada subtítulo con efecto typewriter optimizado.
+    Dibuja los subtítulos sobre el video con efecto typewriter optimizado.
 
-    Optimización: En lugar de crear un clip por cada caracter, agrupa caracteres
-    para crear un máximo de max_clips_per_subtitle clips por subtítulo.
-    Esto reduce dramáticamente el uso de memoria y tiempo de composición.
+    Cada paso del typewriter de un subtítulo es una capa (inicio, fin, texto
+    parcial). En lugar de componer un clip por capa, el índice de subtítulos
+    da en cada instante los pocos subtítulos activos (varios si se superponen)
+    y una búsqueda binaria el paso de cada uno; solo esas capas se mezclan
+    sobre el frame. El texto de cada capa se rasteriza una sola vez, al llegar
+    a ella; el costo por frame no depende de la cantidad de subtítulos ni de pasos.
 
     Si typewriter_enabled=False, muestra el texto completo de una vez.
     """
-    subtitle_clips = []
-
-    for sub in subtitles:
-        duration = sub['end'] - sub['start']
-        text = sub['text']
-
-        if not text:
-            continue
-
-        # Si el efecto typewriter está deshabilitado, crear un solo clip
-        if not typewriter_enabled:
-            wrapped_text = wrap_text(text, font_size, resolution[0] - 80, font_path)
-
-            txt_clip = TextClip(
-                text=wrapped_text,
-                font_size=font_size,
-                color=font_color,
-                stroke_color=stroke_color,
-                stroke_width=stroke_width,
-                font=font_path,
-                method='caption',
-                size=(resolution[0] - 80, None),
-                text_align='center',
-                margin=(stroke_width + 10, stroke_width + int(font_size * 0.3)),
-            )
-
-            txt_clip = txt_clip.with_duration(duration)
-            txt_clip = txt_clip.with_start(sub['start'])
-            if position == 'bottom':
-                txt_clip = txt_clip.with_position(('center', resolution[1] - txt_clip.h - 50))
-            else:
-                txt_clip = txt_clip.with_position('center')
-
-            subtitle_clips.append(txt_clip)
-            continue
-
-        # Efecto typewriter habilitado
-        typewriter_duration = duration * typewriter_ratio
-        hold_duration = duration * (1 - typewriter_ratio)
+    from bisect import bisect_right
 
-        # Optimización: calcular el paso óptimo de caracteres
-        # En lugar de crear un clip por caracter, agrupamos para limitar clips
-        num_chars = len(text)
-        char_step = max(1, num_chars // max_clips_per_subtitle)
+    import numpy as np
+    from moviepy import VideoClip
+    from title_cards import blit
 
-        # Crear lista de posiciones donde crearemos clips
-        # Siempre incluimos el último caracter para mostrar el texto completo
-        positions = list(range(char_step, num_chars, char_step))
-        if not positions or positions[-1] != num_chars:
-            positions.append(num_chars)
+    width, height = resolution
 
-        time_per_step = typewriter_duration / len(positions) if positions else typewriter_duration
-
-        for idx, char_pos in enumerate(positions):
-            partial_text = text[:char_pos]
-            # Envolver el texto parcial para evitar que se corten palabras
-            wrapped_partial = wrap_text(partial_text, font_size, resolution[0] - 80, font_path)
-
-            is_last = (idx == len(positions) - 1)
-            if is_last:
-                clip_duration = time_per_step + hold_duration
-            else:
-                clip_duration = time_per_step
-
-            txt_clip = TextClip(
-                text=wrapped_partial,
-                font_size=font_size,
-                color=font_color,
-                stroke_color=stroke_color,
-                stroke_width=stroke_width,
-                font=font_path,
-                method='caption',
-                size=(resolution[0] - 80, None),
-                text_align='center',
-                margin=(stroke_width + 10, stroke_width + int(font_size * 0.3)),
-            )
+    # Pasos de cada subtítulo: (inicio, fin, caracteres visibles)
+    steps = []
+    for cue in cues:
+        if not cue.text:
+            steps.append([])
+        elif typewriter_enabled:
+            steps.append(typewriter_steps(cue.text, cue.start, cue.end, typewriter_ratio, max_clips_per_subtitle))
+        else:
+            steps.append([(cue.start, cue.end, len(cue.text))])
+    step_starts = [[start for start, _, _ in cue_steps] for cue_steps in steps]
+
+    index = CueIndex(cues)
+
+    # Sprites de las capas activas, por (subtítulo, paso); las que terminan se descartan
+    sprites = {}
+
+    def active_layers(t):
+        active = []
+        for cue_idx in index.active(t):
+            step = bisect_right(step_starts[cue_idx], t) - 1
+            if step >= 0 and t < steps[cue_idx][step][1]:
+                active.append((cue_idx, step))
+        return active
+
+    def frame_function(t):
+        frame = video.get_frame(t)
+        active = active_layers(t)
+        if not active:
+            return frame
+
+        for key in [key for key in sprites if key not in active]:
+            del sprites[key]
+
+        # El frame base puede ser de solo lectura o un buffer reutilizado
+        frame = np.array(frame, dtype=np.uint8)
+        for layer in active:
+            if layer not in sprites:
+                cue_idx, step = layer
+                chars = steps[cue_idx][step][2]
+                sprites[layer] = render_subtitle_sprite(
+                    cues[cue_idx].text[:chars], resolution, font_size, font_color,
+                    stroke_color, stroke_width, font_path
+                )
+            rgb, alpha = sprites[layer]
 
-            txt_clip = txt_clip.with_duration(clip_duration)
-            start_time = sub['start'] + idx * time_per_step
-            txt_clip = txt_clip.with_start(start_time)
+            x = (width - rgb.shape[1]) // 2
             if position == 'bottom':
-                txt_clip = txt_clip.with_position(('center', resolution[1] - txt_clip.h - 50))
+                y = height - rgb.shape[0] - 50
             else:
-                txt_clip = txt_clip.with_position('center')
+                y = (height - rgb.shape[0]) // 2
+            blit(frame, rgb, alpha, x, y)
+        return frame
 
-            subtitle_clips.append(txt_clip)
+    return VideoClip(frame_function, duration=video.duration)
 
-    return subtitle_clips
 
+def video_encode_params(fps: int) -> list[str]:
+    """Parámetros de x264 comunes a todos los renders (GOP fijo, sin B-frames ni scenecut)."""
+    gop = max(1, int(fps * GOP_SECONDS))
+    return [
+        "-crf", "32",
+        "-tune", "zerolatency",
+        "-pix_fmt", "yuv420p",
+        "-bf", "0",
+        "-g", str(gop),
+        "-keyint_min", str(gop),
+        "-sc_threshold", "0",
+    ]
 
-def hex_to_rgb(hex_color: str) -> tuple[int, int, int]:
-    """Convierte un color hexadecimal a RGB."""
-    hex_color = hex_color.lstrip('#')
-    return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
 
+def mux_audio_params(audio_path: str) -> list[str]:
+    """
+    Codificación del audio al combinarlo con el video: se copia tal cual si el
+    códec ya es válido en MP4 (sin re-codificar ni perder calidad) y si no se
+    convierte a AAC con AUDIO_BITRATE.
+    """
+    if probe_media(audio_path)['codec'] in AUDIO_COPY_CODECS:
+        return ["-c:a", "copy"]
+    return ["-c:a", "aac", "-b:a", AUDIO_BITRATE]
 
-def create_title_clip(config: dict, resolution: tuple[int, int]) -> CompositeVideoClip:
-    """Crea un clip de título (intro/outro) con fondo de color o imagen y animaciones."""
-    duration = config['duration']
-    animation_in = config.get('animation_in', 'none')
-    animation_out = config.get('animation_out', 'none')
-    animation_duration = min(1.0, duration / 3)  # Duracion de animacion: 1s o 1/3 del total
 
-    # Crear fondo (imagen o color)
-    if config.get('bg_image') and Path(config['bg_image']).exists():
-        # Usar imagen de fondo
-        bg_clip = ImageClip(config['bg_image'], duration=duration)
+def encoder_profile(fps: int) -> dict:
+    """Parámetros del codificador que definen el video final (parte de la clave del cache)."""
+    return {
+        'video': video_encode_params(fps),
+        'audio': {'copy': sorted(AUDIO_COPY_CODECS), 'bitrate': AUDIO_BITRATE},
+    }
 
-        # Redimensionar para cubrir la resolución
-        img_ratio = bg_clip.w / bg_clip.h
-        target_ratio = resolution[0] / resolution[1]
 
-        if img_ratio > target_ratio:
-            bg_clip = bg_clip.resized(height=resolution[1])
-        else:
-            bg_clip = bg_clip.resized(width=resolution[0])
+def with_hold_frames(clip, timeline: dict):
+    """
+    Compone cada frame distinto una sola vez.
 
-        bg_clip = bg_clip.with_position(("center", "center"))
+    Usa la línea de tiempo (sin comparar píxeles) para saber qué frames son
+    idénticos al anterior, como una imagen fija con el mismo subtítulo entre
+    dos transiciones; esos frames reutilizan el último frame compuesto, ya
+    convertido a uint8, y se envían al encoder sin volver a componer.
+    También descarta la máscara del clip final, que el video opaco no usa.
+    """
+    import numpy as np
+
+    key_at = hold_frame_keys(timeline)
+    get_frame = clip.get_frame
+    last = {'key': None, 'frame': None}
+
+    def frame_function(t):
+        key = key_at(t)
+        if key != last['key'] or last['frame'] is None:
+            last['frame'] = np.ascontiguousarray(get_frame(t), dtype=np.uint8)
+            last['key'] = key
+        return last['frame']
+
+    return clip.with_updated_frame_function(frame_function).without_mask()
+
+
+def write_video_segment(clip, path: str, fps: int, logger) -> None:
+    """Exporta un clip sin audio con los parámetros de codificación comunes."""
+    clip.write_videofile(
+        path,
+        fps=fps,
+        codec="libx264",
+        audio=False,  # Sin audio = mucho más rápido
+        threads=FFMPEG_THREADS,
+        preset="ultrafast",
+        logger=logger,
+        ffmpeg_params=video_encode_params(fps),
+    )
 
-        # Crear clip de fondo negro para asegurar que cubra todo
-        black_bg = ColorClip(size=resolution, color=(0, 0, 0), duration=duration)
-        bg_clip = CompositeVideoClip([black_bg, bg_clip], size=resolution).with_duration(duration)
-    else:
-        # Usar color de fondo
-        bg_color = hex_to_rgb(config['bg_color'])
-        bg_clip = ColorClip(size=resolution, color=bg_color, duration=duration)
 
-    # Manejar animacion typewriter
-    if animation_in == 'typewriter':
-        return create_typewriter_title_clip(config, resolution, bg_clip, animation_out, animation_duration)
+def write_still_segment(frame: np.ndarray, frame_count: int, path: str, fps: int) -> None:
+    """Codifica un frame fijo repetido `frame_count` veces, sin pasar por MoviePy."""
+    from PIL import Image
 
-    # Crear texto base
-    txt_clip = TextClip(
-        text=config['text'],
-        font_size=config['font_size'],
-        color=config['font_color'],
-        font=config['font_path'],
-        method='caption',
-        size=(resolution[0] - 100, None),
-        text_align='center',
-        margin=(10, int(config['font_size'] * 0.3)),
-    )
-    txt_clip = txt_clip.with_duration(duration)
-    txt_clip = txt_clip.with_position('center')
-
-    # Aplicar animaciones de entrada
-    txt_clip = apply_text_animation_in(txt_clip, animation_in, animation_duration, resolution)
-
-    # Aplicar animaciones de salida
-    txt_clip = apply_text_animation_out(txt_clip, animation_out, animation_duration, duration, resolution)
-
-    # Componer
-    return CompositeVideoClip([bg_clip, txt_clip], size=resolution).with_duration(duration)
-
-
-def apply_text_animation_in(clip, animation_type: str, anim_duration: float, resolution: tuple[int, int]):
-    """Aplica animacion de entrada al clip de texto."""
-    if animation_type == 'none':
-        return clip
-    elif animation_type == 'fade':
-        return clip.with_effects([FadeIn(anim_duration)])
-    elif animation_type == 'slide_left':
-        return clip.with_effects([SlideIn(anim_duration, 'left')])
-    elif animation_type == 'slide_right':
-        return clip.with_effects([SlideIn(anim_duration, 'right')])
-    elif animation_type == 'slide_top':
-        return clip.with_effects([SlideIn(anim_duration, 'top')])
-    elif animation_type == 'slide_bottom':
-        return clip.with_effects([SlideIn(anim_duration, 'bottom')])
-    elif animation_type == 'zoom':
-        # Zoom in: empezar pequeño y crecer
-        def zoom_in_func(t):
-            if t < anim_duration:
-                scale = 0.3 + (0.7 * t / anim_duration)
-            else:
-                scale = 1.0
-            return scale
-
-        return clip.resized(zoom_in_func)
-    return clip
-
-
-def apply_text_animation_out(clip, animation_type: str, anim_duration: float, total_duration: float, resolution: tuple[int, int]):
-    """Aplica animacion de salida al clip de texto."""
-    if animation_type == 'none':
-        return clip
-    elif animation_type == 'fade':
-        return clip.with_effects([FadeOut(anim_duration)])
-    elif animation_type == 'slide_left':
-        return clip.with_effects([SlideOut(anim_duration, 'left')])
-    elif animation_type == 'slide_right':
-        return clip.with_effects([SlideOut(anim_duration, 'right')])
-    elif animation_type == 'slide_top':
-        return clip.with_effects([SlideOut(anim_duration, 'top')])
-    elif animation_type == 'slide_bottom':
-        return clip.with_effects([SlideOut(anim_duration, 'bottom')])
-    elif animation_type == 'zoom':
-        # Zoom out: terminar pequeño
-        start_out = total_duration - anim_duration
-
-        def zoom_out_func(t):
-            if t > start_out:
-                progress = (t - start_out) / anim_duration
-                scale = 1.0 - (0.7 * progress)
-            else:
-                scale = 1.0
-            return scale
+    png_path = path.replace('.mp4', '_still.png')
+    Image.fromarray(frame).save(png_path)
+    try:
+        subprocess.run(
+            [SYSTEM_FFMPEG, '-y', '-loop', '1', '-framerate', str(fps), '-i', png_path,
+             '-frames:v', str(frame_count), '-an',
+             '-c:v', 'libx264', '-preset', 'ultrafast', '-threads', str(FFMPEG_THREADS)]
+            + video_encode_params(fps) + [path],
+            check=True, capture_output=True
+        )
+    finally:
+        os.remove(png_path)
 
-        return clip.resized(zoom_out_func)
-    return clip
 
+def clip_window(clip, start_frame: int, end_frame: int, fps: int):
+    """Subclip con exactamente end_frame - start_frame frames en la grilla global de frames."""
+    frame_count = end_frame - start_frame
+    return clip.subclipped(start_frame / fps).with_duration((frame_count + 0.5) / fps)
 
-def create_typewriter_title_clip(config: dict, resolution: tuple[int, int], bg_clip, animation_out: str, anim_duration: float):
-    """Crea un clip de titulo con efecto typewriter."""
-    duration = config['duration']
-    text = config['text']
-    typewriter_ratio = 0.6  # 60% para escribir, 40% para mantener
-    typewriter_duration = duration * typewriter_ratio
-    hold_duration = duration * (1 - typewriter_ratio)
-    time_per_char = typewriter_duration / len(text)
 
-    text_clips = []
-    for i in range(1, len(text) + 1):
-        partial_text = text[:i]
+def concat_video(entries: list[tuple[str, float | None, float | None]], output_path: str) -> None:
+    """
+    Concatena videos (o tramos de ellos) sin re-codificar.
 
-        if i < len(text):
-            clip_duration = time_per_char
-        else:
-            clip_duration = time_per_char + hold_duration
-
-        txt_clip = TextClip(
-            text=partial_text,
-            font_size=config['font_size'],
-            color=config['font_color'],
-            font=config['font_path'],
-            method='caption',
-            size=(resolution[0] - 100, None),
-            text_align='center',
-            margin=(10, int(config['font_size'] * 0.3)),
+    Cada entrada es (ruta, inpoint, outpoint) en segundos; None usa el archivo
+    completo. Usa el demuxer concat de ffmpeg, así que los inpoint deben
+    coincidir con keyframes y todos los tramos deben tener la misma codificación.
+    """
+    lines = []
+    for path, inpoint, outpoint in entries:
+        lines.append("file '{}'".format(path.replace("'", "'\\''")))
+        if inpoint is not None:
+            lines.append(f"inpoint {inpoint}")
+        if outpoint is not None:
+            lines.append(f"outpoint {outpoint}")
+
+    list_path = output_path.replace('.mp4', '_concat.txt')
+    with open(list_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+
+    try:
+        subprocess.run(
+            [SYSTEM_FFMPEG, '-y', '-f', 'concat', '-safe', '0', '-i', list_path, '-c', 'copy', output_path],
+            check=True, capture_output=True
         )
-        txt_clip = txt_clip.with_duration(clip_duration)
-        start_time = (i - 1) * time_per_char
-        txt_clip = txt_clip.with_start(start_time)
-        txt_clip = txt_clip.with_position('center')
-
-        # Aplicar animacion de salida solo al ultimo clip
-        if i == len(text) and animation_out != 'none':
-            txt_clip = apply_text_animation_out(txt_clip, animation_out, anim_duration, clip_duration, resolution)
-
-        text_clips.append(txt_clip)
-
-    return CompositeVideoClip([bg_clip] + text_clips, size=resolution).with_duration(duration)
-
-
-def get_transition_effects(transition_type: str, transition_duration: float, resolution: tuple[int, int]):
-    """Retorna los efectos de transición según el tipo seleccionado."""
-    effects = []
-    needs_overlap = False
-
-    if transition_type == 'crossfade':
-        effects = [CrossFadeIn(transition_duration), CrossFadeOut(transition_duration)]
-        needs_overlap = True
-    elif transition_type == 'fade':
-        effects = [FadeIn(transition_duration), FadeOut(transition_duration)]
-        needs_overlap = True
-    elif transition_type == 'fadein':
-        effects = [FadeIn(transition_duration)]
-        needs_overlap = False
-    elif transition_type == 'fadeout':
-        effects = [FadeOut(transition_duration)]
-        needs_overlap = False
-    elif transition_type == 'slide_left':
-        effects = [SlideIn(transition_duration, 'right'), SlideOut(transition_duration, 'left')]
-        needs_overlap = True
-    elif transition_type == 'slide_right':
-        effects = [SlideIn(transition_duration, 'left'), SlideOut(transition_duration, 'right')]
-        needs_overlap = True
-    elif transition_type == 'slide_up':
-        effects = [SlideIn(transition_duration, 'bottom'), SlideOut(transition_duration, 'top')]
-        needs_overlap = True
-    elif transition_type == 'slide_down':
-        effects = [SlideIn(transition_duration, 'top'), SlideOut(transition_duration, 'bottom')]
-        needs_overlap = True
-    # 'none' o cualquier otro valor no agrega efectos
-
-    return effects, needs_overlap
+    finally:
+        os.remove(list_path)
 
 
 def process_video(job_id: str, images: list[str], audio_path: str, srt_path: str = None,
                   resolution: tuple[int, int] = (1080, 1920), transition_type: str = 'crossfade',
                   transition_duration: float = 0.5, fps: int = 4, subtitle_config: dict = None,
                   intro_config: dict = None, outro_config: dict = None,
-                  cancel_event: threading.Event = None):
-    """Procesa el video en un hilo separado."""
-    temp_video_path = None
-    audio = None
+                  cancel_event: threading.Event = None, previous_render: dict = None,
+                  motion: str = 'none', motion_quality: str = 'balanced', timing_mode: str = 'even',
+                  frame_cache: FrameCache = None, memory_budget_mb: int = None,
+                  keep_video_file: bool = False):
+    """
+    Procesa el video en un hilo separado.
+
+    Si se pasa `previous_render` (línea de tiempo y video sin audio de un render
+    anterior), solo se re-renderizan los intervalos que cambiaron y se empalman
+    en el video anterior. `motion` aplica un movimiento Ken Burns a las imágenes
+    ('none', 'auto' o un preset de motion.KEN_BURNS_PRESETS). Con
+    `timing_mode='beats'` las imágenes cambian sobre los beats de la canción en
+    lugar de repartirse en partes iguales. `frame_cache` comparte las imágenes
+    preprocesadas con otros renders del mismo lote.
+
+    Las imágenes se cargan justo antes de su slot y se liberan al terminar
+    (FrameWindow); `memory_budget_mb` (por defecto RENDER_MEMORY_BUDGET_MB)
+    limita la memoria de esa ventana y se informa en jobs[job_id]['memory'].
+
+    El video sin audio se elimina al terminar; con `keep_video_file` queda en
+    jobs[job_id]['video_file'] (junto a 'timeline') y quien llama lo elimina.
+    """
+    from moviepy import concatenate_videoclips
+    from audio_analysis import analyze_audio, beat_cut_points
+    from frame_store import FrameStore
+    from motion import slot_motion
+    from progress_logger import JobProgressLogger
+    from slideshow import FrameWindow, MemoryBudgetExceeded, estimate_window_bytes, prepare_frame, make_slideshow_clip
+    from title_cards import make_title_clip
+    from transitions import get_transition
+
+    video_only_path = None
+    frames = None
+    store = None
+    segment_paths = []
     video = None
-    clips = []
 
     def check_cancelled():
         """Verifica si el trabajo fue cancelado."""
         if cancel_event and cancel_event.is_set():
             raise JobCancelledException("Trabajo cancelado por el usuario")
 
+    def remove_temp_files():
+        """Elimina el video sin audio, los tramos parciales y el almacén de frames."""
+        for path in [video_only_path, jobs[job_id].get('frame_store')] + segment_paths:
+            if path and os.path.exists(path):
+                try:
+                    os.remove(path)
+                except Exception:
+                    pass
+
     try:
         jobs[job_id]['status'] = 'processing'
         jobs[job_id]['progress'] = 0
         jobs[job_id]['message'] = 'Iniciando procesamiento...'
 
         output_path = str(UPLOAD_FOLDER / f'{job_id}_output.mp4')
-        temp_video_path = output_path.replace('.mp4', '_temp_video.mp4')
+        video_only_path = output_path.replace('.mp4', '_video.mp4')
 
         check_cancelled()
 
-        # Cargar audio
-        jobs[job_id]['message'] = 'Cargando audio...'
-        jobs[job_id]['progress'] = 5
-        audio = AudioFileClip(audio_path)
-        total_duration = audio.duration
-
-        duration_per_image = total_duration / len(images)
-
-        # Obtener efectos de transición
-        effects, needs_overlap = get_transition_effects(transition_type, transition_duration, resolution)
+        # Leer la duración del audio (solo la cabecera: el audio se decodifica al combinar)
+        with stage(jobs[job_id], 'audio'):
+            jobs[job_id]['message'] = 'Cargando audio...'
+            jobs[job_id]['progress'] = 5
+            total_duration = probe_media(audio_path)['duration']
+
+        # Obtener transición (kernel vectorizado)
+        transition = get_transition(transition_type)
+        needs_overlap = bool(transition and transition['overlap'])
+
+        sub_cfg = subtitle_config or {}
+
+        # Cortes sobre los beats (el análisis se reutiliza si la canción ya se analizó)
+        cut_points = None
+        if timing_mode == 'beats' and len(images) > 1:
+            with stage(jobs[job_id], 'beats'):
+                jobs[job_id]['message'] = 'Analizando ritmo de la canción...'
+                jobs[job_id]['progress'] = 7
+                analysis = analyze_audio(audio_path)
+                min_gap = min(transition_duration * 2 + 1 / fps, total_duration / len(images) / 2)
+                cut_points = beat_cut_points(analysis['beats'], total_duration, len(images), min_gap)
+                jobs[job_id]['tempo'] = analysis['tempo']
+                jobs[job_id]['beats'] = len(analysis['beats'])
+
+        # Línea de tiempo del render (permite comparar con renders anteriores)
+        with stage(jobs[job_id], 'timeline'):
+            subtitles = parse_subtitles(srt_path) if srt_path and Path(srt_path).exists() else []
+            timeline = build_timeline(
+                images, total_duration, resolution, fps, transition_type, transition_duration,
+                needs_overlap, transition is not None, subtitles, sub_cfg, intro_config, outro_config,
+                motions=[slot_motion(motion, i, motion_quality) for i in range(len(images))],
+                cut_points=cut_points,
+            )
 
         check_cancelled()
 
-        # Crear clips de imágenes
-        for i, image_path in enumerate(images):
-            check_cancelled()
-
-            progress = 10 + int((i / len(images)) * 50)
-            jobs[job_id]['progress'] = progress
-            jobs[job_id]['message'] = f'Procesando imagen {i + 1}/{len(images)}...'
-
-            clip = ImageClip(image_path, duration=duration_per_image)
-
-            img_ratio = clip.w / clip.h
-            target_ratio = resolution[0] / resolution[1]
-
-            if img_ratio > target_ratio:
-                clip = clip.resized(height=resolution[1])
-            else:
-                clip = clip.resized(width=resolution[0])
-
-            clip = clip.with_position(("center", "center"))
-
-            if effects and transition_duration > 0 and duration_per_image > transition_duration * 2:
-                clip = clip.with_effects(effects)
-
-            clips.append(clip)
+        # Presupuesto de memoria: la ventana activa estimada debe caber antes de empezar
+        budget_mb = RENDER_MEMORY_BUDGET_MB if memory_budget_mb is None else memory_budget_mb
+        budget_bytes = budget_mb * 2**20
+        estimated_bytes = estimate_window_bytes(timeline)
+        jobs[job_id]['memory'] = {
+            'budget': budget_bytes,
+            'estimated': estimated_bytes,
+            'peak_window': 0,
+            'peak_rss': 0,
+        }
+        if budget_bytes and estimated_bytes > budget_bytes:
+            raise MemoryBudgetExceeded(
+                f'El render necesita ~{estimated_bytes / 2**20:.0f} MB '
+                f'(presupuesto {budget_mb} MB); use una resolución menor'
+            )
 
-        # Concatenar clips
+        # Preprocesar las imágenes a un almacén de frames mapeado en memoria:
+        # el render (y las vistas previas) leen vistas del archivo, sin copias
+        with stage(jobs[job_id], 'images') as span:
+            def on_image(done, total):
+                check_cancelled()
+                jobs[job_id]['progress'] = 10 + int((done / total) * 50)
+                jobs[job_id]['message'] = f'Procesando imagen {done}/{total}...'
+
+            loader = partial(frame_cache.get if frame_cache is not None else prepare_frame, resolution=resolution)
+            frame_store_path = str(UPLOAD_FOLDER / f'{job_id}_frames.bin')
+            store = FrameStore.build(frame_store_path, images, resolution, loader=loader, on_progress=on_image)
+            jobs[job_id]['frame_store'] = frame_store_path
+            span.frames = len(store.images)
+            span.bytes = store.nbytes
+
+        # La ventana del slideshow toma del almacén solo los slots activos
+        frames = FrameWindow(images, resolution, loader=partial(store.frame, resolution=resolution),
+                             budget_bytes=budget_bytes)
+
+        # Slideshow: cada frame se obtiene del slot activo y su transición
         jobs[job_id]['message'] = 'Concatenando clips...'
         jobs[job_id]['progress'] = 65
 
-        if needs_overlap and transition_duration > 0:
-            final_clips = []
-            current_time = 0
-
-            for clip in clips:
-                clip = clip.with_start(current_time)
-                final_clips.append(clip)
-                current_time += duration_per_image - transition_duration
-
-            video = CompositeVideoClip(final_clips, size=resolution)
-            video = video.with_duration(total_duration)
-        else:
-            video = concatenate_videoclips(clips, method="compose")
+        video = make_slideshow_clip(timeline, frames)
 
         # Agregar subtítulos si existen
-        if srt_path and Path(srt_path).exists():
-            jobs[job_id]['message'] = 'Agregando subtítulos...'
-            jobs[job_id]['progress'] = 70
-            subtitles = parse_srt(srt_path)
-
-            if subtitles:
-                # Configuración de subtítulos
-                sub_cfg = subtitle_config or {}
-                subtitle_clips = create_subtitle_clips(
+        if subtitles:
+            with stage(jobs[job_id], 'subtitles'):
+                jobs[job_id]['message'] = 'Agregando subtítulos...'
+                jobs[job_id]['progress'] = 70
+
+                video = create_subtitle_overlay(
+                    video,
                     subtitles,
                     resolution,
                     font_size=sub_cfg.get('font_size', 75),
@@ -746,134 +684,188 @@ def process_video(job_id: str, images: list[str], audio_path: str, srt_path: str
                     typewriter_enabled=sub_cfg.get('typewriter_enabled', True),
                     position=sub_cfg.get('position', 'center'),
                 )
-                video = CompositeVideoClip([video] + subtitle_clips, size=resolution)
-                video = video.with_duration(total_duration)
 
         check_cancelled()
 
         # Crear clips de intro y outro si están configurados
         # El intro y outro son SILENCIOSOS (sin la canción)
         # Los subtítulos están sincronizados con la canción (que empieza después del intro)
+        # Cada tarjeta se compone de un fondo y un sprite de texto rasterizados una vez
         clips_to_concat = []
+        title_clips = {}
         intro_duration = 0
 
         check_cancelled()
 
-        if intro_config:
-            jobs[job_id]['message'] = 'Creando intro...'
-            jobs[job_id]['progress'] = 77
-            intro_clip = create_title_clip(intro_config, resolution)
-            intro_duration = intro_config['duration']
-            # Intro sin audio (silencioso)
-            clips_to_concat.append(intro_clip)
+        with stage(jobs[job_id], 'titles'):
+            if intro_config:
+                jobs[job_id]['message'] = 'Creando intro...'
+                jobs[job_id]['progress'] = 77
+                title_clips['intro'] = make_title_clip(intro_config, resolution)
+                intro_duration = intro_config['duration']
+                # Intro sin audio (silencioso)
+                clips_to_concat.append(title_clips['intro'])
 
-        clips_to_concat.append(video)
+            clips_to_concat.append(video)
 
-        if outro_config:
-            jobs[job_id]['message'] = 'Creando outro...'
-            jobs[job_id]['progress'] = 78
-            outro_clip = create_title_clip(outro_config, resolution)
-            # Outro sin audio (silencioso)
-            clips_to_concat.append(outro_clip)
+            if outro_config:
+                jobs[job_id]['message'] = 'Creando outro...'
+                jobs[job_id]['progress'] = 78
+                title_clips['outro'] = make_title_clip(outro_config, resolution)
+                # Outro sin audio (silencioso)
+                clips_to_concat.append(title_clips['outro'])
 
-        check_cancelled()
+            check_cancelled()
 
-        # Concatenar intro (silencioso) + video (con audio) + outro (silencioso)
-        if len(clips_to_concat) > 1:
-            jobs[job_id]['message'] = 'Concatenando intro/outro...'
-            jobs[job_id]['progress'] = 79
-            video = concatenate_videoclips(clips_to_concat, method="compose")
+            # Concatenar intro (silencioso) + video (con audio) + outro (silencioso)
+            if len(clips_to_concat) > 1:
+                jobs[job_id]['message'] = 'Concatenando intro/outro...'
+                jobs[job_id]['progress'] = 79
+                video = concatenate_videoclips(clips_to_concat, method="compose")
+
+        # Reutilizar frames idénticos (imagen fija entre transiciones)
+        video = with_hold_frames(video, timeline)
 
         check_cancelled()
 
-        # Exportar video sin audio (más rápido)
-        jobs[job_id]['message'] = 'Iniciando renderizado...'
+        # Tramos que se codifican por separado: intro, canción y outro.
+        # Los títulos sin animación se codifican como frame fijo.
+        segments = render_segments(timeline)
+        still_frames = {
+            segment['kind']: title_clips[segment['kind']].get_frame(0)
+            for segment in segments if segment['still']
+        }
+
+        # Rangos de frames a renderizar: todo, o solo lo que cambió respecto al render anterior
+        dirty = None
+        if previous_render and Path(previous_render['video_file']).exists():
+            dirty = dirty_intervals(previous_render['timeline'], timeline)
+
+        if dirty is None:
+            ranges = [(segment['start'], segment['end']) for segment in segments]
+            jobs[job_id]['message'] = 'Iniciando renderizado...'
+        else:
+            # Re-renderizar solo los tramos afectados, alineados a keyframes
+            keyframes = keyframe_frames(timeline, int(fps * GOP_SECONDS))
+            ranges = align_to_keyframes(dirty, keyframes, fps)
+            dirty_seconds = sum(end - start for start, end in ranges) / fps
+            jobs[job_id]['message'] = (
+                f'Re-renderizando {len(ranges)} tramos ({dirty_seconds:.1f}s de {timeline["duration"]:.1f}s)...'
+            )
         jobs[job_id]['progress'] = 80
 
         # Crear logger personalizado para capturar el progreso real (con soporte de cancelación)
-        progress_logger = JobProgressLogger(job_id, jobs, cancel_event, base_progress=80, max_progress=95)
-
-        video.write_videofile(
-            temp_video_path,
-            fps=fps,
-            codec="libx264",
-            audio=False,  # Sin audio = mucho más rápido
-            threads=FFMPEG_THREADS,
-            preset="ultrafast",
-            logger=progress_logger,
-            ffmpeg_params=[
-                "-crf", "32",
-                "-tune", "zerolatency",
-                "-pix_fmt", "yuv420p",
-                "-bf", "0",
-            ],
-        )
+        progress_logger = JobProgressLogger(job_id, jobs, check_cancelled, base_progress=80, max_progress=95)
+
+        # Cada rango se parte en los límites de los tramos; cada pieza empieza con keyframe
+        pieces = []
+        for start, end in ranges:
+            for segment in segments:
+                piece_start, piece_end = max(start, segment['start']), min(end, segment['end'])
+                if piece_start < piece_end:
+                    pieces.append((piece_start, piece_end, segment))
+
+        with stage(jobs[job_id], 'encode') as span:
+            if dirty is None and len(pieces) == 1 and not pieces[0][2]['still']:
+                # Un solo tramo: exportar directamente el video sin audio (más rápido)
+                write_video_segment(video, video_only_path, fps, progress_logger)
+            else:
+                rendered = []
+                for idx, (start, end, segment) in enumerate(pieces):
+                    check_cancelled()
+                    segment_path = output_path.replace('.mp4', f'_seg{idx}.mp4')
+                    segment_paths.append(segment_path)
+                    if segment['still']:
+                        write_still_segment(still_frames[segment['kind']], end - start, segment_path, fps)
+                    else:
+                        write_video_segment(clip_window(video, start, end, fps), segment_path, fps, progress_logger)
+                    rendered.append((start, end, segment_path))
+
+                # Completar con los tramos sin cambios del video anterior (stream copy)
+                entries = []
+                cursor = 0
+                for start, end, segment_path in rendered:
+                    if start > cursor:
+                        entries.append((previous_render['video_file'], cursor / fps, start / fps))
+                    entries.append((segment_path, None, None))
+                    cursor = end
+                if cursor < total_frames(timeline):
+                    entries.append((previous_render['video_file'], cursor / fps, None))
+
+                concat_video(entries, video_only_path)
+
+                for segment_path in segment_paths:
+                    os.remove(segment_path)
+                segment_paths.clear()
+            span.frames = sum(end - start for start, end, _ in pieces)
+            span.bytes = os.path.getsize(video_only_path)
+        jobs[job_id]['memory']['peak_window'] = frames.peak_bytes
 
         check_cancelled()
 
         # Combinar video + audio con ffmpeg
         # El audio empieza después del intro (con offset)
-        jobs[job_id]['message'] = 'Combinando audio...'
-        jobs[job_id]['progress'] = 95
-
-        ffmpeg_cmd = [
-            SYSTEM_FFMPEG,
-            "-y",
-            "-i", temp_video_path,
-        ]
-
-        # Si hay intro, agregar offset al audio para que empiece después del intro
-        if intro_duration > 0:
-            ffmpeg_cmd.extend(["-itsoffset", str(intro_duration)])
+        with stage(jobs[job_id], 'mux') as span:
+            jobs[job_id]['message'] = 'Combinando audio...'
+            jobs[job_id]['progress'] = 95
+
+            ffmpeg_cmd = [
+                SYSTEM_FFMPEG,
+                "-y",
+                "-i", video_only_path,
+            ]
 
-        ffmpeg_cmd.extend([
-            "-i", audio_path,
-            "-c:v", "copy",  # No re-codifica video
-            "-c:a", "aac",
-            "-movflags", "+faststart",
-            output_path
-        ])
+            # Si hay intro, agregar offset al audio para que empiece después del intro
+            if intro_duration > 0:
+                ffmpeg_cmd.extend(["-itsoffset", str(intro_duration)])
 
-        subprocess.run(ffmpeg_cmd, check=True, capture_output=True)
+            ffmpeg_cmd.extend([
+                "-i", audio_path,
+                "-c:v", "copy",  # No re-codifica video
+                *mux_audio_params(audio_path),
+                "-movflags", "+faststart",
+                output_path
+            ])
 
-        # Eliminar video temporal
-        if temp_video_path and os.path.exists(temp_video_path):
-            os.remove(temp_video_path)
+            subprocess.run(ffmpeg_cmd, check=True, capture_output=True)
+            span.bytes = os.path.getsize(output_path)
 
         # Limpiar
-        if audio:
-            audio.close()
-        for clip in clips:
-            clip.close()
         if video:
             video.close()
+        frames.close()
+        store.close()
+        jobs[job_id]['memory']['peak_rss'] = max(span['peak_rss'] for span in jobs[job_id]['stages'])
 
         jobs[job_id]['status'] = 'completed'
         jobs[job_id]['progress'] = 100
         jobs[job_id]['message'] = 'Video creado exitosamente!'
         jobs[job_id]['output_file'] = output_path
+        jobs[job_id]['timeline'] = timeline
+        if keep_video_file:
+            jobs[job_id]['video_file'] = video_only_path
+        else:
+            os.remove(video_only_path)
+        METRICS.job_finished('completed')
 
     except JobCancelledException:
         # Trabajo cancelado por el usuario
         jobs[job_id]['status'] = 'cancelled'
         jobs[job_id]['message'] = 'Proceso cancelado'
         jobs[job_id]['progress'] = 0
+        METRICS.job_finished('cancelled')
 
         # Limpiar archivos temporales
-        if temp_video_path and os.path.exists(temp_video_path):
-            try:
-                os.remove(temp_video_path)
-            except Exception:
-                pass
+        remove_temp_files()
 
         # Limpiar recursos
         try:
-            if audio:
-                audio.close()
-            for clip in clips:
-                clip.close()
             if video:
                 video.close()
+            if frames is not None:
+                frames.close()
+            if store is not None:
+                store.close()
         except Exception:
             pass
 
@@ -881,32 +873,193 @@ def process_video(job_id: str, images: list[str], audio_path: str, srt_path: str
         jobs[job_id]['status'] = 'error'
         jobs[job_id]['message'] = f'Error: {str(e)}'
         jobs[job_id]['progress'] = 0
+        METRICS.job_finished('error')
 
         # Limpiar archivos temporales en caso de error
-        if temp_video_path and os.path.exists(temp_video_path):
-            try:
-                os.remove(temp_video_path)
-            except Exception:
-                pass
+        remove_temp_files()
 
         # Limpiar recursos
         try:
-            if audio:
-                audio.close()
-            for clip in clips:
-                clip.close()
             if video:
                 video.close()
+            if frames is not None:
+                frames.close()
+            if store is not None:
+                store.close()
         except Exception:
             pass
 
 
+def is_admin() -> bool:
+    """True si el pedido trae el token de administración correcto."""
+    token = request.headers.get('X-Admin-Token', '')
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token, ADMIN_TOKEN)
+
+
+# Argumentos de process_video que no cambian el video producido
+RENDER_RUNTIME_ARGS = {'cancel_event', 'previous_render', 'frame_cache', 'memory_budget_mb', 'keep_video_file'}
+
+
+def render_job(job_id: str, images: list[str], audio_path: str, srt_path: str = None,
+               refresh: bool = False, **kwargs):
+    """
+    Ejecuta process_video pasando por el cache de videos terminados.
+
+    Si ya existe un video con la misma clave (render_key) el trabajo termina al
+    instante con ese video; si otro trabajo está renderizando la misma clave,
+    espera su resultado en lugar de repetir el render. Con `refresh` el video
+    se renderiza siempre (sin buscarlo ni esperar) y el resultado reemplaza
+    al del cache.
+
+    La base para re-renders (línea de tiempo y video sin audio) se guarda solo
+    en el cache, que tiene tamaño máximo: el trabajo conserva su render_key y
+    los archivos intermedios del trabajo se eliminan al terminar.
+    """
+    previous_render = kwargs.get('previous_render')
+    try:
+        cached_render(job_id, images, audio_path, srt_path, refresh, kwargs)
+    finally:
+        discard = [jobs[job_id].pop('video_file', None), previous_render and previous_render['video_file']]
+        jobs[job_id].pop('timeline', None)
+        for path in discard:
+            if path and os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+def cached_render(job_id: str, images: list[str], audio_path: str, srt_path: str | None,
+                  refresh: bool, kwargs: dict):
+    """Cuerpo de render_job: busca o reserva la clave, renderiza y guarda el resultado."""
+    options = {key: value for key, value in kwargs.items() if key not in RENDER_RUNTIME_ARGS}
+    cancel_event = kwargs.get('cancel_event')
+    try:
+        key = render_key(images, audio_path, srt_path, options, encoder_profile(options.get('fps', 4)))
+    except OSError as e:
+        # Sin clave no hay cache; process_video informará el archivo que falta
+        print(f"Render {job_id} sin cache: {e}")
+        process_video(job_id, images, audio_path, srt_path, **kwargs)
+        return
+    jobs[job_id]['render_key'] = key
+
+    def on_wait():
+        jobs[job_id]['message'] = 'Esperando un render idéntico en curso...'
+
+    output_path = str(UPLOAD_FOLDER / f'{job_id}_output.mp4')
+    if refresh:
+        cached, owner = False, False
+    else:
+        cached, owner = render_cache.acquire(key, output_path, cancel_event, on_wait=on_wait)
+    if cached:
+        jobs[job_id]['status'] = 'completed'
+        jobs[job_id]['progress'] = 100
+        jobs[job_id]['message'] = 'Video creado exitosamente!'
+        jobs[job_id]['output_file'] = output_path
+        jobs[job_id]['cached'] = True
+        METRICS.job_finished('completed')
+        return
+    if not owner and not refresh:
+        jobs[job_id]['status'] = 'cancelled'
+        jobs[job_id]['message'] = 'Proceso cancelado'
+        jobs[job_id]['progress'] = 0
+        METRICS.job_finished('cancelled')
+        return
+
+    try:
+        process_video(job_id, images, audio_path, srt_path, keep_video_file=True, **kwargs)
+        if jobs[job_id]['status'] == 'completed':
+            try:
+                render_cache.put(key, jobs[job_id]['output_file'],
+                                 jobs[job_id].get('video_file'), jobs[job_id].get('timeline'))
+            except OSError as e:
+                print(f"Error guardando {job_id} en el cache: {e}")
+    finally:
+        if owner:
+            render_cache.release(key)
+
+
+def render_job_profiled(job_id: str, *args, **kwargs):
+    """
+    Ejecuta render_job bajo el perfilador por muestreo y guarda el perfil
+    junto al video ('<job_id>_profile.collapsed.txt' y '<job_id>_profile.json').
+
+    El video se renderiza aunque ya esté en el cache (el perfil es del render
+    completo) y el resultado se guarda en el cache como cualquier otro.
+    """
+    profiler = SamplingProfiler().start()
+    try:
+        render_job(job_id, *args, refresh=True, **kwargs)
+    finally:
+        profiler.stop()
+        try:
+            jobs[job_id]['profile'] = profiler.save(str(UPLOAD_FOLDER / f'{job_id}_profile'))
+        except Exception as e:
+            print(f"Error guardando el perfil de {job_id}: {e}")
+
+
 @app.route('/')
 def index():
     """Página principal."""
     return render_template('index.html')
 
 
+def read_title_config(form, kind: str, fonts: dict) -> dict | None:
+    """Configuración del intro u outro ('intro' / 'outro'); None si no tiene texto."""
+    text = form.get(f'{kind}_text', '').strip()
+    if not text:
+        return None
+    font = form.get(f'{kind}_font', 'DejaVuSans-Bold')
+    return {
+        'text': text,
+        'duration': float(form.get(f'{kind}_duration', 5)),
+        'font_path': fonts.get(font, FONTS['DejaVuSans-Bold']),
+        'font_size': int(form.get(f'{kind}_size', 80)),
+        'font_color': form.get(f'{kind}_color', '#ffffff'),
+        'bg_color': form.get(f'{kind}_bg_color', '#000000'),
+        'bg_image': None,
+        'animation_in': form.get(f'{kind}_animation_in', 'none'),
+        'animation_out': form.get(f'{kind}_animation_out', 'none'),
+    }
+
+
+def read_render_options(form, fonts: dict = None) -> dict:
+    """
+    Lee la configuración del render (video, subtítulos, intro y outro) de un
+    formulario o diccionario con los mismos campos. Retorna los argumentos de
+    `process_video`. `fonts` permite agregar fuentes propias a FONTS.
+    """
+    fonts = {**FONTS, **(fonts or {})}
+
+    # Obtener configuración de video
+    width, height = map(int, str(form.get('resolution', '1080x1920')).split('x'))
+
+    # Obtener configuración de subtítulos
+    subtitle_font = form.get('subtitle_font', 'DejaVuSans-Bold')
+    subtitle_config = {
+        'font_path': fonts.get(subtitle_font, FONTS['DejaVuSans-Bold']),
+        'font_size': int(form.get('subtitle_size', 75)),
+        'font_color': form.get('subtitle_color', '#ffffff'),
+        'stroke_color': form.get('subtitle_stroke_color', '#000000'),
+        'stroke_width': int(form.get('subtitle_stroke_width', 2)),
+        'typewriter_enabled': str(form.get('subtitle_typewriter', 'true')).lower() == 'true',
+        'position': form.get('subtitle_position', 'center'),
+    }
+
+    return {
+        'resolution': (width, height),
+        'transition_type': form.get('transition_type', 'crossfade'),
+        'transition_duration': float(form.get('transition', 0.5)),
+        'fps': int(form.get('fps', 4)),
+        'subtitle_config': subtitle_config,
+        'intro_config': read_title_config(form, 'intro', fonts),
+        'outro_config': read_title_config(form, 'outro', fonts),
+        'motion': form.get('motion', 'none'),
+        'motion_quality': form.get('motion_quality', 'balanced'),
+        'timing_mode': form.get('timing_mode', 'even'),
+    }
+
+
 @app.route('/api/upload', methods=['POST'])
 def upload_files():
     """Sube archivos y prepara el trabajo."""
@@ -953,83 +1106,45 @@ def upload_files():
         srt_path = str(job_folder / filename)
         srt.save(srt_path)
 
-    # Obtener configuración de video
-    resolution_str = request.form.get('resolution', '1080x1920')
-    width, height = map(int, resolution_str.split('x'))
-    transition_type = request.form.get('transition_type', 'crossfade')
-    transition = float(request.form.get('transition', 0.5))
-    fps = int(request.form.get('fps', 4))
-
-    # Obtener configuración de subtítulos
-    subtitle_font = request.form.get('subtitle_font', 'DejaVuSans-Bold')
-    subtitle_size = int(request.form.get('subtitle_size', 75))
-    subtitle_color = request.form.get('subtitle_color', '#ffffff')
-    subtitle_stroke_color = request.form.get('subtitle_stroke_color', '#000000')
-    subtitle_stroke_width = int(request.form.get('subtitle_stroke_width', 2))
-    subtitle_typewriter = request.form.get('subtitle_typewriter', 'true').lower() == 'true'
-    subtitle_position = request.form.get('subtitle_position', 'center')
+    options = read_render_options(request.form)
 
-    subtitle_config = {
-        'font_path': FONTS.get(subtitle_font, FONTS['DejaVuSans-Bold']),
-        'font_size': subtitle_size,
-        'font_color': subtitle_color,
-        'stroke_color': subtitle_stroke_color,
-        'stroke_width': subtitle_stroke_width,
-        'typewriter_enabled': subtitle_typewriter,
-        'position': subtitle_position,
-    }
-
-    # Obtener configuración de intro
-    intro_text = request.form.get('intro_text', '').strip()
-    intro_config = None
-    if intro_text:
-        intro_font = request.form.get('intro_font', 'DejaVuSans-Bold')
-        intro_config = {
-            'text': intro_text,
-            'duration': float(request.form.get('intro_duration', 5)),
-            'font_path': FONTS.get(intro_font, FONTS['DejaVuSans-Bold']),
-            'font_size': int(request.form.get('intro_size', 80)),
-            'font_color': request.form.get('intro_color', '#ffffff'),
-            'bg_color': request.form.get('intro_bg_color', '#000000'),
-            'bg_image': None,
-            'animation_in': request.form.get('intro_animation_in', 'none'),
-            'animation_out': request.form.get('intro_animation_out', 'none'),
-        }
-        # Guardar imagen de fondo de intro si existe
-        intro_bg_image = request.files.get('intro_bg_image')
-        if intro_bg_image and intro_bg_image.filename:
-            filename = secure_filename(intro_bg_image.filename)
-            intro_bg_path = str(job_folder / f'intro_bg_{filename}')
-            intro_bg_image.save(intro_bg_path)
-            intro_config['bg_image'] = intro_bg_path
-
-    # Obtener configuración de outro
-    outro_text = request.form.get('outro_text', '').strip()
-    outro_config = None
-    if outro_text:
-        outro_font = request.form.get('outro_font', 'DejaVuSans-Bold')
-        outro_config = {
-            'text': outro_text,
-            'duration': float(request.form.get('outro_duration', 5)),
-            'font_path': FONTS.get(outro_font, FONTS['DejaVuSans-Bold']),
-            'font_size': int(request.form.get('outro_size', 80)),
-            'font_color': request.form.get('outro_color', '#ffffff'),
-            'bg_color': request.form.get('outro_bg_color', '#000000'),
-            'bg_image': None,
-            'animation_in': request.form.get('outro_animation_in', 'none'),
-            'animation_out': request.form.get('outro_animation_out', 'none'),
-        }
-        # Guardar imagen de fondo de outro si existe
-        outro_bg_image = request.files.get('outro_bg_image')
-        if outro_bg_image and outro_bg_image.filename:
-            filename = secure_filename(outro_bg_image.filename)
-            outro_bg_path = str(job_folder / f'outro_bg_{filename}')
-            outro_bg_image.save(outro_bg_path)
-            outro_config['bg_image'] = outro_bg_path
+    # Guardar imágenes de fondo de intro/outro si existen
+    for kind in ('intro', 'outro'):
+        bg_image = request.files.get(f'{kind}_bg_image')
+        if options[f'{kind}_config'] and bg_image and bg_image.filename:
+            filename = secure_filename(bg_image.filename)
+            bg_path = str(job_folder / f'{kind}_bg_{filename}')
+            bg_image.save(bg_path)
+            options[f'{kind}_config']['bg_image'] = bg_path
 
     if not image_paths or not audio_path:
         return jsonify({'error': 'Se requieren imágenes y audio'}), 400
 
+    job_id = start_render_job(
+        job_id, image_paths, audio_path, srt_path, options,
+        base_job_id=request.form.get('base_job_id', ''),
+        profile=request.form.get('profile') == '1',
+    )
+    return jsonify({'job_id': job_id})
+
+
+def start_render_job(job_id: str, image_paths: list[str], audio_path: str, srt_path: str | None,
+                     options: dict, base_job_id: str = '', profile: bool = False, **job_fields) -> str:
+    """
+    Registra el trabajo e inicia process_video en un hilo.
+
+    `base_job_id` indica un render anterior sobre el que aplicar solo los
+    cambios; `job_fields` se agregan al diccionario del trabajo.
+    """
+    # Render anterior sobre el que aplicar solo los cambios (re-render parcial).
+    # Su base está en el cache; si ya se descartó, el video se renderiza completo.
+    previous_render = None
+    base_job = jobs.get(base_job_id or '')
+    if base_job and base_job['status'] == 'completed' and base_job.get('render_key'):
+        previous_render = render_cache.export_base(
+            base_job['render_key'], str(UPLOAD_FOLDER / f'{job_id}_base_video.mp4')
+        )
+
     # Crear evento de cancelación para este trabajo
     cancel_event = threading.Event()
     cancel_events[job_id] = cancel_event
@@ -1040,16 +1155,81 @@ def upload_files():
         'progress': 0,
         'message': 'En cola...',
         'output_file': None,
+        **job_fields,
     }
 
+    # Perfilar el render solo si lo pide un administrador
+    profile = profile and is_admin()
+
     # Iniciar procesamiento en hilo separado
     thread = threading.Thread(
-        target=process_video,
-        args=(job_id, image_paths, audio_path, srt_path, (width, height), transition_type, transition, fps, subtitle_config, intro_config, outro_config, cancel_event)
+        target=render_job_profiled if profile else render_job,
+        args=(job_id, image_paths, audio_path, srt_path),
+        kwargs={**options, 'cancel_event': cancel_event, 'previous_render': previous_render},
     )
     thread.start()
 
-    return jsonify({'job_id': job_id})
+    return job_id
+
+
+@app.route('/api/assets', methods=['POST'])
+def upload_assets():
+    """
+    Sube archivos ('files') al almacén de assets y retorna el hash de cada uno.
+
+    Los hashes se usan en las specs de /api/render; un archivo ya subido no
+    se vuelve a guardar.
+    """
+    uploaded = []
+    for upload in request.files.getlist('files'):
+        if upload and upload.filename:
+            uploaded.append({
+                'name': upload.filename,
+                'hash': asset_store.add_stream(upload.stream, secure_filename(upload.filename)),
+            })
+    if not uploaded:
+        return jsonify({'error': 'No se recibieron archivos'}), 400
+    return jsonify({'assets': uploaded})
+
+
+@app.route('/api/assets/<digest>', methods=['GET', 'HEAD'])
+def asset_info(digest):
+    """Indica si un asset ya está en el almacén (para no volver a subirlo)."""
+    path = asset_store.path(digest)
+    if not path:
+        return jsonify({'error': 'Asset no encontrado'}), 404
+    return jsonify({'hash': digest, 'size': os.path.getsize(path)})
+
+
+@app.route('/api/render', methods=['POST'])
+def render_spec_job():
+    """
+    Crea un video a partir de una spec JSON (ver render_spec.py).
+
+    El cuerpo es la spec, o {"spec": ..., "base_job_id": ..., "profile": true}.
+    Los archivos se referencian por el hash de /api/assets, así que un
+    re-render no vuelve a subir nada.
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({'error': 'Se requiere una spec JSON'}), 400
+    # Con {"spec": ...} el pedido puede traer opciones además de la spec
+    request_options = body if 'spec' in body else {}
+    spec = body.get('spec', body)
+
+    try:
+        resolved = resolve_spec(spec, asset_store, FONTS)
+        digest = spec_hash(spec)
+    except SpecError as e:
+        return jsonify({'error': str(e)}), 400
+
+    job_id = start_render_job(
+        str(uuid.uuid4()), resolved['images'], resolved['audio'], resolved['srt'], resolved['options'],
+        base_job_id=request_options.get('base_job_id', ''),
+        profile=bool(request_options.get('profile')),
+        spec_hash=digest,
+    )
+    return jsonify({'job_id': job_id, 'spec_hash': digest})
 
 
 @app.route('/api/progress/<job_id>')
@@ -1092,9 +1272,82 @@ def get_status(job_id):
         'status': job['status'],
         'progress': job['progress'],
         'message': job['message'],
+        'stages': job.get('stages', []),
+        'memory': job.get('memory'),
+        'spec_hash': job.get('spec_hash'),
+        'cached': job.get('cached', False),
+        'tempo': job.get('tempo'),
+        'beats': job.get('beats'),
     })
 
 
+@app.route('/metrics')
+def metrics():
+    """Métricas por etapa de los renders (formato de texto de Prometheus)."""
+    lines = [
+        '# HELP video_render_cache_hits_total Renders resueltos con el cache de videos',
+        '# TYPE video_render_cache_hits_total counter',
+        f'video_render_cache_hits_total {render_cache.hits}',
+        '# HELP video_render_cache_misses_total Renders que no estaban en el cache',
+        '# TYPE video_render_cache_misses_total counter',
+        f'video_render_cache_misses_total {render_cache.misses}',
+        '# HELP video_render_cache_bytes Tamaño actual del cache de videos',
+        '# TYPE video_render_cache_bytes gauge',
+        f'video_render_cache_bytes {render_cache.total_bytes}',
+    ]
+    return Response(METRICS.render() + '\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/api/preview/<job_id>/<int:slot>')
+def preview_frame(job_id, slot):
+    """
+    Vista previa (JPEG) de la imagen de un slot tal como sale en el video.
+
+    Se lee del almacén de frames del trabajo mapeado en solo lectura, así que
+    comparte la copia en memoria con el render aunque este siga en curso.
+    """
+    from PIL import Image
+    from frame_store import FrameStore
+
+    if job_id not in jobs or not jobs[job_id].get('frame_store'):
+        return jsonify({'error': 'Vista previa no disponible'}), 404
+
+    store = FrameStore(jobs[job_id]['frame_store'])
+    if not 0 <= slot < len(store):
+        return jsonify({'error': 'Slot fuera de rango'}), 404
+
+    image = Image.fromarray(store[slot])
+    width = request.args.get('width', type=int)
+    if width and 0 < width < image.width:
+        image = image.resize((width, round(image.height * width / image.width)), Image.Resampling.BILINEAR)
+
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=85)
+    store.close()
+    return Response(buffer.getvalue(), mimetype='image/jpeg')
+
+
+@app.route('/api/debug/profile/<job_id>')
+def debug_profile(job_id):
+    """
+    Perfil de un trabajo perfilado (solo administradores): el resumen JSON o,
+    con ?format=collapsed, las pilas para generar el flamegraph.
+    """
+    if not is_admin():
+        return jsonify({'error': 'No autorizado'}), 403
+    if job_id not in jobs:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+
+    profile = jobs[job_id].get('profile')
+    if not profile:
+        return jsonify({'error': 'El trabajo no tiene perfil'}), 404
+
+    if request.args.get('format') == 'collapsed':
+        return send_file(profile['collapsed'], as_attachment=True,
+                         download_name=f'{job_id}.collapsed.txt', mimetype='text/plain')
+    return send_file(profile['summary'], mimetype='application/json')
+
+
 @app.route('/api/cancel/<job_id>', methods=['POST'])
 def cancel_job(job_id):
     """Cancela un trabajo en proceso."""
@@ -1134,12 +1387,317 @@ def download_video(job_id):
     )
 
 
-# === MARCA DE AGUA DE AUDIO ===
+# === LOTES DE VIDEOS ===
+
+# Lotes de render: varios videos que comparten canción, subtítulos, imágenes o fuentes
+render_batches = {}
+
+# Pool acotado de renders de los lotes
+render_executor = ThreadPoolExecutor(max_workers=RENDER_WORKERS)
+
+# Extensiones de archivos de fuente aceptados como recursos del lote
+FONT_EXTENSIONS = {'.ttf', '.otf'}
+
+
+def resolve_batch_variants(shared: dict, variants: list[dict], assets: dict, fonts: dict) -> list[dict]:
+    """
+    Combina la configuración compartida con la de cada variante.
+
+    Cada variante puede indicar 'name', 'images', 'audio', 'srt' y 'settings'
+    (mismos campos que /api/upload); lo que no indique se toma de `shared`.
+    Los archivos se nombran por su nombre en la subida ('assets').
+    """
+    def asset_path(name):
+        if name not in assets:
+            raise ValueError(f'Archivo no encontrado en el lote: {name}')
+        return assets[name]
+
+    resolved = []
+    for i, variant in enumerate(variants):
+        images = variant.get('images') or shared.get('images') or []
+        audio = variant.get('audio') or shared.get('audio')
+        srt = variant.get('srt') or shared.get('srt')
+        if not images or not audio:
+            raise ValueError(f'La variante {i + 1} requiere imágenes y audio')
+
+        settings = {**shared.get('settings', {}), **variant.get('settings', {})}
+        options = read_render_options(settings, fonts)
+        for kind in ('intro', 'outro'):
+            if options[f'{kind}_config'] and settings.get(f'{kind}_bg_image'):
+                options[f'{kind}_config']['bg_image'] = asset_path(settings[f'{kind}_bg_image'])
+
+        resolved.append({
+            'name': secure_filename(str(variant.get('name') or f'video_{i + 1}')) or f'video_{i + 1}',
+            'images': [asset_path(name) for name in images],
+            'audio': asset_path(audio),
+            'srt': asset_path(srt) if srt else None,
+            'options': options,
+        })
+    return resolved
+
+
+def resolve_spec_variants(body) -> list[dict]:
+    """
+    Variantes de un lote JSON: {"shared": spec, "variants": [spec, ...]}.
+
+    Cada variante se combina con `shared` (merge_spec) y puede tener 'name';
+    los archivos se referencian por hash como en /api/render.
+    """
+    if not isinstance(body, dict) or not isinstance(body.get('variants'), list) or not body['variants']:
+        raise SpecError('Se requiere al menos una variante')
+    shared = body.get('shared') or {}
+    if not isinstance(shared, dict):
+        raise SpecError('shared debe ser un objeto')
+
+    resolved = []
+    for i, variant in enumerate(body['variants']):
+        if not isinstance(variant, dict):
+            raise SpecError(f'La variante {i + 1} debe ser un objeto')
+        variant = dict(variant)
+        name = variant.pop('name', None)
+        spec = merge_spec(shared, variant)
+        try:
+            entry = resolve_spec(spec, asset_store, FONTS)
+        except SpecError as e:
+            raise SpecError(f'Variante {i + 1}: {e}')
+        entry['name'] = secure_filename(str(name or '')) or f'video_{i + 1}'
+        entry['spec_hash'] = spec_hash(spec)
+        resolved.append(entry)
+    return resolved
 
-WATERMARK_FILE = Path(__file__).parent / 'marca_agua.mp3'
 
-# Almacén de trabajos de marca de agua
+@app.route('/api/render/batch', methods=['POST'])
+def render_batch_upload():
+    """
+    Crea varios videos en un solo pedido.
+
+    Los archivos se suben una sola vez en 'assets' (imágenes, canciones,
+    subtítulos y fuentes .ttf/.otf); 'shared' (JSON) tiene lo común y
+    'variants' (JSON) la lista de videos. También acepta un cuerpo JSON con
+    specs que referencian archivos ya subidos a /api/assets (ver
+    resolve_spec_variants). Cada variante es un trabajo normal (/api/status,
+    /api/download, /api/cancel) y el lote informa el progreso total.
+    """
+    batch_id = str(uuid.uuid4())
+
+    if request.is_json:
+        try:
+            resolved = resolve_spec_variants(request.get_json(silent=True))
+        except SpecError as e:
+            return jsonify({'error': str(e)}), 400
+    else:
+        try:
+            shared = json.loads(request.form.get('shared') or '{}')
+            variants = json.loads(request.form.get('variants') or '[]')
+        except ValueError:
+            return jsonify({'error': 'shared y variants deben ser JSON'}), 400
+        if not isinstance(shared, dict) or not isinstance(variants, list) or not variants:
+            return jsonify({'error': 'Se requiere al menos una variante'}), 400
+
+        batch_folder = UPLOAD_FOLDER / f'batch_{batch_id}'
+        batch_folder.mkdir(parents=True, exist_ok=True)
+
+        # Guardar cada archivo una sola vez, aunque lo usen varias variantes
+        assets = {}
+        fonts = {}
+        for upload in request.files.getlist('assets'):
+            if not upload or not upload.filename:
+                continue
+            filename = secure_filename(upload.filename)
+            path = str(batch_folder / filename)
+            upload.save(path)
+            assets[upload.filename] = assets[filename] = path
+            if Path(filename).suffix.lower() in FONT_EXTENSIONS:
+                fonts[Path(filename).stem] = fonts[filename] = path
+
+        try:
+            resolved = resolve_batch_variants(shared, variants, assets, fonts)
+        except (ValueError, TypeError, AttributeError) as e:
+            shutil.rmtree(batch_folder, ignore_errors=True)
+            return jsonify({'error': str(e)}), 400
+
+    job_ids = []
+    for variant in resolved:
+        job_id = str(uuid.uuid4())
+        cancel_events[job_id] = threading.Event()
+        jobs[job_id] = {
+            'status': 'queued',
+            'progress': 0,
+            'message': 'En cola...',
+            'output_file': None,
+            'output_name': f"{variant['name']}.mp4",
+        }
+        if variant.get('spec_hash'):
+            jobs[job_id]['spec_hash'] = variant['spec_hash']
+        variant['job_id'] = job_id
+        job_ids.append(job_id)
+
+    render_batches[batch_id] = {
+        'status': 'preparing',
+        'message': 'Preparando recursos compartidos...',
+        'jobs': job_ids,
+    }
+
+    threading.Thread(target=process_render_batch, args=(batch_id, resolved), daemon=True).start()
+
+    return jsonify({'batch_id': batch_id, 'job_ids': job_ids})
+
+
+def process_render_batch(batch_id: str, variants: list[dict]):
+    """
+    Prepara una sola vez lo que comparten las variantes y las encola en el pool.
+
+    El análisis de ritmo se hace una vez por canción (queda en el cache de
+    audio_analysis) y las imágenes se preprocesan una vez por resolución en un
+    FrameCache común, que libera cada frame cuando ya ninguna variante lo usa.
+    """
+    from audio_analysis import analyze_audio
+    from slideshow import FrameCache
+
+    batch = render_batches[batch_id]
+
+    # Canciones que necesitan análisis de ritmo
+    beat_audios = {
+        variant['audio'] for variant in variants
+        if variant['options']['timing_mode'] == 'beats' and len(variant['images']) > 1
+    }
+    for i, audio_path in enumerate(sorted(beat_audios)):
+        batch['message'] = f'Analizando ritmo {i + 1}/{len(beat_audios)}...'
+        try:
+            analyze_audio(audio_path)
+        except Exception as e:
+            # La variante mostrará el error al renderizar
+            print(f"Error analizando {audio_path}: {e}")
+
+    frame_cache = FrameCache()
+    for variant in variants:
+        variant['frame_keys'] = [(path, variant['options']['resolution']) for path in variant['images']]
+        frame_cache.retain(variant['frame_keys'])
+
+    batch['status'] = 'processing'
+    batch['message'] = 'Renderizando videos...'
+    for variant in variants:
+        render_executor.submit(render_batch_variant, variant, frame_cache)
+
+
+def render_batch_variant(variant: dict, frame_cache: FrameCache):
+    """Renderiza una variante del lote y libera sus frames compartidos."""
+    job_id = variant['job_id']
+    try:
+        if cancel_events[job_id].is_set():
+            jobs[job_id]['status'] = 'cancelled'
+            jobs[job_id]['message'] = 'Proceso cancelado'
+            METRICS.job_finished('cancelled')
+            return
+        render_job(
+            job_id, variant['images'], variant['audio'], variant['srt'],
+            cancel_event=cancel_events[job_id], frame_cache=frame_cache, **variant['options']
+        )
+    finally:
+        frame_cache.release(variant['frame_keys'])
+
+
+@app.route('/api/render/batch/status/<batch_id>')
+def render_batch_status(batch_id):
+    """Estado agregado de un lote de videos, con el progreso de cada variante."""
+    if batch_id not in render_batches:
+        return jsonify({'error': 'Lote no encontrado'}), 404
+
+    batch = render_batches[batch_id]
+    videos = []
+    for job_id in batch['jobs']:
+        job = jobs[job_id]
+        videos.append({
+            'job_id': job_id,
+            'name': job['output_name'],
+            'status': job['status'],
+            'progress': job['progress'],
+            'message': job['message'],
+        })
+
+    completed = sum(1 for v in videos if v['status'] == 'completed')
+    failed = sum(1 for v in videos if v['status'] == 'error')
+    cancelled = sum(1 for v in videos if v['status'] == 'cancelled')
+    if batch['status'] == 'preparing':
+        status = 'preparing'
+        message = batch['message']
+    else:
+        if completed + failed + cancelled < len(videos):
+            status = 'processing'
+        else:
+            status = 'completed' if completed else 'error'
+        message = f'{completed} de {len(videos)} videos listos' + (f' ({failed} con error)' if failed else '')
+
+    return jsonify({
+        'status': status,
+        'progress': sum(v['progress'] for v in videos) // len(videos),
+        'message': message,
+        'total': len(videos),
+        'completed': completed,
+        'failed': failed,
+        'cancelled': cancelled,
+        'videos': videos,
+    })
+
+
+@app.route('/api/render/batch/cancel/<batch_id>', methods=['POST'])
+def render_batch_cancel(batch_id):
+    """Cancela las variantes del lote que todavía no terminaron."""
+    if batch_id not in render_batches:
+        return jsonify({'error': 'Lote no encontrado'}), 404
+
+    cancelled = 0
+    for job_id in render_batches[batch_id]['jobs']:
+        if jobs[job_id]['status'] in ['processing', 'queued']:
+            cancel_events[job_id].set()
+            jobs[job_id]['message'] = 'Cancelando...'
+            cancelled += 1
+
+    return jsonify({'success': True, 'cancelled': cancelled})
+
+
+@app.route('/api/render/batch/download/<batch_id>')
+def render_batch_download(batch_id):
+    """Descarga en un zip todos los videos terminados del lote."""
+    if batch_id not in render_batches:
+        return jsonify({'error': 'Lote no encontrado'}), 404
+
+    jobs_done = [jobs[job_id] for job_id in render_batches[batch_id]['jobs']
+                 if jobs[job_id]['status'] == 'completed']
+    if not jobs_done:
+        return jsonify({'error': 'Video no disponible'}), 400
+
+    # Los mp4 ya están comprimidos: el zip solo los empaqueta
+    zip_path = UPLOAD_FOLDER / f'batch_{batch_id}' / 'videos.zip'
+    zip_path.parent.mkdir(parents=True, exist_ok=True)
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED) as zf:
+        names = set()
+        for job in jobs_done:
+            name = job['output_name']
+            stem, ext = os.path.splitext(name)
+            counter = 1
+            while name in names:
+                name = f'{stem}_{counter}{ext}'
+                counter += 1
+            names.add(name)
+            zf.write(job['output_file'], name)
+
+    return send_file(
+        str(zip_path),
+        as_attachment=True,
+        download_name='videos.zip',
+        mimetype='application/zip'
+    )
+
+
+# === MARCA DE AGUA DE AUDIO ===
+
+# Almacén de trabajos de marca de agua (uno por canción) y de lotes
 watermark_jobs = {}
+watermark_batches = {}
+
+# Pool acotado: las canciones esperan turno en lugar de crear un hilo cada una
+watermark_executor = ThreadPoolExecutor(max_workers=WATERMARK_WORKERS)
 
 
 @app.route('/watermark')
@@ -1148,23 +1706,17 @@ def watermark_page():
     return render_template('watermark.html')
 
 
-@app.route('/api/watermark', methods=['POST'])
-def watermark_upload():
-    """Sube una canción y la mezcla con la marca de agua cada N segundos."""
-    if not WATERMARK_FILE.exists():
-        return jsonify({'error': 'Archivo marca_agua.mp3 no encontrado en el servidor'}), 500
-
-    audio = request.files.get('audio')
-    if not audio or not audio.filename:
-        return jsonify({'error': 'Se requiere un archivo de audio'}), 400
-
+def read_watermark_options() -> tuple[int, float, int]:
+    """Lee intervalo, volumen y recorte del formulario."""
     interval = int(request.form.get('interval', 10))
     volume = float(request.form.get('volume', 0.3))
     trim = int(request.form.get('trim', 60))
+    return interval, volume, trim
+
 
+def queue_watermark_job(audio, job_folder: Path, interval: int, volume: float, trim: int) -> str:
+    """Guarda una canción subida y encola su trabajo de marca de agua."""
     job_id = str(uuid.uuid4())
-    job_folder = UPLOAD_FOLDER / f'wm_{job_id}'
-    job_folder.mkdir(parents=True, exist_ok=True)
 
     # Guardar audio subido
     filename = secure_filename(audio.filename)
@@ -1174,102 +1726,155 @@ def watermark_upload():
     output_path = str(job_folder / f'watermarked_{filename}')
 
     watermark_jobs[job_id] = {
-        'status': 'processing',
+        'status': 'queued',
         'progress': 0,
-        'message': 'Procesando...',
+        'message': 'En cola...',
         'output_file': None,
         'output_name': f'watermarked_{filename}',
     }
 
-    thread = threading.Thread(
-        target=process_watermark,
-        args=(job_id, input_path, output_path, interval, volume, trim)
+    watermark_executor.submit(
+        process_watermark, job_id, input_path, output_path, interval, volume, trim
     )
-    thread.start()
+    return job_id
+
+
+@app.route('/api/watermark', methods=['POST'])
+def watermark_upload():
+    """
+    Sube una canción y la mezcla con la marca de agua cada N segundos.
+
+    Con stream=1 la respuesta es el mp3 mismo, transmitido a medida que se
+    codifica; con save=1 (por defecto) también se guarda para descargarlo
+    después con el job_id de la cabecera X-Job-Id.
+    """
+    if not WATERMARK_FILE.exists():
+        return jsonify({'error': 'Archivo marca_agua.mp3 no encontrado en el servidor'}), 500
+
+    audio = request.files.get('audio')
+    if not audio or not audio.filename:
+        return jsonify({'error': 'Se requiere un archivo de audio'}), 400
+
+    interval, volume, trim = read_watermark_options()
+
+    job_folder = UPLOAD_FOLDER / f'wm_{uuid.uuid4()}'
+    job_folder.mkdir(parents=True, exist_ok=True)
+
+    if request.form.get('stream') == '1':
+        return stream_watermark_response(audio, job_folder, interval, volume, trim,
+                                         save=request.form.get('save', '1') == '1')
+
+    job_id = queue_watermark_job(audio, job_folder, interval, volume, trim)
 
     return jsonify({'job_id': job_id})
 
 
-def process_watermark(job_id: str, input_path: str, output_path: str,
-                      interval: int, volume: float, trim: int = 60):
-    """Mezcla la marca de agua en la canción cada N segundos."""
+@app.route('/api/watermark/batch', methods=['POST'])
+def watermark_batch_upload():
+    """Sube varias canciones ('audios') y las procesa en el pool de marca de agua."""
+    if not WATERMARK_FILE.exists():
+        return jsonify({'error': 'Archivo marca_agua.mp3 no encontrado en el servidor'}), 500
+
+    audios = [audio for audio in request.files.getlist('audios') if audio and audio.filename]
+    if not audios:
+        return jsonify({'error': 'Se requiere al menos un archivo de audio'}), 400
+
+    interval, volume, trim = read_watermark_options()
+
+    batch_id = str(uuid.uuid4())
+    batch_folder = UPLOAD_FOLDER / f'wm_batch_{batch_id}'
+    batch_folder.mkdir(parents=True, exist_ok=True)
+
+    job_ids = []
+    for audio in audios:
+        # Una subcarpeta por canción para que los nombres no choquen
+        job_folder = batch_folder / str(len(job_ids))
+        job_folder.mkdir()
+        job_ids.append(queue_watermark_job(audio, job_folder, interval, volume, trim))
+
+    watermark_batches[batch_id] = {'jobs': job_ids}
+
+    return jsonify({'batch_id': batch_id, 'job_ids': job_ids})
+
+
+def stream_watermark_response(audio, job_folder: Path, interval: int, volume: float,
+                              trim: int, save: bool = True) -> Response:
+    """Respuesta chunked con el mp3 a medida que ffmpeg lo escribe en su stdout."""
+    filename = secure_filename(audio.filename)
+    input_path = str(job_folder / filename)
+    audio.save(input_path)
+
+    output_name = f'watermarked_{Path(filename).stem}.mp3'
+    headers = {'Content-Disposition': f'attachment; filename="{output_name}"'}
+
+    job_id = None
+    output_path = None
+    if save:
+        job_id = str(uuid.uuid4())
+        output_path = str(job_folder / output_name)
+        watermark_jobs[job_id] = {
+            'status': 'processing',
+            'progress': 0,
+            'message': 'Transmitiendo audio...',
+            'output_file': None,
+            'output_name': output_name,
+        }
+        headers['X-Job-Id'] = job_id
+
+    def fail(message):
+        if job_id:
+            watermark_jobs[job_id]['status'] = 'error'
+            watermark_jobs[job_id]['message'] = message
+
+    # Obtener el primer bloque antes de responder: los errores tempranos
+    # (audio inválido, ffmpeg) todavía se pueden devolver como JSON
+    stream = stream_watermark(input_path, str(WATERMARK_FILE), interval, volume, trim,
+                              tee_path=output_path)
     try:
-        watermark_jobs[job_id]['message'] = 'Obteniendo duración del audio...'
-        watermark_jobs[job_id]['progress'] = 10
+        first_chunk = next(stream, b'')
+    except Exception as e:
+        fail(f'Error: {str(e)}')
+        return jsonify({'error': str(e)}), 500
 
-        # Obtener duración con ffprobe
-        result = subprocess.run(
-            [SYSTEM_FFMPEG.replace('ffmpeg', 'ffprobe'),
-             '-v', 'error', '-show_entries', 'format=duration',
-             '-of', 'default=noprint_wrappers=1:nokey=1', input_path],
-            capture_output=True, text=True, timeout=30
-        )
-        duration = float(result.stdout.strip())
-
-        # Recortar la canción si se especificó un límite
-        max_duration = float(trim) if trim > 0 else 0
-        if max_duration > 0 and duration > max_duration:
-            watermark_jobs[job_id]['message'] = 'Recortando al primer minuto...'
-            watermark_jobs[job_id]['progress'] = 20
-            trimmed_path = input_path.rsplit('.', 1)[0] + '_trimmed.' + input_path.rsplit('.', 1)[1]
-            trim_cmd = [
-                SYSTEM_FFMPEG, '-y',
-                '-i', input_path,
-                '-t', str(max_duration),
-                '-c', 'copy',
-                trimmed_path
-            ]
-            subprocess.run(trim_cmd, capture_output=True, text=True, timeout=60, check=True)
-            input_path = trimmed_path
-            duration = max_duration
-
-        watermark_jobs[job_id]['message'] = 'Mezclando marca de agua...'
-        watermark_jobs[job_id]['progress'] = 30
-
-        # Calcular cuántas marcas de agua insertar
-        wm_path = str(WATERMARK_FILE)
-        num_watermarks = int(duration // interval)
-        if num_watermarks < 1:
-            num_watermarks = 1
-
-        # Construir filtro complejo de ffmpeg
-        # Cada copia de la marca de agua se retrasa N*intervalo segundos
-        filter_inputs = []
-        filter_parts = []
-
-        for i in range(num_watermarks):
-            delay_ms = i * interval * 1000
-            filter_parts.append(
-                f"[1:a]atrim=start=0,asetpts=PTS-STARTPTS,"
-                f"adelay={delay_ms}|{delay_ms},"
-                f"volume={volume}[wm{i}]"
-            )
-            filter_inputs.append(f"[wm{i}]")
+    def generate():
+        try:
+            yield first_chunk
+            yield from stream
+        except GeneratorExit:
+            fail('Transmisión interrumpida')
+            raise
+        except Exception as e:
+            # La respuesta ya empezó: el error solo queda en el estado del trabajo
+            print(f"Error transmitiendo marca de agua: {e}")
+            fail(f'Error: {str(e)}')
+            return
 
-        # Mezclar todo: canción original + todas las copias de marca de agua
-        all_inputs = "[0:a]" + "".join(filter_inputs)
-        mix_count = 1 + num_watermarks
-        filter_complex = ";".join(filter_parts)
-        filter_complex += f";{all_inputs}amix=inputs={mix_count}:duration=first:dropout_transition=0:normalize=0[out]"
+        if job_id:
+            watermark_jobs[job_id]['status'] = 'completed'
+            watermark_jobs[job_id]['progress'] = 100
+            watermark_jobs[job_id]['message'] = 'Audio con marca de agua creado!'
+            watermark_jobs[job_id]['output_file'] = output_path
 
-        ffmpeg_cmd = [
-            SYSTEM_FFMPEG,
-            '-y',
-            '-i', input_path,
-            '-i', wm_path,
-            '-filter_complex', filter_complex,
-            '-map', '[out]',
-            '-c:a', 'libmp3lame',
-            '-q:a', '2',
-            output_path
-        ]
+    response = Response(generate(), mimetype='audio/mpeg', headers=headers)
+    # Si el cliente se va antes de leer, detener ffmpeg igualmente
+    response.call_on_close(stream.close)
+    return response
 
-        watermark_jobs[job_id]['progress'] = 50
 
-        proc = subprocess.run(ffmpeg_cmd, capture_output=True, text=True, timeout=600)
+def process_watermark(job_id: str, input_path: str, output_path: str,
+                      interval: int, volume: float, trim: int = 60):
+    """Mezcla la marca de agua en la canción cada N segundos."""
+    def on_progress(progress, message):
+        watermark_jobs[job_id]['progress'] = progress
+        watermark_jobs[job_id]['message'] = message
+
+    try:
+        watermark_jobs[job_id]['status'] = 'processing'
 
-        if proc.returncode != 0:
-            raise Exception(f'FFmpeg error: {proc.stderr[-500:]}')
+        watermark_audio(
+            input_path, output_path, str(WATERMARK_FILE),
+            interval, volume, trim, on_progress=on_progress
+        )
 
         watermark_jobs[job_id]['status'] = 'completed'
         watermark_jobs[job_id]['progress'] = 100
@@ -1311,5 +1916,77 @@ def watermark_download(job_id):
     )
 
 
+@app.route('/api/watermark/batch/status/<batch_id>')
+def watermark_batch_status(batch_id):
+    """Estado agregado de un lote de marca de agua, con el progreso de cada canción."""
+    if batch_id not in watermark_batches:
+        return jsonify({'error': 'Lote no encontrado'}), 404
+
+    files = []
+    for job_id in watermark_batches[batch_id]['jobs']:
+        job = watermark_jobs[job_id]
+        files.append({
+            'job_id': job_id,
+            'name': job['output_name'],
+            'status': job['status'],
+            'progress': job['progress'],
+            'message': job['message'],
+        })
+
+    completed = sum(1 for f in files if f['status'] == 'completed')
+    failed = sum(1 for f in files if f['status'] == 'error')
+    if completed + failed < len(files):
+        status = 'processing'
+    else:
+        status = 'completed' if completed else 'error'
+
+    return jsonify({
+        'status': status,
+        'progress': sum(f['progress'] for f in files) // len(files),
+        'message': f'{completed} de {len(files)} canciones listas' + (f' ({failed} con error)' if failed else ''),
+        'total': len(files),
+        'completed': completed,
+        'failed': failed,
+        'files': files,
+    })
+
+
+@app.route('/api/watermark/batch/download/<batch_id>')
+def watermark_batch_download(batch_id):
+    """Descarga en un zip todas las canciones terminadas del lote."""
+    if batch_id not in watermark_batches:
+        return jsonify({'error': 'Lote no encontrado'}), 404
+
+    jobs_done = [watermark_jobs[job_id] for job_id in watermark_batches[batch_id]['jobs']
+                 if watermark_jobs[job_id]['status'] == 'completed']
+    if not jobs_done:
+        return jsonify({'error': 'Audio no disponible'}), 400
+
+    # Los mp3 ya están comprimidos: el zip solo los empaqueta
+    zip_path = UPLOAD_FOLDER / f'wm_batch_{batch_id}' / 'watermarked.zip'
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED) as zf:
+        names = set()
+        for job in jobs_done:
+            name = job['output_name']
+            stem, ext = os.path.splitext(name)
+            counter = 1
+            while name in names:
+                name = f'{stem}_{counter}{ext}'
+                counter += 1
+            names.add(name)
+            zf.write(job['output_file'], name)
+
+    return send_file(
+        str(zip_path),
+        as_attachment=True,
+        download_name='watermarked.zip',
+        mimetype='application/zip'
+    )
+
+
 if __name__ == '__main__':
+    print(f"NVENC disponible: {check_nvenc_available()}")
+    # Decodificar la marca de agua al arrancar el servidor (queda residente como PCM)
+    if WATERMARK_FILE.exists():
+        watermark_executor.submit(preload_watermark)
     app.run(host='0.0.0.0', port=80, debug=False, threaded=True)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Análisis de audio: fuerza de ataques (onsets), tempo y tiempos de beat.
+
+La canción se decodifica una sola vez a PCM mono de baja frecuencia de
+muestreo. La fuerza de ataques es el flujo espectral (diferencia positiva de
+la magnitud log de la STFT, calculada por bloques con FFT de NumPy), el tempo
+sale de su autocorrelación y los beats de un seguimiento por programación
+dinámica. El resultado se guarda en memoria por hash del contenido del audio,
+así que re-renderizar la misma canción no la vuelve a analizar.
+"""
+
+import shutil
+import subprocess
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from timeline import file_digest
+
+FFMPEG = shutil.which('ffmpeg')
+
+# Parámetros de la STFT (a 22050 Hz: ventanas de ~46 ms cada ~23 ms)
+ANALYSIS_SAMPLE_RATE = 22050
+FFT_SIZE = 1024
+HOP_SIZE = 512
+
+# Ventanas de la STFT calculadas por bloque (limita la memoria en canciones largas)
+STFT_BLOCK_FRAMES = 2048
+
+# Rango de tempo buscado y tempo preferido (BPM)
+MIN_BPM = 60
+MAX_BPM = 200
+PREFERRED_BPM = 120
+
+# Penalización por alejarse del periodo del tempo al seguir los beats
+BEAT_TIGHTNESS = 100
+
+# Análisis en memoria: (hash del audio) -> resultado
+ANALYSIS_CACHE_SIZE = 32
+_analysis_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def decode_mono(audio_path: str, sample_rate: int = ANALYSIS_SAMPLE_RATE) -> np.ndarray:
+    """Decodifica el audio a PCM float32 mono con ffmpeg."""
+    result = subprocess.run(
+        [FFMPEG, '-v', 'error', '-i', audio_path,
+         '-f', 'f32le', '-ac', '1', '-ar', str(sample_rate), '-'],
+        capture_output=True, timeout=300, check=True
+    )
+    return np.frombuffer(result.stdout, dtype=np.float32)
+
+
+def onset_strength(samples: np.ndarray) -> np.ndarray:
+    """
+    Flujo espectral por ventana: suma de los aumentos de magnitud (log) entre
+    ventanas consecutivas, normalizado a 0..1.
+    """
+    if len(samples) < FFT_SIZE:
+        return np.zeros(0, dtype=np.float32)
+
+    frames = np.lib.stride_tricks.sliding_window_view(samples, FFT_SIZE)[::HOP_SIZE]
+    window = np.hanning(FFT_SIZE).astype(np.float32)
+
+    flux = np.empty(len(frames), dtype=np.float32)
+    previous = None
+    for start in range(0, len(frames), STFT_BLOCK_FRAMES):
+        block = frames[start:start + STFT_BLOCK_FRAMES] * window
+        magnitude = np.log1p(100 * np.abs(np.fft.rfft(block, axis=1))).astype(np.float32)
+        if previous is None:
+            previous = magnitude[:1]
+        diff = np.diff(np.concatenate([previous, magnitude]), axis=0)
+        flux[start:start + len(block)] = np.maximum(diff, 0).sum(axis=1)
+        previous = magnitude[-1:]
+
+    # Quitar la tendencia lenta (volumen general) y normalizar
+    kernel = np.ones(16, dtype=np.float32) / 16
+    flux = np.maximum(flux - np.convolve(flux, kernel, mode='same'), 0)
+    peak = flux.max()
+    return flux / peak if peak > 0 else flux
+
+
+def estimate_period(onsets: np.ndarray, frame_rate: float) -> float:
+    """Periodo del beat (en ventanas) según la autocorrelación de los onsets."""
+    min_lag = max(1, int(frame_rate * 60 / MAX_BPM))
+    max_lag = int(frame_rate * 60 / MIN_BPM)
+    if len(onsets) <= max_lag * 2:
+        return frame_rate * 60 / PREFERRED_BPM
+
+    # Autocorrelación por FFT
+    size = 1 << int(np.ceil(np.log2(2 * len(onsets))))
+    spectrum = np.fft.rfft(onsets - onsets.mean(), size)
+    autocorr = np.fft.irfft(spectrum * np.conj(spectrum), size)[:max_lag + 1]
+
+    # Preferir tempos cercanos al tempo habitual (evita elegir el doble o la mitad)
+    lags = np.arange(min_lag, max_lag + 1)
+    bpm = frame_rate * 60 / lags
+    weight = np.exp(-0.5 * np.log2(bpm / PREFERRED_BPM) ** 2)
+    scores = autocorr[min_lag:max_lag + 1] * weight
+    return float(lags[np.argmax(scores)])
+
+
+def track_beats(onsets: np.ndarray, period: float) -> np.ndarray:
+    """
+    Seguimiento de beats por programación dinámica.
+
+    Cada ventana acumula su fuerza de ataque más el mejor puntaje de un beat
+    anterior a entre medio y dos periodos, penalizando separaciones distintas
+    al periodo. Retorna los índices de ventana de los beats.
+    """
+    n = len(onsets)
+    if n == 0:
+        return np.zeros(0, dtype=np.intp)
+
+    offsets = np.arange(-int(round(2 * period)), -int(round(period / 2)) + 1)
+    penalty = -BEAT_TIGHTNESS * np.log(-offsets / period) ** 2
+
+    score = onsets.astype(np.float64).copy()
+    backlink = np.full(n, -1, dtype=np.intp)
+    for i in range(-offsets[-1], n):
+        candidates = i + offsets
+        valid = candidates >= 0
+        values = score[candidates[valid]] + penalty[valid]
+        best = int(np.argmax(values))
+        if values[best] > 0:
+            score[i] += values[best]
+            backlink[i] = candidates[valid][best]
+
+    # Último beat: el de mejor puntaje dentro del último periodo
+    tail = score[max(0, n - int(round(period))):]
+    beat = n - len(tail) + int(np.argmax(tail))
+    beats = []
+    while beat >= 0:
+        beats.append(beat)
+        beat = backlink[beat]
+    return np.array(beats[::-1], dtype=np.intp)
+
+
+def analyze_audio(audio_path: str) -> dict:
+    """
+    Analiza la canción: tempo (BPM) y tiempos de beat en segundos.
+
+    El resultado se reutiliza para el mismo contenido de audio.
+    """
+    digest = file_digest(audio_path)
+    with _cache_lock:
+        if digest in _analysis_cache:
+            _analysis_cache.move_to_end(digest)
+            return _analysis_cache[digest]
+
+    samples = decode_mono(audio_path)
+    frame_rate = ANALYSIS_SAMPLE_RATE / HOP_SIZE
+    onsets = onset_strength(samples)
+    period = estimate_period(onsets, frame_rate)
+    beats = track_beats(onsets, period)
+
+    analysis = {
+        'tempo': round(60 * frame_rate / period, 2),
+        # El onset de una ventana corresponde a su centro
+        'beats': [round(float(beat * HOP_SIZE + FFT_SIZE / 2) / ANALYSIS_SAMPLE_RATE, 4) for beat in beats],
+        'duration': len(samples) / ANALYSIS_SAMPLE_RATE,
+    }
+
+    with _cache_lock:
+        _analysis_cache[digest] = analysis
+        while len(_analysis_cache) > ANALYSIS_CACHE_SIZE:
+            _analysis_cache.popitem(last=False)
+    return analysis
+
+
+def beat_cut_points(beats: list[float], duration: float, count: int, min_gap: float) -> list[float]:
+    """
+    Tiempos de corte entre `count` imágenes, ajustados al beat más cercano.
+
+    Cada corte parte de la división pareja de la canción y se mueve al beat más
+    cercano que deje al menos `min_gap` segundos por imagen (incluidas las que
+    faltan). Si ningún beat cercano sirve, se mantiene el corte parejo.
+    """
+    beats = np.asarray(beats, dtype=np.float64)
+    even = duration / count
+    cuts = []
+    previous = 0.0
+    for k in range(1, count):
+        target = k * even
+        lo = previous + min_gap
+        hi = duration - (count - k) * min_gap
+        candidates = beats[(beats >= lo) & (beats <= hi) & (np.abs(beats - target) <= even / 2)]
+        if len(candidates):
+            cut = float(candidates[np.argmin(np.abs(candidates - target))])
+        else:
+            cut = min(max(target, lo), hi)
+        cuts.append(cut)
+        previous = cut
+    return cuts
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Benchmark de punta a punta del render de videos.
+
+Genera datos sintéticos sin conexión (imágenes aleatorias con distintas
+proporciones, una canción senoidal o de ruido y un SRT de M líneas) y mide
+cada etapa del render de `app.process_video` para una matriz de
+resoluciones, fps, transiciones y typewriter:
+
+    images     preprocesar las imágenes a la resolución final
+    subtitles  leer el SRT, armar la línea de tiempo y la capa de subtítulos
+    titles     crear la tarjeta de intro
+    composite  componer todos los frames (incluye rasterizar los subtítulos)
+    encode     codificar los frames con x264 (mismos parámetros que el render)
+    mux        combinar video y audio con ffmpeg
+
+El resultado se guarda en JSON; con --compare se compara contra una corrida
+anterior y termina con código 1 si alguna etapa es más lenta que el umbral.
+"""
+
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+from itertools import product
+from pathlib import Path
+
+import numpy as np
+from moviepy import concatenate_videoclips
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import app  # noqa: E402
+from motion import slot_motion  # noqa: E402
+from slideshow import make_slideshow_clip, prepare_frame  # noqa: E402
+from subtitle_parser import parse_subtitles  # noqa: E402
+from timeline import build_timeline  # noqa: E402
+from title_cards import make_title_clip  # noqa: E402
+from transitions import get_transition  # noqa: E402
+
+STAGES = ('images', 'subtitles', 'titles', 'composite', 'encode', 'mux')
+
+# Tamaños de las imágenes sintéticas: horizontal, vertical, cuadrada y panorámica
+IMAGE_SIZES = [(1600, 900), (900, 1600), (1200, 1200), (2400, 800)]
+
+# Diferencias menores a esto (segundos) se consideran ruido al comparar
+MIN_REGRESSION_SECONDS = 0.05
+
+AUDIO_SAMPLE_RATE = 44100
+
+SUBTITLE_WORDS = ['la', 'noche', 'canta', 'sobre', 'el', 'mar', 'y', 'las', 'estrellas', 'bailan',
+                  'con', 'nuestra', 'canción', 'de', 'luz', 'corazón']
+
+
+def srt_timestamp(seconds: float) -> str:
+    """Segundos a 'HH:MM:SS,mmm'."""
+    millis = int(round(seconds * 1000))
+    hours, millis = divmod(millis, 3600000)
+    minutes, millis = divmod(millis, 60000)
+    secs, millis = divmod(millis, 1000)
+    return f'{hours:02d}:{minutes:02d}:{secs:02d},{millis:03d}'
+
+
+def make_fixtures(folder: Path, image_count: int, audio_seconds: float, subtitle_lines: int,
+                  audio_kind: str = 'sine', seed: int = 0) -> dict:
+    """Crea imágenes, audio (wav) y subtítulos (srt) sintéticos en `folder`."""
+    rng = np.random.default_rng(seed)
+    folder.mkdir(parents=True, exist_ok=True)
+
+    images = []
+    for i in range(image_count):
+        width, height = IMAGE_SIZES[i % len(IMAGE_SIZES)]
+        # Degradado con ruido: se comprime como una foto, no como ruido puro
+        y, x = np.mgrid[0:height, 0:width]
+        base = rng.integers(0, 256, 3)
+        gradient = np.stack([(x * 255 // width + base[0]) % 256,
+                             (y * 255 // height + base[1]) % 256,
+                             np.full_like(x, base[2])], axis=-1)
+        noise = rng.integers(-20, 21, (height, width, 3))
+        pixels = np.clip(gradient + noise, 0, 255).astype(np.uint8)
+        path = folder / f'img{i:03d}.jpg'
+        Image.fromarray(pixels).save(path, quality=90)
+        images.append(str(path))
+
+    # Canción: tono de 440 Hz o ruido blanco, mono de 16 bits
+    t = np.arange(int(audio_seconds * AUDIO_SAMPLE_RATE)) / AUDIO_SAMPLE_RATE
+    if audio_kind == 'noise':
+        samples = rng.uniform(-0.3, 0.3, len(t))
+    else:
+        samples = 0.3 * np.sin(2 * np.pi * 440 * t)
+    audio_path = folder / 'audio.wav'
+    with wave.open(str(audio_path), 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(AUDIO_SAMPLE_RATE)
+        f.writeframes((samples * 32767).astype('<i2').tobytes())
+
+    # Subtítulos repartidos en toda la canción, cada uno visible el 80% de su turno
+    srt_path = folder / 'subtitles.srt'
+    step = audio_seconds / max(1, subtitle_lines)
+    with open(srt_path, 'w', encoding='utf-8') as f:
+        for i in range(subtitle_lines):
+            words = rng.choice(SUBTITLE_WORDS, size=int(rng.integers(3, 9)))
+            start = i * step
+            f.write(f'{i + 1}\n{srt_timestamp(start)} --> {srt_timestamp(start + step * 0.8)}\n'
+                    f'{" ".join(words)}\n\n')
+
+    return {'images': images, 'audio': str(audio_path), 'srt': str(srt_path), 'duration': audio_seconds}
+
+
+def render_stages(fixtures: dict, config: dict, work_dir: Path) -> dict:
+    """Renderiza una vez con la configuración dada y retorna los segundos por etapa."""
+    width, height = config['resolution']
+    resolution = (width, height)
+    fps = config['fps']
+    transition_type = config['transition']
+    transition_duration = 0.5
+    timings = {}
+
+    start = time.perf_counter()
+    frames = [prepare_frame(path, resolution) for path in fixtures['images']]
+    timings['images'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    sub_cfg = {'font_path': app.FONTS['DejaVuSans-Bold'], 'typewriter_enabled': config['typewriter']}
+    intro_config = {
+        'text': 'Benchmark', 'duration': 2, 'font_path': app.FONTS['DejaVuSans-Bold'],
+        'font_size': max(20, width // 14), 'font_color': '#ffffff', 'bg_color': '#000000',
+        'bg_image': None, 'animation_in': 'fade', 'animation_out': 'none',
+    }
+    subtitles = parse_subtitles(fixtures['srt'])
+    transition = get_transition(transition_type)
+    timeline = build_timeline(
+        fixtures['images'], fixtures['duration'], resolution, fps, transition_type, transition_duration,
+        bool(transition and transition['overlap']), transition is not None, subtitles, sub_cfg,
+        intro_config, None, motions=[slot_motion('none', i) for i in range(len(frames))],
+    )
+    video = make_slideshow_clip(timeline, frames)
+    video = app.create_subtitle_overlay(
+        video, subtitles, resolution, font_size=max(20, width // 14), font_path=sub_cfg['font_path'],
+        typewriter_enabled=config['typewriter'],
+    )
+    timings['subtitles'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    intro = make_title_clip(intro_config, resolution)
+    video = app.with_hold_frames(concatenate_videoclips([intro, video], method='compose'), timeline)
+    timings['titles'] = time.perf_counter() - start
+
+    # Componer y codificar a la vez: el tiempo de get_frame es composición y
+    # el de escribir al pipe (y esperar a ffmpeg al final) es codificación
+    video_path = work_dir / 'video.mp4'
+    encoder = subprocess.Popen(
+        [app.SYSTEM_FFMPEG, '-y', '-v', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+         '-s', f'{width}x{height}', '-r', str(fps), '-i', '-',
+         '-c:v', 'libx264', '-preset', 'ultrafast', '-threads', str(app.FFMPEG_THREADS)]
+        + app.video_encode_params(fps) + [str(video_path)],
+        stdin=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
+    composite = encode = 0.0
+    for index in range(int(round(video.duration * fps))):
+        start = time.perf_counter()
+        frame = video.get_frame(index / fps)
+        composite += time.perf_counter() - start
+
+        start = time.perf_counter()
+        encoder.stdin.write(np.ascontiguousarray(frame, dtype=np.uint8).tobytes())
+        encode += time.perf_counter() - start
+
+    start = time.perf_counter()
+    encoder.stdin.close()
+    stderr = encoder.stderr.read()
+    if encoder.wait() != 0:
+        raise RuntimeError(f'ffmpeg falló al codificar: {stderr.decode(errors="replace")}')
+    timings['composite'] = composite
+    timings['encode'] = encode + time.perf_counter() - start
+    video.close()
+
+    start = time.perf_counter()
+    subprocess.run(
+        [app.SYSTEM_FFMPEG, '-y', '-i', str(video_path), '-itsoffset', str(intro_config['duration']),
+         '-i', fixtures['audio'], '-c:v', 'copy', '-c:a', 'aac', '-movflags', '+faststart',
+         str(work_dir / 'output.mp4')],
+        check=True, capture_output=True
+    )
+    timings['mux'] = time.perf_counter() - start
+
+    return timings
+
+
+def config_key(config: dict) -> str:
+    """Nombre estable de una configuración (para comparar corridas)."""
+    width, height = config['resolution']
+    typewriter = 'typewriter' if config['typewriter'] else 'plain'
+    return f"{width}x{height}@{config['fps']} {config['transition']} {typewriter}"
+
+
+def compare(results: list[dict], baseline: dict, threshold: float) -> list[str]:
+    """Etapas más lentas que la corrida base por más del umbral (fracción)."""
+    previous = {result['key']: result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        base = previous.get(result['key'])
+        if not base:
+            continue
+        for stage in STAGES + ('total',):
+            old = base['stages'].get(stage) if stage != 'total' else base['total']
+            new = result['stages'][stage] if stage != 'total' else result['total']
+            if old is None:
+                continue
+            if new > old * (1 + threshold) and new - old > MIN_REGRESSION_SECONDS:
+                regressions.append(f"{result['key']} {stage}: {old:.3f}s -> {new:.3f}s (+{(new / old - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark de punta a punta del render")
+    parser.add_argument("--images", type=int, default=8, help="Imágenes sintéticas (default: 8)")
+    parser.add_argument("--duration", type=float, default=20, help="Duración del audio en segundos (default: 20)")
+    parser.add_argument("--subtitles", type=int, default=10, help="Líneas del SRT (default: 10)")
+    parser.add_argument("--audio", choices=['sine', 'noise'], default='sine', help="Tipo de audio (default: sine)")
+    parser.add_argument("--resolutions", default="360x640,720x1280", help="Resoluciones separadas por coma")
+    parser.add_argument("--fps", default="4,24", help="Valores de fps separados por coma (default: 4,24)")
+    parser.add_argument("--transitions", default="crossfade,none", help="Transiciones separadas por coma")
+    parser.add_argument("--typewriter", default="on,off", help="Typewriter: on, off o ambos (default: on,off)")
+    parser.add_argument("--repeat", type=int, default=1, help="Repeticiones; se guarda la más rápida (default: 1)")
+    parser.add_argument("-o", "--output", default=None, help="Archivo JSON de resultados")
+    parser.add_argument("--compare", default=None, help="JSON de una corrida anterior para comparar")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Regresión máxima tolerada por etapa, en fracción (default: 0.10)")
+    args = parser.parse_args()
+
+    configs = [
+        {'resolution': tuple(map(int, resolution.split('x'))), 'fps': int(fps),
+         'transition': transition, 'typewriter': typewriter == 'on'}
+        for resolution, fps, transition, typewriter in product(
+            args.resolutions.split(','), args.fps.split(','),
+            args.transitions.split(','), args.typewriter.split(','))
+    ]
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='bench_render_') as tmp:
+        tmp = Path(tmp)
+        fixtures = make_fixtures(tmp / 'fixtures', args.images, args.duration, args.subtitles, args.audio)
+
+        print(f"{args.images} imágenes, {args.duration:.0f}s de audio ({args.audio}), {args.subtitles} subtítulos")
+        print(f"{'configuración':<36}" + ''.join(f'{stage:>10}' for stage in STAGES) + f"{'total':>10}")
+
+        for config in configs:
+            runs = [render_stages(fixtures, config, tmp) for _ in range(max(1, args.repeat))]
+            # La corrida más rápida es la menos afectada por ruido del sistema
+            best = min(runs, key=lambda timings: sum(timings.values()))
+            result = {
+                'key': config_key(config),
+                'config': {**config, 'resolution': list(config['resolution'])},
+                'stages': {stage: round(best[stage], 4) for stage in STAGES},
+                'total': round(sum(best.values()), 4),
+            }
+            results.append(result)
+            print(f"{result['key']:<36}" + ''.join(f"{result['stages'][stage]:>10.3f}" for stage in STAGES)
+                  + f"{result['total']:>10.3f}")
+
+    report = {
+        'fixtures': {'images': args.images, 'duration': args.duration,
+                     'subtitles': args.subtitles, 'audio': args.audio},
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                    'processor': platform.processor(), 'ffmpeg_threads': app.FFMPEG_THREADS},
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Resultados guardados en: {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"Regresiones (umbral {args.threshold * 100:.0f}%):")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"Sin regresiones respecto a {args.compare} (umbral {args.threshold * 100:.0f}%)")
+
+
+if __name__ == "__main__":
+    main()
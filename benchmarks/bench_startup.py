@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark del arranque de la aplicación web.
+
+Cada repetición corre en un proceso nuevo (sin módulos ya importados) y mide:
+
+    process    arrancar el intérprete e importar app.py (tiempo de pared)
+    import     importar app.py
+    first      primeras respuestas de /api/status y /watermark
+
+También verifica que importar app.py no cargue el stack de render (MoviePy,
+PIL, NumPy, proglog ni los módulos del pipeline): solo lo importan los renders.
+Termina con código 1 si la mediana de `import` supera --max-import o si se
+cargó algún módulo pesado, para usarlo como prueba de regresión.
+"""
+
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Módulos que importar app.py no debe cargar
+HEAVY_MODULES = (
+    'moviepy', 'imageio', 'PIL', 'proglog', 'numpy',
+    'slideshow', 'title_cards', 'frame_store', 'motion', 'transitions', 'audio_analysis', 'layers',
+)
+
+CHILD = '''
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {root!r})
+import app
+imported = time.perf_counter()
+loaded = sorted({{name.split('.')[0] for name in sys.modules}} & set({heavy!r}))
+client = app.app.test_client()
+client.get('/api/status/benchmark')
+client.get('/watermark')
+first = time.perf_counter()
+print(json.dumps({{'import': imported - start, 'first': first - imported, 'loaded': loaded}}))
+'''
+
+STAGES = ('process', 'import', 'first')
+
+
+def measure_startup() -> dict:
+    """Arranca un proceso nuevo que importa app.py y retorna sus tiempos."""
+    code = CHILD.format(root=str(ROOT), heavy=HEAVY_MODULES)
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, cwd=ROOT, check=True)
+    wall = time.perf_counter() - start
+    # app.py imprime la ruta de ffmpeg al importarse: el resultado es la última línea
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings['process'] = wall - timings['first']
+    return timings
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark del arranque de app.py")
+    parser.add_argument("--repeat", type=int, default=5, help="Procesos a medir (default: 5)")
+    parser.add_argument("--max-import", type=float, default=0.5,
+                        help="Mediana máxima tolerada para importar app.py, en segundos (default: 0.5)")
+    parser.add_argument("-o", "--output", default=None, help="Archivo JSON de resultados")
+    args = parser.parse_args()
+
+    runs = [measure_startup() for _ in range(max(1, args.repeat))]
+    medians = {stage: round(statistics.median(run[stage] for run in runs), 4) for stage in STAGES}
+    loaded = sorted({name for run in runs for name in run['loaded']})
+
+    print(f"{'etapa':<10}{'mediana':>10}{'mínimo':>10}{'máximo':>10}")
+    for stage in STAGES:
+        values = [run[stage] for run in runs]
+        print(f"{stage:<10}{medians[stage]:>10.3f}{min(values):>10.3f}{max(values):>10.3f}")
+
+    if args.output:
+        report = {
+            'machine': {'python': platform.python_version(), 'platform': platform.platform()},
+            'repeat': len(runs),
+            'median': medians,
+            'loaded': loaded,
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Resultados guardados en: {args.output}")
+
+    failed = False
+    if loaded:
+        print(f"Importar app.py cargó el stack de render: {', '.join(loaded)}")
+        failed = True
+    if medians['import'] > args.max_import:
+        print(f"Importar app.py tardó {medians['import']:.3f}s (máximo {args.max_import:.3f}s)")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print(f"Arranque dentro del límite ({medians['import']:.3f}s de {args.max_import:.3f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark de los kernels de transición.
+
+Mide el tiempo por frame de cada transición registrada en `transitions`,
+recorriendo el progreso de 0 a 1 a la resolución indicada. Como referencia
+incluye la mezcla con máscara float que hace MoviePy en CrossFadeIn/CrossFadeOut.
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from transitions import TRANSITIONS, TransitionBuffers  # noqa: E402
+
+
+def float_mask_crossfade(a: np.ndarray, b: np.ndarray, progress: float) -> np.ndarray:
+    """Mezcla equivalente a componer con una máscara float por frame."""
+    mask = np.full(a.shape[:2], progress, dtype=np.float64)[:, :, None]
+    return (b * mask + a * (1 - mask)).astype(np.uint8)
+
+
+def bench(func, frames: int) -> float:
+    """Ejecuta func(progress) para `frames` progresos y retorna ms por frame."""
+    progresses = np.linspace(0, 1, frames)
+    func(0.5)  # calentar caches
+    start = time.perf_counter()
+    for progress in progresses:
+        func(float(progress))
+    return (time.perf_counter() - start) * 1000 / frames
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Microbenchmark de transiciones")
+    parser.add_argument("-r", "--resolution", default="1080x1920", help="Resolución (default: 1080x1920)")
+    parser.add_argument("-n", "--frames", type=int, default=48, help="Frames por transición (default: 48)")
+    args = parser.parse_args()
+
+    width, height = map(int, args.resolution.split("x"))
+    rng = np.random.default_rng(0)
+    a = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    b = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    buffers = TransitionBuffers(height, width)
+
+    print(f"Resolución {width}x{height}, {args.frames} frames por transición")
+    print(f"{'transición':<16}{'ms/frame':>10}{'frames/s':>10}")
+
+    ms = bench(lambda p: float_mask_crossfade(a, b, p), args.frames)
+    print(f"{'(float mask)':<16}{ms:>10.2f}{1000 / ms:>10.1f}")
+
+    for name, transition in sorted(TRANSITIONS.items()):
+        kernel = transition['kernel']
+        ms = bench(lambda p: kernel(a, b, p, buffers), args.frames)
+        print(f"{name:<16}{ms:>10.2f}{1000 / ms:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
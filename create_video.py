@@ -2,90 +2,53 @@
 """
 Script para crear videos a partir de imágenes y música.
 Las imágenes se distribuyen equitativamente a lo largo de la duración de la canción.
+
+Con --batch (un árbol de carpetas) o --manifest (JSON) renderiza muchos videos
+en paralelo: cada video corre en su propio proceso, un error no detiene a los
+demás y los videos ya terminados se saltan al volver a ejecutar.
+
+Con --spec renderiza la misma spec JSON que /api/render (render_spec.py), con
+los archivos del almacén de assets y el pipeline de la aplicación web: la spec
+produce el mismo video por las dos vías.
 """
 
+import json
 import os
+import shutil
 import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-import re
 from moviepy import (
     ImageClip,
     AudioFileClip,
-    CompositeVideoClip,
     concatenate_videoclips,
     TextClip,
 )
 from moviepy.video.fx import CrossFadeIn, CrossFadeOut
 from PIL import ImageFont
 
+from layers import IndexedCompositeVideoClip
+from media_probe import AUDIO_EXTENSIONS
+from render_spec import DEFAULT_ASSET_FOLDER, AssetStore, resolve_spec
+from subtitle_parser import find_subtitle_file, parse_subtitles
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".gif", ".webp"}
+
 
 def get_images(folder: str) -> list[str]:
     """Obtiene todas las imágenes de una carpeta ordenadas alfabéticamente."""
-    extensions = {".jpg", ".jpeg", ".png", ".bmp", ".gif", ".webp"}
     images = []
 
     for file in sorted(Path(folder).iterdir()):
-        if file.suffix.lower() in extensions:
+        if file.suffix.lower() in IMAGE_EXTENSIONS:
             images.append(str(file))
 
     return images
 
 
-def get_subtitle_file(folder: str) -> str | None:
-    """Busca el primer archivo .srt en una carpeta."""
-    extensions = {".srt"}
-
-    folder_path = Path(folder)
-    if not folder_path.exists():
-        return None
-
-    for file in sorted(folder_path.iterdir()):
-        if file.suffix.lower() in extensions:
-            return str(file)
-
-    return None
-
-
-def parse_srt(srt_path: str) -> list[dict]:
-    """
-    Parsea un archivo de subtítulos .srt
-
-    Retorna una lista de diccionarios con:
-    - start: tiempo de inicio en segundos
-    - end: tiempo de fin en segundos
-    - text: texto del subtítulo
-    """
-    subtitles = []
-
-    with open(srt_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-
-    # Patrón para parsear bloques de subtítulos
-    pattern = r'(\d+)\s*\n(\d{2}):(\d{2}):(\d{2})[,.](\d{3})\s*-->\s*(\d{2}):(\d{2}):(\d{2})[,.](\d{3})\s*\n(.*?)(?=\n\n|\n*$)'
-
-    matches = re.findall(pattern, content, re.DOTALL)
-
-    for match in matches:
-        # Convertir tiempos a segundos
-        start_h, start_m, start_s, start_ms = int(match[1]), int(match[2]), int(match[3]), int(match[4])
-        end_h, end_m, end_s, end_ms = int(match[5]), int(match[6]), int(match[7]), int(match[8])
-
-        start_time = start_h * 3600 + start_m * 60 + start_s + start_ms / 1000
-        end_time = end_h * 3600 + end_m * 60 + end_s + end_ms / 1000
-
-        # Limpiar texto (remover tags HTML si existen)
-        text = re.sub(r'<[^>]+>', '', match[9].strip())
-        text = text.replace('\n', ' ')
-
-        subtitles.append({
-            'start': start_time,
-            'end': end_time,
-            'text': text
-        })
-
-    return subtitles
-
-
 def wrap_text(text: str, font_size: int, width: int, font_path: str) -> str:
     """
     Envuelve el texto para que quepan palabras completas sin partir.
@@ -140,7 +103,7 @@ def wrap_text(text: str, font_size: int, width: int, font_path: str) -> str:
 
 
 def create_subtitle_clips(
-    subtitles: list[dict],
+    subtitles: list,
     resolution: tuple[int, int],
     font_size: int = 75,
     font_color: str = 'white',
@@ -158,8 +121,8 @@ def create_subtitle_clips(
     subtitle_clips = []
 
     for sub in subtitles:
-        duration = sub['end'] - sub['start']
-        text = sub['text']
+        duration = sub.end - sub.start
+        text = sub.text
 
         if not text:
             continue
@@ -197,7 +160,7 @@ def create_subtitle_clips(
             )
 
             txt_clip = txt_clip.with_duration(clip_duration)
-            start_time = sub['start'] + (i - 1) * time_per_char
+            start_time = sub.start + (i - 1) * time_per_char
             txt_clip = txt_clip.with_start(start_time)
             # Posicionar en la parte inferior con margen (más arriba)
             txt_clip = txt_clip.with_position(('center', resolution[1] - 250))
@@ -208,32 +171,37 @@ def create_subtitle_clips(
 
 
 def create_video(
-    images_folder: str,
+    images_folder: str | list[str],
     audio_path: str,
     output_path: str = "output.mp4",
     transition_duration: float = 0.5,
     resolution: tuple[int, int] = (1080, 1920),
     fps: int = 24,
     subtitles_path: str = None,
+    threads: int = 4,
+    preset: str = "medium",
+    logger: str = "bar",
 ):
     """
     Crea un video a partir de imágenes y audio.
 
     Args:
-        images_folder: Carpeta con las imágenes
+        images_folder: Carpeta con las imágenes (o lista de imágenes en orden)
         audio_path: Ruta al archivo de audio
         output_path: Ruta del video de salida
         transition_duration: Duración de las transiciones en segundos
         resolution: Resolución del video (ancho, alto)
         fps: Frames por segundo
         subtitles_path: Ruta al archivo de subtítulos .srt (opcional)
+        threads: Threads de FFmpeg
+        preset: Preset de x264
+        logger: Barra de progreso de MoviePy ('bar' o None)
     """
     # Obtener imágenes
-    images = get_images(images_folder)
+    images = list(images_folder) if isinstance(images_folder, list) else get_images(images_folder)
 
     if not images:
-        print(f"No se encontraron imágenes en: {images_folder}")
-        sys.exit(1)
+        raise ValueError(f"No se encontraron imágenes en: {images_folder}")
 
     print(f"Encontradas {len(images)} imágenes")
 
@@ -293,7 +261,7 @@ def create_video(
             current_time += duration_per_image - transition_duration
 
         # Crear video compuesto
-        video = CompositeVideoClip(final_clips, size=resolution)
+        video = IndexedCompositeVideoClip(final_clips, size=resolution)
         video = video.with_duration(total_duration)
     else:
         video = concatenate_videoclips(clips, method="compose")
@@ -302,20 +270,21 @@ def create_video(
     if subtitles_path:
         # Si es una carpeta, buscar archivo .srt dentro
         if Path(subtitles_path).is_dir():
-            srt_file = get_subtitle_file(subtitles_path)
+            srt_file = find_subtitle_file(subtitles_path)
             if not srt_file:
-                print(f"No se encontraron archivos .srt en: {subtitles_path}")
+                print(f"No se encontraron archivos .srt/.vtt en: {subtitles_path}")
             else:
                 subtitles_path = srt_file
 
         if subtitles_path and Path(subtitles_path).is_file():
             print(f"Cargando subtítulos desde: {subtitles_path}")
-            subtitles = parse_srt(subtitles_path)
+            subtitles = parse_subtitles(subtitles_path)
             print(f"Encontrados {len(subtitles)} subtítulos")
 
             if subtitles:
                 subtitle_clips = create_subtitle_clips(subtitles, resolution)
-                video = CompositeVideoClip([video] + subtitle_clips, size=resolution)
+                # Un clip por letra: el índice evita revisarlos todos en cada frame
+                video = IndexedCompositeVideoClip([video] + subtitle_clips, size=resolution)
                 video = video.with_duration(total_duration)
 
     # Agregar audio
@@ -328,8 +297,9 @@ def create_video(
         fps=fps,
         codec="libx264",
         audio_codec="aac",
-        threads=4,
-        preset="medium",
+        threads=threads,
+        preset=preset,
+        logger=logger,
     )
 
     # Limpiar
@@ -341,6 +311,207 @@ def create_video(
     print(f"Video creado exitosamente: {output_path}")
 
 
+def find_audio_file(folder: Path) -> str | None:
+    """Primer archivo de audio (orden alfabético) de una carpeta."""
+    for file in sorted(folder.iterdir()):
+        if file.suffix.lower() in AUDIO_EXTENSIONS:
+            return str(file)
+    return None
+
+
+def check_unique_outputs(items: list[dict]) -> None:
+    """Lanza ValueError si dos videos del lote se escribirían en el mismo archivo."""
+    seen = {}
+    for item in items:
+        output = os.path.abspath(item["output"])
+        if output in seen:
+            raise ValueError(
+                f"{seen[output]['images']} y {item['images']} se guardarían en el mismo archivo: {output}"
+            )
+        seen[output] = item
+
+
+def collect_batch_items(root: str, output_dir: str, audio_path: str = None,
+                        subtitles_path: str = None) -> list[dict]:
+    """
+    Un video por cada carpeta del árbol que tenga imágenes.
+
+    El audio y los subtítulos se buscan en la misma carpeta; si no hay, se
+    usan `audio_path` y `subtitles_path` (comunes a todo el lote). El video se
+    llama como la ruta relativa de la carpeta ('a/b' -> 'a_b.mp4'); si dos
+    carpetas dan el mismo nombre (como 'a/b' y 'a_b') se lanza ValueError.
+    """
+    root_path = Path(root)
+    items = []
+    for folder, dirs, _ in os.walk(root_path):
+        dirs.sort()
+        folder = Path(folder)
+        if not get_images(str(folder)):
+            continue
+        relative = folder.relative_to(root_path)
+        name = "_".join(relative.parts) if relative.parts else root_path.resolve().name
+        items.append({
+            "name": name,
+            "images": str(folder),
+            "audio": find_audio_file(folder) or audio_path,
+            "subtitles": find_subtitle_file(str(folder)) or subtitles_path,
+            "output": str(Path(output_dir) / f"{name}.mp4"),
+        })
+    check_unique_outputs(items)
+    return items
+
+
+def render_spec_file(path: str, assets_root: str, output_path: str) -> None:
+    """
+    Renderiza una spec de render (ver render_spec.py) con el mismo pipeline
+    que /api/render (process_video de app.py), con los assets de `assets_root`.
+
+    Una spec produce el mismo video por las dos vías: la configuración y el
+    codificador son los de la aplicación web, no las opciones de este script.
+    Lanza SpecError si la spec es inválida y RuntimeError si el render falla.
+    """
+    import app as web
+
+    with open(path, "r", encoding="utf-8") as f:
+        resolved = resolve_spec(json.load(f), AssetStore(assets_root), web.FONTS)
+
+    job_id = f"cli_{uuid.uuid4()}"
+    web.jobs[job_id] = {"status": "queued", "progress": 0, "message": "En cola...", "output_file": None}
+    worker = threading.Thread(
+        target=web.process_video,
+        args=(job_id, resolved["images"], resolved["audio"], resolved["srt"]),
+        kwargs=resolved["options"],
+    )
+    worker.start()
+
+    # Mostrar el avance igual que el cliente web, a partir del estado del trabajo
+    job = web.jobs[job_id]
+    last = None
+    while worker.is_alive():
+        worker.join(0.5)
+        status = (job["progress"], job["message"])
+        if status != last:
+            print(f"[{job['progress']:3.0f}%] {job['message']}")
+            last = status
+
+    frame_store = job.get("frame_store")
+    if frame_store and os.path.exists(frame_store):
+        os.remove(frame_store)
+    web.jobs.pop(job_id)
+    if job["status"] != "completed":
+        raise RuntimeError(job["message"])
+    shutil.move(job["output_file"], output_path)
+    print(f"Video creado exitosamente: {output_path}")
+
+
+def read_manifest(path: str, output_dir: str) -> list[dict]:
+    """
+    Lee un manifiesto JSON: lista de {"images", "audio", "subtitles", "output"}.
+
+    "subtitles" y "output" son opcionales; las rutas relativas se resuelven
+    desde la carpeta del manifiesto.
+    """
+    base = Path(path).parent
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+
+    def resolve(value):
+        return str(base / value) if value else None
+
+    if not isinstance(entries, list):
+        raise ValueError(f"El manifiesto debe ser una lista de videos: {path}")
+
+    items = []
+    for i, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            raise ValueError(f"Entrada {i + 1} del manifiesto: debe ser un objeto")
+        if not isinstance(entry.get("images"), str) or not entry["images"]:
+            raise ValueError(f"Entrada {i + 1} del manifiesto: falta \"images\"")
+        for field in ("audio", "subtitles", "output", "name"):
+            if entry.get(field) is not None and not isinstance(entry[field], str):
+                raise ValueError(f"Entrada {i + 1} del manifiesto: \"{field}\" debe ser texto")
+        name = entry.get("name") or Path(entry["images"]).name or f"video_{i + 1}"
+        items.append({
+            "name": name,
+            "images": resolve(entry["images"]),
+            "audio": resolve(entry.get("audio")),
+            "subtitles": resolve(entry.get("subtitles")),
+            "output": resolve(entry.get("output")) or str(Path(output_dir) / f"{name}.mp4"),
+        })
+    check_unique_outputs(items)
+    return items
+
+
+def render_batch_item(item: dict, options: dict) -> float:
+    """
+    Renderiza un video del lote (en un proceso del pool) y retorna su duración.
+
+    Se escribe a un archivo temporal y se renombra al terminar: un video con
+    el nombre final siempre está completo.
+    """
+    if not item["audio"]:
+        raise ValueError(f"No se encontró audio para: {item['images']}")
+
+    start = time.time()
+    output = Path(item["output"])
+    output.parent.mkdir(parents=True, exist_ok=True)
+    partial = output.with_name(f"{output.stem}.part{output.suffix}")
+    try:
+        create_video(
+            images_folder=item["images"],
+            audio_path=item["audio"],
+            output_path=str(partial),
+            subtitles_path=item["subtitles"],
+            logger=None,
+            **options,
+        )
+        os.replace(partial, output)
+    finally:
+        if partial.exists():
+            partial.unlink()
+    return time.time() - start
+
+
+def run_batch(items: list[dict], jobs: int, options: dict, force: bool = False) -> int:
+    """Renderiza los videos del lote en paralelo. Retorna cuántos fallaron."""
+    pending = [item for item in items if force or not Path(item["output"]).exists()]
+    skipped = len(items) - len(pending)
+    if skipped:
+        print(f"Saltando {skipped} videos ya terminados")
+    if not pending:
+        return 0
+
+    print(f"Renderizando {len(pending)} videos con {jobs} procesos")
+    start = time.time()
+    results = []
+
+    # Un proceso nuevo por video: la memoria de MoviePy se libera al terminar
+    with ProcessPoolExecutor(max_workers=jobs, max_tasks_per_child=1) as executor:
+        futures = {executor.submit(render_batch_item, item, options): item for item in pending}
+        for done, future in enumerate(as_completed(futures), 1):
+            item = futures[future]
+            try:
+                elapsed = future.result()
+                results.append((item["name"], "OK", elapsed))
+                print(f"[{done}/{len(pending)}] {item['name']}: OK ({elapsed:.1f}s)")
+            except Exception as e:
+                # Solo la primera línea del error en el resumen
+                message = (str(e) or repr(e)).splitlines()[0]
+                results.append((item["name"], f"Error: {message}", None))
+                print(f"[{done}/{len(pending)}] {item['name']}: Error: {e}")
+
+    # Resumen con el tiempo de cada video
+    failed = sum(1 for _, status, _ in results if status != "OK")
+    width = max(len(name) for name, _, _ in results)
+    print("\nResumen:")
+    for name, status, elapsed in sorted(results):
+        timing = f"{elapsed:8.1f}s" if elapsed is not None else " " * 9
+        print(f"  {name:<{width}}  {timing}  {status}")
+    print(f"{len(pending) - failed} de {len(pending)} videos creados en {time.time() - start:.1f}s"
+          + (f" ({skipped} ya existían)" if skipped else ""))
+    return failed
+
+
 def main():
     import argparse
 
@@ -349,13 +520,11 @@ def main():
     )
     parser.add_argument(
         "-i", "--images",
-        required=True,
         help="Carpeta con las imágenes"
     )
     parser.add_argument(
         "-a", "--audio",
-        required=True,
-        help="Archivo de audio (mp3, wav, etc.)"
+        help="Archivo de audio (mp3, wav, etc.); en lote, el audio común"
     )
     parser.add_argument(
         "-o", "--output",
@@ -382,7 +551,54 @@ def main():
     parser.add_argument(
         "-s", "--subtitles",
         default=None,
-        help="Carpeta o archivo de subtítulos .srt (opcional)"
+        help="Carpeta o archivo de subtítulos .srt/.vtt (opcional)"
+    )
+    parser.add_argument(
+        "--preset",
+        default="medium",
+        help="Preset de x264 (default: medium)"
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="Threads de FFmpeg por video (default: 4, en lote: núcleos / jobs)"
+    )
+    parser.add_argument(
+        "-b", "--batch",
+        default=None,
+        help="Carpeta raíz: un video por cada subcarpeta con imágenes"
+    )
+    parser.add_argument(
+        "-m", "--manifest",
+        default=None,
+        help="Manifiesto JSON con la lista de videos a crear"
+    )
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=max(1, (os.cpu_count() or 1) // 2),
+        help="Videos renderizados en paralelo en modo lote (default: núcleos / 2)"
+    )
+    parser.add_argument(
+        "--output-dir",
+        default=None,
+        help="Carpeta de salida en modo lote (default: la carpeta raíz o la del manifiesto)"
+    )
+    parser.add_argument(
+        "--spec",
+        default=None,
+        help="Spec JSON de render (assets por hash, ver render_spec.py); se renderiza como en /api/render"
+    )
+    parser.add_argument(
+        "--assets",
+        default=DEFAULT_ASSET_FOLDER,
+        help=f"Carpeta de assets de las specs (default: {DEFAULT_ASSET_FOLDER})"
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="En modo lote, volver a renderizar los videos que ya existen"
     )
 
     args = parser.parse_args()
@@ -390,15 +606,56 @@ def main():
     # Parsear resolución
     width, height = map(int, args.resolution.split("x"))
 
-    create_video(
-        images_folder=args.images,
-        audio_path=args.audio,
-        output_path=args.output,
-        transition_duration=args.transition,
-        resolution=(width, height),
-        fps=args.fps,
-        subtitles_path=args.subtitles,
-    )
+    options = {
+        "transition_duration": args.transition,
+        "resolution": (width, height),
+        "fps": args.fps,
+        "preset": args.preset,
+    }
+
+    if args.batch or args.manifest:
+        # Repartir los núcleos entre los videos simultáneos
+        options["threads"] = args.threads or max(1, (os.cpu_count() or 1) // args.jobs)
+        try:
+            if args.manifest:
+                output_dir = args.output_dir or str(Path(args.manifest).parent)
+                items = read_manifest(args.manifest, output_dir)
+            else:
+                output_dir = args.output_dir or args.batch
+                items = collect_batch_items(args.batch, output_dir, args.audio, args.subtitles)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        if not items:
+            print("No se encontraron videos para crear")
+            sys.exit(1)
+        if run_batch(items, args.jobs, options, force=args.force):
+            sys.exit(1)
+        return
+
+    if args.spec:
+        try:
+            render_spec_file(args.spec, args.assets, args.output)
+        except (ValueError, RuntimeError) as e:
+            print(e)
+            sys.exit(1)
+        return
+
+    if not args.images or not args.audio:
+        parser.error("se requieren --images y --audio (o --batch / --manifest / --spec)")
+
+    try:
+        create_video(
+            images_folder=args.images,
+            audio_path=args.audio,
+            output_path=args.output,
+            subtitles_path=args.subtitles,
+            threads=args.threads or 4,
+            **options,
+        )
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
 
 
 if __name__ == "__main__":
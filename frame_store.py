@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Almacén de frames preprocesados en un solo archivo mapeado en memoria.
+
+Cada imagen se escala/recorta a la resolución final una sola vez y se escribe
+como un arreglo crudo uint8 alto×ancho×3. El archivo empieza con una cabecera
+(firma, largo y un índice JSON: resolución, imágenes y slot -> entrada) y los
+frames empiezan alineados a página, así que se pueden mapear con
+`numpy.memmap` en modo solo lectura: `store[i]` es una vista del archivo, sin
+copias, y todos los procesos que abren el mismo archivo (render, miniaturas,
+vistas previas) comparten la copia del page cache del sistema.
+"""
+
+import json
+import os
+import struct
+from functools import partial
+
+import numpy as np
+
+FRAME_STORE_MAGIC = b'VMFRAMES'
+FRAME_STORE_VERSION = 1
+
+# Los frames empiezan en un múltiplo de esto (páginas de memoria)
+FRAME_STORE_ALIGNMENT = 4096
+
+_HEADER_PREFIX = struct.Struct('<8sII')
+
+
+class FrameStore:
+    """Frames de un render mapeados en solo lectura desde un archivo."""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            magic, version, index_size = _HEADER_PREFIX.unpack(f.read(_HEADER_PREFIX.size))
+            if magic != FRAME_STORE_MAGIC or version != FRAME_STORE_VERSION:
+                raise ValueError(f'No es un almacén de frames válido: {path}')
+            index = json.loads(f.read(index_size))
+
+        self.path = path
+        self.resolution = tuple(index['resolution'])
+        self.images = index['images']
+        self.slots = index['slots']
+        self._positions = {image_path: i for i, image_path in enumerate(self.images)}
+        width, height = self.resolution
+        self._array = np.memmap(
+            path, dtype=np.uint8, mode='r', offset=index['data_offset'],
+            shape=(len(self.images), height, width, 3),
+        )
+
+    @classmethod
+    def build(cls, path: str, images: list[str], resolution: tuple[int, int],
+              loader=None, on_progress=None) -> 'FrameStore':
+        """
+        Preprocesa las imágenes y escribe el almacén en `path`.
+
+        Las imágenes repetidas se guardan una sola vez. Solo hay un frame en
+        memoria a la vez; el archivo se escribe aparte y se renombra al final.
+
+        Args:
+            loader: loader(image_path) -> frame (por defecto prepare_frame)
+            on_progress: on_progress(i, total) después de cada imagen
+        """
+        if loader is None:
+            from slideshow import prepare_frame
+            loader = partial(prepare_frame, resolution=resolution)
+        width, height = resolution
+
+        unique = list(dict.fromkeys(images))
+        position = {image_path: i for i, image_path in enumerate(unique)}
+        index = {
+            'resolution': [width, height],
+            'images': unique,
+            'slots': [position[image_path] for image_path in images],
+            'data_offset': 0,
+        }
+
+        # El índice depende de data_offset: calcularlo con el índice ya completo
+        header_size = _HEADER_PREFIX.size + len(json.dumps(index)) + 32
+        index['data_offset'] = -(-header_size // FRAME_STORE_ALIGNMENT) * FRAME_STORE_ALIGNMENT
+        index_bytes = json.dumps(index).encode('utf-8')
+
+        partial_path = f'{path}.part'
+        try:
+            with open(partial_path, 'wb') as f:
+                f.write(_HEADER_PREFIX.pack(FRAME_STORE_MAGIC, FRAME_STORE_VERSION, len(index_bytes)))
+                f.write(index_bytes)
+                f.seek(index['data_offset'])
+                for i, image_path in enumerate(unique):
+                    frame = np.ascontiguousarray(loader(image_path), dtype=np.uint8)
+                    if frame.shape != (height, width, 3):
+                        raise ValueError(f'Frame con forma {frame.shape} en {image_path}')
+                    f.write(frame.data)
+                    if on_progress:
+                        on_progress(i + 1, len(unique))
+            os.replace(partial_path, path)
+        finally:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+
+        return cls(path)
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def __getitem__(self, slot: int) -> np.ndarray:
+        """Frame del slot: vista de solo lectura del archivo mapeado."""
+        return self._array[self.slots[slot]]
+
+    def frame(self, image_path: str, resolution: tuple[int, int] = None) -> np.ndarray:
+        """Frame de una imagen por su ruta (misma firma que un loader de FrameWindow)."""
+        if resolution is not None and tuple(resolution) != self.resolution:
+            raise ValueError(f'El almacén es de {self.resolution}, no de {tuple(resolution)}')
+        return self._array[self._positions[image_path]]
+
+    @property
+    def nbytes(self) -> int:
+        return self._array.nbytes
+
+    def close(self) -> None:
+        """Suelta el mapeo; se libera cuando no quedan vistas que lo usen."""
+        self._array = None
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Medición por etapas de los trabajos de render.
+
+Cada etapa de un trabajo (cargar audio, preprocesar imágenes, subtítulos,
+codificar, combinar audio...) se mide con `stage(job, nombre)`: tiempo de
+pared, CPU del hilo del trabajo, CPU de los subprocesos (ffmpeg), pico de
+memoria (RSS) y frames y bytes producidos. Las mediciones se guardan en
+`job['stages']` y se acumulan en histogramas por etapa que `METRICS.render()`
+exporta en el formato de texto de Prometheus.
+
+El RSS es del proceso completo y la CPU de subprocesos se mide con
+RUSAGE_CHILDREN, así que con varios trabajos simultáneos ambos valores
+incluyen a los demás trabajos.
+"""
+
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+
+# Intervalo de muestreo del RSS mientras hay etapas abiertas
+RSS_SAMPLE_INTERVAL = 0.05
+
+# Límites de los histogramas
+SECONDS_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+RSS_BUCKETS = tuple(mb * 1024 * 1024 for mb in (128, 256, 512, 1024, 2048, 4096, 8192))
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def current_rss() -> int:
+    """Memoria residente actual del proceso en bytes."""
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        # Sin /proc: el máximo histórico es la mejor aproximación disponible
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def children_cpu() -> float:
+    """CPU (usuario + sistema) de los subprocesos terminados."""
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class Span:
+    """Medición de una etapa."""
+
+    __slots__ = ('name', 'wall', 'cpu', 'child_cpu', 'peak_rss', 'frames', 'bytes', 'error')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.child_cpu = 0.0
+        self.peak_rss = 0
+        self.frames = 0
+        self.bytes = 0
+        self.error = False
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'wall': round(self.wall, 4),
+            'cpu': round(self.cpu, 4),
+            'child_cpu': round(self.child_cpu, 4),
+            'peak_rss': self.peak_rss,
+            'frames': self.frames,
+            'bytes': self.bytes,
+            'error': self.error,
+        }
+
+
+class RssSampler:
+    """Hilo que registra el pico de RSS de las etapas abiertas (duerme si no hay)."""
+
+    def __init__(self, interval: float = RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self._spans = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def _sample(self) -> None:
+        rss = current_rss()
+        with self._lock:
+            for span in self._spans:
+                if rss > span.peak_rss:
+                    span.peak_rss = rss
+
+    def track(self, span: Span) -> None:
+        with self._lock:
+            self._spans.add(span)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='rss-sampler', daemon=True)
+                self._thread.start()
+        self._wake.set()
+        self._sample()
+
+    def untrack(self, span: Span) -> None:
+        self._sample()
+        with self._lock:
+            self._spans.discard(span)
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                idle = not self._spans
+            if idle:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            self._sample()
+            time.sleep(self.interval)
+
+
+class Histogram:
+    """Histograma acumulado con los límites dados (más +Inf)."""
+
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class StageMetrics:
+    """Agregado de todas las etapas medidas, por nombre de etapa."""
+
+    HISTOGRAMS = (
+        ('video_stage_seconds', 'wall', SECONDS_BUCKETS, 'Tiempo de pared de cada etapa del render'),
+        ('video_stage_cpu_seconds', 'cpu', SECONDS_BUCKETS, 'CPU del hilo del trabajo en cada etapa'),
+        ('video_stage_peak_rss_bytes', 'peak_rss', RSS_BUCKETS, 'Pico de memoria residente durante cada etapa'),
+    )
+    COUNTERS = (
+        ('video_stage_child_cpu_seconds_total', 'child_cpu', 'CPU de los subprocesos (ffmpeg) en cada etapa'),
+        ('video_stage_frames_total', 'frames', 'Frames producidos en cada etapa'),
+        ('video_stage_bytes_total', 'bytes', 'Bytes escritos en cada etapa'),
+        ('video_stage_errors_total', 'error', 'Etapas terminadas con error'),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._jobs = {}
+
+    def observe(self, span: Span) -> None:
+        with self._lock:
+            for metric, attr, bounds, _ in self.HISTOGRAMS:
+                key = (metric, span.name)
+                if key not in self._histograms:
+                    self._histograms[key] = Histogram(bounds)
+                self._histograms[key].observe(getattr(span, attr))
+            for metric, attr, _ in self.COUNTERS:
+                key = (metric, span.name)
+                self._counters[key] = self._counters.get(key, 0) + getattr(span, attr)
+
+    def job_finished(self, status: str) -> None:
+        """Cuenta un trabajo terminado ('completed', 'error', 'cancelled')."""
+        with self._lock:
+            self._jobs[status] = self._jobs.get(status, 0) + 1
+
+    def render(self) -> str:
+        """Métricas en el formato de texto de Prometheus."""
+        lines = []
+        with self._lock:
+            for metric, _, _, help_text in self.HISTOGRAMS:
+                lines.append(f'# HELP {metric} {help_text}')
+                lines.append(f'# TYPE {metric} histogram')
+                for (name, stage), histogram in sorted(self._histograms.items()):
+                    if name != metric:
+                        continue
+                    for bound, count in zip(histogram.bounds, histogram.counts):
+                        lines.append(f'{metric}_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                    lines.append(f'{metric}_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                    lines.append(f'{metric}_sum{{stage="{stage}"}} {histogram.sum}')
+                    lines.append(f'{metric}_count{{stage="{stage}"}} {histogram.count}')
+            for metric, _, help_text in self.COUNTERS:
+                lines.append(f'# HELP {metric} {help_text}')
+                lines.append(f'# TYPE {metric} counter')
+                for (name, stage), value in sorted(self._counters.items()):
+                    if name == metric:
+                        lines.append(f'{metric}{{stage="{stage}"}} {value}')
+            lines.append('# HELP video_jobs_total Trabajos de render terminados por estado')
+            lines.append('# TYPE video_jobs_total counter')
+            for status, count in sorted(self._jobs.items()):
+                lines.append(f'video_jobs_total{{status="{status}"}} {count}')
+        lines.append('# HELP video_process_rss_bytes Memoria residente actual del proceso')
+        lines.append('# TYPE video_process_rss_bytes gauge')
+        lines.append(f'video_process_rss_bytes {current_rss()}')
+        return '\n'.join(lines) + '\n'
+
+
+# Métricas del proceso y muestreador de RSS compartidos por todos los trabajos
+METRICS = StageMetrics()
+_sampler = RssSampler()
+
+
+@contextmanager
+def stage(job: dict, name: str):
+    """
+    Mide una etapa del trabajo y la agrega a `job['stages']` y a METRICS.
+
+    El span entregado permite sumar los frames y bytes producidos. Si la
+    etapa termina con una excepción se registra igual (con error=True).
+    """
+    span = Span(name)
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    child_start = children_cpu()
+    _sampler.track(span)
+    try:
+        yield span
+    except BaseException:
+        span.error = True
+        raise
+    finally:
+        _sampler.untrack(span)
+        span.wall = time.perf_counter() - wall_start
+        span.cpu = time.thread_time() - cpu_start
+        span.child_cpu = children_cpu() - child_start
+        job.setdefault('stages', []).append(span.to_dict())
+        METRICS.observe(span)
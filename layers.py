@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Composición de capas con índice de intervalos.
+
+`CompositeVideoClip` de MoviePy revisa en cada frame todas sus capas para saber
+cuáles se están reproduciendo (y otra vez para la máscara). Con miles de clips
+de texto eso domina el costo por frame. `IndexedCompositeVideoClip` compone
+igual, pero obtiene las capas activas de un `IntervalIndex` por cubetas de
+tiempo, así que solo visita las capas del instante t.
+"""
+
+from moviepy import CompositeVideoClip
+
+from timeline import IntervalIndex
+
+# Ancho de cubeta cuando los clips no tienen fps
+DEFAULT_BUCKET_SECONDS = 0.1
+
+
+class IndexedCompositeVideoClip(CompositeVideoClip):
+    """CompositeVideoClip que busca las capas activas en un índice de intervalos."""
+
+    def __init__(self, clips, size=None, bg_color=None, use_bgclip=False, is_mask=False,
+                 bucket_size: float = None):
+        super().__init__(clips, size=size, bg_color=bg_color, use_bgclip=use_bgclip, is_mask=is_mask)
+
+        if bucket_size is None:
+            bucket_size = 1 / self.fps if self.fps else DEFAULT_BUCKET_SECONDS
+
+        # Las capas sin fin (sin duración) se revisan siempre
+        bounded = [i for i, clip in enumerate(self.clips) if clip.end is not None]
+        self.unbounded = [i for i, clip in enumerate(self.clips) if clip.end is None]
+        self.bounded = bounded
+        self.index = IntervalIndex([(self.clips[i].start, self.clips[i].end) for i in bounded], bucket_size)
+
+        # La máscara compuesta también debe usar el índice
+        if type(self.mask) is CompositeVideoClip:
+            self.mask = IndexedCompositeVideoClip(
+                self.mask.clips, self.mask.size, is_mask=True, bg_color=0.0, bucket_size=bucket_size
+            )
+
+    def playing_clips(self, t=0):
+        """Capas que se reproducen en t, en orden de capa."""
+        positions = [self.bounded[i] for i in self.index.active(t)]
+        if self.unbounded:
+            positions = sorted(positions + [i for i in self.unbounded if t >= self.clips[i].start])
+        return [self.clips[i] for i in positions]
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Metadatos de archivos de audio y video sin decodificarlos.
+
+`probe_media` usa ffprobe si está instalado y, si no, la cabecera que imprime
+`ffmpeg -i` (solo lee el contenedor, no decodifica el audio). El resultado se
+recuerda por ruta, tamaño y fecha de modificación: cada archivo se inspecciona
+una sola vez aunque lo usen varios trabajos.
+"""
+
+import json
+import os
+import re
+import shutil
+import subprocess
+from functools import lru_cache
+
+FFMPEG = shutil.which('ffmpeg')
+FFPROBE = shutil.which('ffprobe') or (
+    FFMPEG.replace('ffmpeg', 'ffprobe') if FFMPEG and os.path.exists(FFMPEG.replace('ffmpeg', 'ffprobe')) else None
+)
+
+# Extensiones de audio aceptadas al buscar canciones en una carpeta
+AUDIO_EXTENSIONS = {'.mp3', '.wav', '.m4a', '.aac', '.ogg', '.flac'}
+
+# Archivos distintos cuyos metadatos se recuerdan
+PROBE_CACHE_SIZE = 512
+
+_INPUT_PATTERN = re.compile(r'Input #0, (.+?), from ')
+_DURATION_PATTERN = re.compile(r'Duration: (\d+):(\d+):(\d+(?:\.\d+)?)')
+_AUDIO_PATTERN = re.compile(r'Stream #0:\d+\S*: Audio: (\w+)(.*)')
+_CHANNEL_LAYOUTS = {'mono': 1, 'stereo': 2}
+
+
+def _channel_count(layout: str) -> int | None:
+    """Canales de un layout de ffmpeg ('mono', 'stereo', '5.1', '6 channels')."""
+    layout = layout.strip()
+    if layout in _CHANNEL_LAYOUTS:
+        return _CHANNEL_LAYOUTS[layout]
+    match = re.match(r'(\d+) channels', layout) or re.match(r'(\d+)\.(\d+)', layout)
+    if not match:
+        return None
+    return sum(int(group) for group in match.groups())
+
+
+def _probe_ffprobe(path: str) -> dict:
+    result = subprocess.run(
+        [FFPROBE,
+         '-v', 'error', '-select_streams', 'a:0',
+         '-show_entries', 'stream=codec_name,sample_rate,channels,bit_rate:format=duration,format_name',
+         '-of', 'json', path],
+        capture_output=True, text=True, timeout=30
+    )
+    if result.returncode != 0:
+        raise ValueError(f'No se pudo leer {path}: {result.stderr.strip()}')
+    info = json.loads(result.stdout)
+    media_format = info.get('format') or {}
+    if not media_format.get('duration'):
+        raise ValueError(f'No se pudo leer {path}: sin duración')
+    stream = (info.get('streams') or [{}])[0]
+    return {
+        'duration': float(media_format['duration']),
+        'container': media_format.get('format_name'),
+        'codec': stream.get('codec_name'),
+        'sample_rate': int(stream['sample_rate']) if stream.get('sample_rate') else None,
+        'channels': stream.get('channels'),
+        'bit_rate': int(stream['bit_rate']) if stream.get('bit_rate') else None,
+    }
+
+
+def _probe_ffmpeg(path: str) -> dict:
+    # Sin archivo de salida ffmpeg solo imprime la cabecera y termina con error
+    result = subprocess.run(
+        [FFMPEG, '-hide_banner', '-i', path],
+        capture_output=True, text=True, timeout=30
+    )
+    header = result.stderr
+    container = _INPUT_PATTERN.search(header)
+    duration = _DURATION_PATTERN.search(header)
+    if not container or not duration:
+        lines = header.strip().splitlines()
+        raise ValueError(f'No se pudo leer {path}: {lines[-1] if lines else "sin información"}')
+
+    hours, minutes, seconds = duration.groups()
+    info = {
+        'duration': int(hours) * 3600 + int(minutes) * 60 + float(seconds),
+        'container': container.group(1),
+        'codec': None,
+        'sample_rate': None,
+        'channels': None,
+        'bit_rate': None,
+    }
+
+    audio = _AUDIO_PATTERN.search(header)
+    if audio:
+        info['codec'] = audio.group(1)
+        details = audio.group(2)
+        rate = re.search(r', (\d+) Hz, ([^,]+)', details)
+        if rate:
+            info['sample_rate'] = int(rate.group(1))
+            info['channels'] = _channel_count(rate.group(2))
+        bit_rate = re.search(r'(\d+) kb/s', details)
+        if bit_rate:
+            info['bit_rate'] = int(bit_rate.group(1)) * 1000
+    return info
+
+
+@lru_cache(maxsize=PROBE_CACHE_SIZE)
+def _probe(path: str, size: int, mtime_ns: int) -> dict:
+    return _probe_ffprobe(path) if FFPROBE else _probe_ffmpeg(path)
+
+
+def probe_media(path: str) -> dict:
+    """
+    Duración, contenedor y primer stream de audio de un archivo.
+
+    Retorna {'duration', 'container', 'codec', 'sample_rate', 'channels',
+    'bit_rate'}; los campos de audio son None si el archivo no tiene audio.
+    Lanza ValueError si el archivo no se puede leer.
+    """
+    stat = os.stat(path)
+    return dict(_probe(os.path.abspath(path), stat.st_size, stat.st_mtime_ns))
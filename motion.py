@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Movimiento Ken Burns (pan/zoom) para imágenes fijas.
+
+La imagen se pre-escala una sola vez a un origen moderadamente más grande que la
+salida (lo justo para el zoom máximo del movimiento) y cada frame se obtiene con
+una transformación afín de PIL sobre ese origen. El costo por frame depende de
+los píxeles de salida, no del tamaño de la imagen original.
+
+Los presets y easings son los mismos que usa el editor (kenBurns.ts).
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+KEN_BURNS_PRESETS = {
+    'zoomIn': {'startX': 0, 'startY': 0, 'startScale': 1.0,
+               'endX': 0, 'endY': 0, 'endScale': 1.3, 'easing': 'easeInOut'},
+    'zoomOut': {'startX': 0, 'startY': 0, 'startScale': 1.3,
+                'endX': 0, 'endY': 0, 'endScale': 1.0, 'easing': 'easeInOut'},
+    'panLeft': {'startX': 0.1, 'startY': 0, 'startScale': 1.2,
+                'endX': -0.1, 'endY': 0, 'endScale': 1.2, 'easing': 'easeInOut'},
+    'panRight': {'startX': -0.1, 'startY': 0, 'startScale': 1.2,
+                 'endX': 0.1, 'endY': 0, 'endScale': 1.2, 'easing': 'easeInOut'},
+    'panUp': {'startX': 0, 'startY': 0.1, 'startScale': 1.2,
+              'endX': 0, 'endY': -0.1, 'endScale': 1.2, 'easing': 'easeInOut'},
+    'panDown': {'startX': 0, 'startY': -0.1, 'startScale': 1.2,
+                'endX': 0, 'endY': 0.1, 'endScale': 1.2, 'easing': 'easeInOut'},
+    'zoomInPanRight': {'startX': -0.08, 'startY': 0.03, 'startScale': 1.0,
+                       'endX': 0.08, 'endY': -0.03, 'endScale': 1.35, 'easing': 'easeInOut'},
+    'zoomOutPanLeft': {'startX': 0.08, 'startY': -0.03, 'startScale': 1.35,
+                       'endX': -0.08, 'endY': 0.03, 'endScale': 1.0, 'easing': 'easeInOut'},
+}
+
+EASINGS = {
+    'linear': lambda t: t,
+    'easeIn': lambda t: t * t,
+    'easeOut': lambda t: t * (2 - t),
+    'easeInOut': lambda t: 2 * t * t if t < 0.5 else -1 + (4 - 2 * t) * t,
+}
+
+# Calidad/velocidad del remuestreo por frame
+MOTION_QUALITY = {
+    'fast': Image.Resampling.NEAREST,
+    'balanced': Image.Resampling.BILINEAR,
+    'high': Image.Resampling.BICUBIC,
+}
+
+# Límite del sobre-escalado del origen respecto a la salida
+MAX_SOURCE_SCALE = 1.5
+
+
+def slot_motion(motion: str, index: int, quality: str = 'balanced') -> dict | None:
+    """
+    Resuelve el movimiento de un slot.
+
+    `motion` puede ser 'none', el nombre de un preset o 'auto' (alterna los
+    presets entre imágenes consecutivas).
+    """
+    if not motion or motion == 'none':
+        return None
+    if motion == 'auto':
+        names = list(KEN_BURNS_PRESETS)
+        motion = names[index % len(names)]
+    if motion not in KEN_BURNS_PRESETS:
+        return None
+    return {'preset': motion, 'quality': quality if quality in MOTION_QUALITY else 'balanced'}
+
+
+# Pools de hilos para calcular frames en paralelo, por cantidad de hilos.
+# Se crean una vez y los comparten todos los movimientos y trabajos.
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def motion_pool(workers: int) -> ThreadPoolExecutor:
+    """Pool compartido de `workers` hilos (se crea la primera vez que se pide)."""
+    with _pools_lock:
+        if workers not in _pools:
+            _pools[workers] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='motion')
+        return _pools[workers]
+
+
+class KenBurns:
+    """Genera los frames de una imagen con movimiento pan/zoom."""
+
+    def __init__(self, frame: np.ndarray, preset: str, quality: str = 'balanced'):
+        """
+        Args:
+            frame: Frame uint8 ya recortado a la resolución de salida
+            preset: Nombre del preset en KEN_BURNS_PRESETS
+            quality: 'fast', 'balanced' o 'high'
+        """
+        self.config = KEN_BURNS_PRESETS[preset]
+        self.easing = EASINGS[self.config['easing']]
+        self.resample = MOTION_QUALITY.get(quality, Image.Resampling.BILINEAR)
+        self.height, self.width = frame.shape[:2]
+
+        # Origen pre-escalado: el zoom máximo se muestrea sin ampliar píxeles
+        max_scale = max(self.config['startScale'], self.config['endScale'], 1.0)
+        self.source_scale = min(max_scale, MAX_SOURCE_SCALE)
+        source = Image.fromarray(frame)
+        if self.source_scale > 1.0:
+            source_size = (round(self.width * self.source_scale), round(self.height * self.source_scale))
+            source = source.resize(source_size, Image.Resampling.LANCZOS)
+        self.source = source
+
+    def affine(self, progress: float) -> tuple[float, ...]:
+        """Coeficientes afines (salida -> origen) para un progreso 0..1 del slot."""
+        config = self.config
+        eased = self.easing(min(1.0, max(0.0, progress)))
+        scale = config['startScale'] + (config['endScale'] - config['startScale']) * eased
+        pan_x = config['startX'] + (config['endX'] - config['startX']) * eased
+        pan_y = config['startY'] + (config['endY'] - config['startY']) * eased
+
+        # Limitar el desplazamiento para no mostrar bordes fuera de la imagen
+        max_x = max(0.0, (scale - 1) / 2)
+        max_y = max(0.0, (scale - 1) / 2)
+        pan_x = min(max_x, max(-max_x, pan_x))
+        pan_y = min(max_y, max(-max_y, pan_y))
+
+        factor = self.source_scale / scale
+        half_w, half_h = self.width / 2, self.height / 2
+        offset_x = self.source_scale * half_w - factor * (half_w + pan_x * self.width)
+        offset_y = self.source_scale * half_h - factor * (half_h + pan_y * self.height)
+        return (factor, 0.0, offset_x, 0.0, factor, offset_y)
+
+    def frame_at(self, progress: float, out: np.ndarray = None) -> np.ndarray:
+        """Frame uint8 del movimiento en un progreso 0..1 del slot."""
+        image = self.source.transform(
+            (self.width, self.height), Image.Transform.AFFINE, self.affine(progress), self.resample
+        )
+        if out is None:
+            return np.asarray(image)
+        out[...] = np.asarray(image)
+        return out
+
+    def render_batch(self, progresses: list[float], workers: int = 1) -> np.ndarray:
+        """
+        Calcula varios frames de una vez en un arreglo (N, alto, ancho, 3).
+
+        PIL libera el GIL durante la transformación, así que con workers > 1 los
+        frames se calculan en paralelo en el pool compartido (motion_pool).
+        """
+        batch = np.empty((len(progresses), self.height, self.width, 3), dtype=np.uint8)
+        if workers <= 1:
+            for i, progress in enumerate(progresses):
+                self.frame_at(progress, batch[i])
+            return batch
+
+        executor = motion_pool(workers)
+        list(executor.map(lambda item: self.frame_at(item[1], batch[item[0]]), enumerate(progresses)))
+        return batch
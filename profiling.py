@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Perfilado por muestreo de un trabajo de render.
+
+`SamplingProfiler` toma cada `interval` segundos la pila del hilo del trabajo
+(con `sys._current_frames`, sin instrumentar las funciones), así que el costo
+es fijo por muestra y no depende de cuántas llamadas haga el render. Las
+pilas se guardan en formato "collapsed" (una línea por pila con su cantidad
+de muestras), que leen flamegraph.pl, speedscope e inferno, y un resumen JSON
+con el tiempo por categoría (carga de imágenes, composición, texto, efectos e
+I/O de ffmpeg), en total y dentro del bucle de frames.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# Segundos entre muestras (10 ms: ~100 muestras por segundo de render)
+PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL', 0.01))
+
+# Funciones que aparecen en el resumen (las de más tiempo propio)
+PROFILE_TOP_FUNCTIONS = 25
+
+# Categorías por (archivo, función); None = cualquier función del archivo.
+# Cada muestra se asigna a la categoría del frame más interno que coincida.
+PROFILE_CATEGORIES = (
+    ('ffmpeg_io', (
+        ('moviepy/video/io/ffmpeg_writer.py', None),
+        ('moviepy/video/io/ffmpeg_reader.py', None),
+        ('moviepy/audio/io/', None),
+        ('subprocess.py', None),
+    )),
+    ('text', (
+        ('app.py', 'render_subtitle_sprite'),
+        ('app.py', 'wrap_text'),
+        ('title_cards.py', 'render_text_sprite'),
+        ('title_cards.py', 'clip_sprite'),
+        ('PIL/ImageFont.py', None),
+        ('PIL/ImageDraw.py', None),
+    )),
+    ('effects', (
+        ('transitions.py', None),
+        ('motion.py', None),
+        ('moviepy/video/fx/', None),
+    )),
+    ('images', (
+        ('slideshow.py', 'prepare_frame'),
+        ('slideshow.py', 'get'),
+    )),
+    ('compositing', (
+        ('layers.py', None),
+        ('slideshow.py', None),
+        ('title_cards.py', None),
+        ('timeline.py', None),
+        ('app.py', 'frame_function'),
+        ('moviepy/video/compositing/', None),
+        ('moviepy/video/VideoClip.py', None),
+        ('moviepy/Clip.py', None),
+    )),
+)
+
+# Una muestra está en el bucle de frames si la pila pasa por aquí
+FRAME_LOOP_MARKER = ('moviepy/video/io/ffmpeg_writer.py', 'ffmpeg_write_video')
+
+
+def _matches(filename: str, function: str, rule: tuple) -> bool:
+    path, name = rule
+    return path in filename and (name is None or name == function)
+
+
+def classify(stack: tuple) -> str:
+    """Categoría de una pila (de la más externa a la más interna)."""
+    for filename, function, _ in reversed(stack):
+        for category, rules in PROFILE_CATEGORIES:
+            if any(_matches(filename, function, rule) for rule in rules):
+                return category
+    return 'other'
+
+
+class SamplingProfiler:
+    """Muestrea la pila de un hilo cada `interval` segundos desde un hilo aparte."""
+
+    def __init__(self, thread_id: int = None, interval: float = PROFILE_INTERVAL):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.stacks = Counter()
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_time = None
+
+    def _take_sample(self) -> None:
+        frame = sys._current_frames().get(self.thread_id)
+        if frame is None:
+            return
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_filename, code.co_name, code.co_firstlineno))
+            frame = frame.f_back
+        self.stacks[tuple(reversed(stack))] += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._take_sample()
+
+    def start(self) -> 'SamplingProfiler':
+        self._start_time = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.duration = time.perf_counter() - self._start_time
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def collapsed(self) -> str:
+        """Pilas en formato collapsed: 'f1;f2;f3 muestras' por línea."""
+        lines = []
+        for stack, count in self.stacks.most_common():
+            names = ';'.join(f'{os.path.basename(filename)}:{function}' for filename, function, _ in stack)
+            lines.append(f'{names} {count}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self) -> dict:
+        """Tiempo estimado por categoría (total y en el bucle de frames) y funciones más costosas."""
+        total = sum(self.stacks.values())
+        categories = Counter()
+        frame_loop = Counter()
+        own = Counter()
+        for stack, count in self.stacks.items():
+            category = classify(stack)
+            categories[category] += count
+            if any(_matches(filename, function, FRAME_LOOP_MARKER) for filename, function, _ in stack):
+                frame_loop[category] += count
+            filename, function, line = stack[-1]
+            own[f'{os.path.basename(filename)}:{function}:{line}'] += count
+
+        def seconds(counter):
+            return {name: round(count * self.interval, 3) for name, count in counter.most_common()}
+
+        return {
+            'samples': total,
+            'interval': self.interval,
+            'duration': round(self.duration, 3),
+            'categories': seconds(categories),
+            'frame_loop': seconds(frame_loop),
+            'top_functions': [
+                {'function': name, 'seconds': round(count * self.interval, 3),
+                 'percent': round(100 * count / total, 1)}
+                for name, count in own.most_common(PROFILE_TOP_FUNCTIONS)
+            ] if total else [],
+        }
+
+    def save(self, base_path: str) -> dict:
+        """Guarda '<base>.collapsed.txt' y '<base>.json'; retorna las rutas."""
+        paths = {'collapsed': f'{base_path}.collapsed.txt', 'summary': f'{base_path}.json'}
+        with open(paths['collapsed'], 'w', encoding='utf-8') as f:
+            f.write(self.collapsed())
+        with open(paths['summary'], 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, indent=2)
+        return paths
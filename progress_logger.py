@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Progreso de los renders de MoviePy en el diccionario de trabajos.
+
+Está separado de app.py porque importa proglog, que solo necesitan los hilos
+que renderizan.
+"""
+
+import time
+
+from proglog import ProgressBarLogger
+
+
+class JobProgressLogger(ProgressBarLogger):
+    """Logger personalizado que actualiza el progreso del job con información detallada de moviepy."""
+
+    def __init__(self, job_id: str, jobs_dict: dict, check_cancelled=None,
+                 base_progress: int = 80, max_progress: int = 95):
+        super().__init__()
+        self.job_id = job_id
+        self.jobs_dict = jobs_dict
+        self.check_cancelled = check_cancelled
+        self.base_progress = base_progress
+        self.max_progress = max_progress
+        self.start_time = None
+        self.current_bar_total = 0
+
+    def bars_callback(self, bar, attr, value, old_value=None):
+        """Callback llamado cuando hay cambios en las barras de progreso."""
+        # Verificar cancelación (check_cancelled lanza la excepción del trabajo)
+        if self.check_cancelled:
+            self.check_cancelled()
+
+        super().bars_callback(bar, attr, value, old_value)
+
+        # Solo procesar la barra de frames
+        if bar != 'frame_index':
+            return
+
+        # Obtener información de la barra actual
+        bar_state = self.state.get('bars', {}).get(bar, {})
+        current = bar_state.get('index', 0)
+        total = bar_state.get('total', 0)
+
+        if attr == 'total' and value:
+            self.current_bar_total = value
+            self.start_time = time.time()
+            return
+
+        if attr == 'index' and self.current_bar_total > 0:
+            current = value
+            total = self.current_bar_total
+
+            render_progress = current / total if total > 0 else 0
+            actual_progress = self.base_progress + int(render_progress * (self.max_progress - self.base_progress))
+
+            # Calcular velocidad (frames por segundo)
+            elapsed = time.time() - self.start_time if self.start_time else 1
+            fps_speed = current / elapsed if elapsed > 0 else 0
+
+            # Calcular tiempo restante
+            remaining_frames = total - current
+            eta = remaining_frames / fps_speed if fps_speed > 0 else 0
+            eta_min = int(eta // 60)
+            eta_sec = int(eta % 60)
+
+            # Crear barra de progreso visual
+            bar_width = 20
+            filled = int(bar_width * render_progress)
+            progress_bar = '█' * filled + '░' * (bar_width - filled)
+
+            # Actualizar mensaje con información detallada
+            message = f"Renderizando: {current}/{total} [{progress_bar}] {render_progress*100:.0f}% | {fps_speed:.1f} fps | ETA: {eta_min}:{eta_sec:02d}"
+
+            self.jobs_dict[self.job_id]['progress'] = actual_progress
+            self.jobs_dict[self.job_id]['message'] = message
+            self.jobs_dict[self.job_id]['render_info'] = {
+                'current_frame': current,
+                'total_frames': total,
+                'fps_speed': round(fps_speed, 2),
+                'eta_seconds': round(eta, 1),
+                'percent': round(render_progress * 100, 1),
+            }
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Cache de videos terminados, por hash del pedido completo.
+
+`render_key` combina el hash del contenido de cada archivo de entrada
+(imágenes, canción, subtítulos, fuentes, fondos de intro/outro) con toda la
+configuración del render y los parámetros del codificador. Dos pedidos con la
+misma clave producen el mismo video, así que `RenderCache` guarda el resultado
+y lo entrega al instante la próxima vez.
+
+Junto a cada video se guardan, si existen, su línea de tiempo y el video sin
+audio: así un video entregado desde el cache sirve de base para un re-render
+parcial igual que uno recién renderizado.
+
+El cache tiene un tamaño máximo y descarta primero los videos usados hace más
+tiempo (LRU). Mientras un trabajo renderiza una clave, los pedidos idénticos
+esperan su resultado en lugar de renderizar lo mismo en paralelo.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+# Cambiar si el pipeline produce otro video con la misma configuración
+RENDER_CACHE_VERSION = 1
+
+# Campos de la configuración que son rutas a archivos (se usan por contenido)
+FILE_FIELDS = {'font_path', 'bg_image'}
+
+# Hash por archivo, mientras no cambien su tamaño ni su fecha de modificación
+_digests = {}
+_digests_lock = threading.Lock()
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 del contenido de un archivo (recordado por ruta, tamaño y fecha)."""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _digests_lock:
+        if memo_key in _digests:
+            return _digests[memo_key]
+    with open(path, 'rb') as f:
+        digest = hashlib.file_digest(f, 'sha256').hexdigest()
+    with _digests_lock:
+        _digests[memo_key] = digest
+    return digest
+
+
+def _by_content(value):
+    """Copia de la configuración con las rutas de FILE_FIELDS cambiadas por su hash."""
+    if isinstance(value, dict):
+        return {
+            key: file_digest(item) if key in FILE_FIELDS and isinstance(item, str) else _by_content(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [_by_content(item) for item in value]
+    return value
+
+
+def render_key(images: list[str], audio_path: str, srt_path: str | None,
+               options: dict, encoder: dict) -> str:
+    """
+    Clave canónica de un render: contenido de las entradas, configuración
+    (argumentos de process_video) y perfil del codificador.
+    """
+    request = {
+        'version': RENDER_CACHE_VERSION,
+        'images': [file_digest(path) for path in images],
+        'audio': file_digest(audio_path),
+        'srt': file_digest(srt_path) if srt_path else None,
+        'options': _by_content(options),
+        'encoder': encoder,
+    }
+    canonical = json.dumps(request, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _link_or_copy(source: str, destination: str) -> None:
+    """Enlace duro (instantáneo, sin espacio extra) o copia si no se puede."""
+    if os.path.exists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+
+class RenderCache:
+    """
+    Videos terminados en '<carpeta>/<clave>.mp4', con LRU y tamaño máximo.
+
+    La base para re-renders queda en '<clave>.video.mp4' (sin audio) y
+    '<clave>.timeline.json'.
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self.hits = 0
+        self.misses = 0
+
+        # Retomar lo que quedó de ejecuciones anteriores, del más viejo al más nuevo
+        self._entries = OrderedDict()
+        existing = sorted(
+            (path for path in self.root.glob('*.mp4') if '.' not in path.stem),
+            key=lambda p: p.stat().st_mtime
+        )
+        for path in existing:
+            self._entries[path.stem] = sum(
+                extra.stat().st_size for extra in self._files(path.stem) if extra.exists()
+            )
+        with self._lock:
+            self._evict()
+
+    def _path(self, key: str) -> Path:
+        return self.root / f'{key}.mp4'
+
+    def _files(self, key: str) -> tuple[Path, Path, Path]:
+        """Video, video sin audio y línea de tiempo de una clave."""
+        return self._path(key), self.root / f'{key}.video.mp4', self.root / f'{key}.timeline.json'
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self._entries.values())
+
+    def _evict(self) -> None:
+        """Descarta los videos menos usados hasta entrar en max_bytes (con el lock)."""
+        while self._entries and self.total_bytes > self.max_bytes:
+            key, _ = self._entries.popitem(last=False)
+            for path in self._files(key):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _lookup(self, key: str) -> str | None:
+        """Ruta del video y lo marca como recién usado (con el lock)."""
+        if key not in self._entries:
+            return None
+        path = self._path(key)
+        if not path.exists():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        os.utime(path)
+        return str(path)
+
+    def _export(self, key: str, destination: str) -> bool:
+        """
+        Deja el video de la clave en `destination` (con el lock, así no se
+        descarta a mitad de camino). Si no se puede copiar cuenta como fallo
+        y el trabajo renderiza el video.
+        """
+        path = self._lookup(key)
+        if not path:
+            return False
+        try:
+            _link_or_copy(path, destination)
+        except FileNotFoundError:
+            self._entries.pop(key, None)
+            return False
+        except OSError as e:
+            print(f"Error copiando {path} del cache: {e}")
+            return False
+        return True
+
+    def put(self, key: str, video_path: str, video_only_path: str = None, timeline: dict = None) -> None:
+        """
+        Agrega un video terminado (un video más grande que el cache no se guarda).
+
+        Con `video_only_path` y `timeline` se guarda también la base para
+        re-renders parciales.
+        """
+        video, video_only, timeline_file = self._files(key)
+        with_base = bool(video_only_path and timeline and os.path.exists(video_only_path))
+        size = os.path.getsize(video_path)
+        if with_base:
+            size += os.path.getsize(video_only_path)
+        if size > self.max_bytes:
+            return
+
+        # Los archivos se preparan fuera del lock y se renombran todos juntos dentro
+        parts = []
+        if with_base:
+            partial = self.root / f'.{key}.video.part'
+            _link_or_copy(video_only_path, str(partial))
+            parts.append((partial, video_only))
+            partial = self.root / f'.{key}.timeline.part'
+            with open(partial, 'w', encoding='utf-8') as f:
+                json.dump(timeline, f, ensure_ascii=False)
+            size += partial.stat().st_size
+            parts.append((partial, timeline_file))
+        partial = self.root / f'.{key}.part'
+        _link_or_copy(video_path, str(partial))
+        parts.append((partial, video))
+        with self._lock:
+            if not with_base:
+                # Una base anterior de la misma clave ya no corresponde a este video
+                for stale in (video_only, timeline_file):
+                    if stale.exists():
+                        stale.unlink()
+            for partial, final in parts:
+                os.replace(partial, final)
+            self._entries[key] = size
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def export_base(self, key: str, destination: str) -> dict | None:
+        """
+        Base para re-renders de una clave: deja el video sin audio en
+        `destination` y retorna {'timeline', 'video_file'}, o None si la clave
+        no está en el cache o se guardó sin base.
+        """
+        _, video_only, timeline_file = self._files(key)
+        with self._lock:
+            if not self._lookup(key):
+                return None
+            try:
+                with open(timeline_file, 'r', encoding='utf-8') as f:
+                    timeline = json.load(f)
+                _link_or_copy(str(video_only), destination)
+            except (OSError, ValueError):
+                return None
+        return {'timeline': timeline, 'video_file': destination}
+
+    def acquire(self, key: str, destination: str, cancel_event: threading.Event = None,
+                on_wait=None) -> tuple[bool, bool]:
+        """
+        Busca la clave o reserva su render.
+
+        Retorna (True, False) si el video estaba en el cache y ya quedó en
+        `destination`; (False, True) si el llamador debe renderizarlo y después
+        llamar a release(key); o (False, False) si `cancel_event` se activó
+        mientras esperaba a otro trabajo con la misma clave. `on_wait()` se
+        llama al empezar a esperar.
+        """
+        while True:
+            with self._lock:
+                if self._export(key, destination):
+                    self.hits += 1
+                    return True, False
+                event = self._in_flight.get(key)
+                if event is None:
+                    self._in_flight[key] = threading.Event()
+                    self.misses += 1
+                    return False, True
+            # Otro trabajo está renderizando lo mismo: esperar su resultado
+            if on_wait:
+                on_wait()
+            while not event.wait(0.5):
+                if cancel_event and cancel_event.is_set():
+                    return False, False
+
+    def release(self, key: str) -> None:
+        """Termina la reserva de acquire; los trabajos en espera vuelven a buscar."""
+        with self._lock:
+            event = self._in_flight.pop(key, None)
+        if event:
+            event.set()
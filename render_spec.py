@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Especificación declarativa (JSON) de un render.
+
+Una spec describe el video completo: imágenes, canción, subtítulos, estilo de
+subtítulos, intro/outro y parámetros de video. Los archivos no viajan en la
+spec: se suben una vez al `AssetStore` y se referencian por el SHA-256 de su
+contenido, así que re-renders y variantes son un JSON pequeño. La spec
+normalizada (con todos los valores por defecto) tiene un hash canónico,
+`spec_hash`, que identifica el resultado del render.
+
+Ejemplo:
+
+    {
+      "images": ["<sha256>", "<sha256>"],
+      "audio": "<sha256>",
+      "subtitles": "<sha256>",
+      "video": {"resolution": [1080, 1920], "fps": 4,
+                "transition": {"type": "crossfade", "duration": 0.5}},
+      "subtitle_style": {"font": "Montserrat-Bold", "size": 75},
+      "intro": {"text": "Mi canción", "duration": 3, "bg_image": "<sha256>"}
+    }
+
+Las fuentes se indican por nombre (FONTS de app.py) o por el hash de un
+archivo .ttf/.otf subido.
+"""
+
+import copy
+import hashlib
+import json
+import os
+import re
+import shutil
+from pathlib import Path
+
+SPEC_VERSION = 1
+
+# Carpeta de assets por defecto (la misma que usa la aplicación web)
+DEFAULT_ASSET_FOLDER = '/tmp/video_creator/assets'
+
+_DIGEST_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+DEFAULT_FONT = 'DejaVuSans-Bold'
+
+# Valores por defecto de cada sección (los mismos que el formulario de subida)
+SPEC_DEFAULTS = {
+    'video': {
+        'resolution': [1080, 1920],
+        'fps': 4,
+        'transition': {'type': 'crossfade', 'duration': 0.5},
+        'motion': 'none',
+        'motion_quality': 'balanced',
+        'timing': 'even',
+    },
+    'subtitle_style': {
+        'font': DEFAULT_FONT,
+        'size': 75,
+        'color': '#ffffff',
+        'stroke_color': '#000000',
+        'stroke_width': 2,
+        'typewriter': True,
+        'position': 'center',
+    },
+    'title': {
+        'text': '',
+        'duration': 5,
+        'font': DEFAULT_FONT,
+        'size': 80,
+        'color': '#ffffff',
+        'bg_color': '#000000',
+        'bg_image': None,
+        'animation_in': 'none',
+        'animation_out': 'none',
+    },
+}
+
+
+class SpecError(ValueError):
+    """Spec inválida o que referencia assets inexistentes."""
+    pass
+
+
+def is_digest(value) -> bool:
+    """True si el valor tiene forma de SHA-256 hexadecimal."""
+    return isinstance(value, str) and bool(_DIGEST_PATTERN.match(value))
+
+
+class AssetStore:
+    """
+    Archivos direccionados por contenido: '<raíz>/<sha256><extensión>'.
+
+    Subir el mismo archivo dos veces no lo duplica.
+    """
+
+    def __init__(self, root: str = DEFAULT_ASSET_FOLDER):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def add_stream(self, stream, filename: str) -> str:
+        """Guarda un archivo (objeto con read) y retorna su hash."""
+        digest = hashlib.sha256()
+        partial = self.root / f'.upload_{os.getpid()}_{id(stream)}'
+        with open(partial, 'wb') as f:
+            for chunk in iter(lambda: stream.read(1024 * 1024), b''):
+                digest.update(chunk)
+                f.write(chunk)
+        key = digest.hexdigest()
+        if self.path(key):
+            partial.unlink()
+        else:
+            os.replace(partial, self.root / f'{key}{Path(filename).suffix.lower()}')
+        return key
+
+    def add_file(self, path: str) -> str:
+        """Copia un archivo local al almacén y retorna su hash."""
+        with open(path, 'rb') as f:
+            return self.add_stream(f, path)
+
+    def path(self, digest: str) -> str | None:
+        """Ruta del asset con ese hash, o None si no existe."""
+        if not is_digest(digest):
+            return None
+        for candidate in self.root.glob(f'{digest}*'):
+            return str(candidate)
+        return None
+
+    def require(self, digest: str, field: str) -> str:
+        """Ruta del asset o SpecError si falta."""
+        path = self.path(digest)
+        if not path:
+            raise SpecError(f'{field}: asset no encontrado ({digest})')
+        return path
+
+    def copy_to(self, digest: str, destination: str) -> None:
+        shutil.copyfile(self.require(digest, 'asset'), destination)
+
+
+def _merge(defaults: dict, values: dict, field: str) -> dict:
+    """Completa una sección con sus valores por defecto (rechaza claves desconocidas)."""
+    if values is None:
+        values = {}
+    if not isinstance(values, dict):
+        raise SpecError(f'{field} debe ser un objeto')
+    unknown = set(values) - set(defaults)
+    if unknown:
+        raise SpecError(f'{field}: campos desconocidos {sorted(unknown)}')
+    merged = copy.deepcopy(defaults)
+    for key, value in values.items():
+        if isinstance(defaults[key], dict):
+            merged[key] = _merge(defaults[key], value, f'{field}.{key}')
+        else:
+            merged[key] = value
+    return merged
+
+
+def normalize_spec(spec: dict) -> dict:
+    """
+    Valida la spec y la completa con los valores por defecto.
+
+    Dos specs que producen el mismo video quedan iguales después de normalizar.
+    """
+    if not isinstance(spec, dict):
+        raise SpecError('La spec debe ser un objeto JSON')
+    allowed = {'version', 'images', 'audio', 'subtitles', 'video', 'subtitle_style', 'intro', 'outro'}
+    unknown = set(spec) - allowed
+    if unknown:
+        raise SpecError(f'Campos desconocidos: {sorted(unknown)}')
+    if spec.get('version', SPEC_VERSION) != SPEC_VERSION:
+        raise SpecError(f'Versión de spec no soportada: {spec.get("version")}')
+
+    images = spec.get('images')
+    if not isinstance(images, list) or not images or not all(is_digest(i) for i in images):
+        raise SpecError('images debe ser una lista de hashes SHA-256')
+    if not is_digest(spec.get('audio')):
+        raise SpecError('audio debe ser un hash SHA-256')
+    if spec.get('subtitles') is not None and not is_digest(spec['subtitles']):
+        raise SpecError('subtitles debe ser un hash SHA-256 o null')
+
+    normalized = {
+        'version': SPEC_VERSION,
+        'images': list(images),
+        'audio': spec['audio'],
+        'subtitles': spec.get('subtitles'),
+        'video': _merge(SPEC_DEFAULTS['video'], spec.get('video'), 'video'),
+        'subtitle_style': _merge(SPEC_DEFAULTS['subtitle_style'], spec.get('subtitle_style'), 'subtitle_style'),
+    }
+
+    video = normalized['video']
+    try:
+        width, height = (int(v) for v in video['resolution'])
+        video['resolution'] = [width, height]
+        video['fps'] = int(video['fps'])
+        video['transition']['duration'] = float(video['transition']['duration'])
+    except (TypeError, ValueError):
+        raise SpecError('video: resolución, fps o duración de transición inválidos')
+    if width <= 0 or height <= 0 or video['fps'] <= 0:
+        raise SpecError('video: resolución y fps deben ser positivos')
+
+    style = normalized['subtitle_style']
+    try:
+        style['size'] = int(style['size'])
+        style['stroke_width'] = int(style['stroke_width'])
+    except (TypeError, ValueError):
+        raise SpecError('subtitle_style: size y stroke_width deben ser enteros')
+
+    for kind in ('intro', 'outro'):
+        title = spec.get(kind)
+        if title is not None and not isinstance(title, dict):
+            raise SpecError(f'{kind} debe ser un objeto o null')
+        if title is None or not str(title.get('text') or '').strip():
+            normalized[kind] = None
+            continue
+        title = _merge(SPEC_DEFAULTS['title'], title, kind)
+        title['text'] = str(title['text']).strip()
+        try:
+            title['duration'] = float(title['duration'])
+            title['size'] = int(title['size'])
+        except (TypeError, ValueError):
+            raise SpecError(f'{kind}: duration y size deben ser números')
+        if title['duration'] <= 0:
+            raise SpecError(f'{kind}.duration debe ser positiva')
+        if title['bg_image'] is not None and not is_digest(title['bg_image']):
+            raise SpecError(f'{kind}.bg_image debe ser un hash SHA-256 o null')
+        normalized[kind] = title
+
+    return normalized
+
+
+def merge_spec(base: dict, override: dict) -> dict:
+    """Spec `base` con los campos de `override` (los objetos se combinan por campo)."""
+    merged = copy.deepcopy(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_spec(merged[key], value)
+        else:
+            merged[key] = copy.deepcopy(value)
+    return merged
+
+
+def canonical_json(spec: dict) -> str:
+    """JSON canónico (claves ordenadas, sin espacios) de una spec normalizada."""
+    return json.dumps(spec, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+
+def spec_hash(spec: dict) -> str:
+    """Hash de la spec normalizada: igual para dos pedidos del mismo video."""
+    return hashlib.sha256(canonical_json(normalize_spec(spec)).encode('utf-8')).hexdigest()
+
+
+def resolve_font(font: str, assets: AssetStore, fonts: dict, field: str) -> str:
+    """Ruta de una fuente indicada por nombre o por hash de un archivo subido."""
+    if is_digest(font):
+        return assets.require(font, field)
+    if font not in fonts:
+        raise SpecError(f'{field}: fuente desconocida ({font})')
+    return fonts[font]
+
+
+def resolve_spec(spec: dict, assets: AssetStore, fonts: dict) -> dict:
+    """
+    Convierte una spec en los argumentos de `process_video`.
+
+    Retorna {'images', 'audio', 'srt', 'options'}, con las rutas de los assets
+    y `options` con los mismos campos que `read_render_options`.
+    """
+    spec = normalize_spec(spec)
+    video = spec['video']
+    style = spec['subtitle_style']
+
+    titles = {}
+    for kind in ('intro', 'outro'):
+        title = spec[kind]
+        if title is None:
+            titles[kind] = None
+            continue
+        titles[kind] = {
+            'text': title['text'],
+            'duration': title['duration'],
+            'font_path': resolve_font(title['font'], assets, fonts, f'{kind}.font'),
+            'font_size': int(title['size']),
+            'font_color': title['color'],
+            'bg_color': title['bg_color'],
+            'bg_image': assets.require(title['bg_image'], f'{kind}.bg_image') if title['bg_image'] else None,
+            'animation_in': title['animation_in'],
+            'animation_out': title['animation_out'],
+        }
+
+    return {
+        'images': [assets.require(digest, 'images') for digest in spec['images']],
+        'audio': assets.require(spec['audio'], 'audio'),
+        'srt': assets.require(spec['subtitles'], 'subtitles') if spec['subtitles'] else None,
+        'options': {
+            'resolution': tuple(video['resolution']),
+            'transition_type': video['transition']['type'],
+            'transition_duration': video['transition']['duration'],
+            'fps': video['fps'],
+            'subtitle_config': {
+                'font_path': resolve_font(style['font'], assets, fonts, 'subtitle_style.font'),
+                'font_size': int(style['size']),
+                'font_color': style['color'],
+                'stroke_color': style['stroke_color'],
+                'stroke_width': int(style['stroke_width']),
+                'typewriter_enabled': bool(style['typewriter']),
+                'position': style['position'],
+            },
+            'intro_config': titles['intro'],
+            'outro_config': titles['outro'],
+            'motion': video['motion'],
+            'motion_quality': video['motion_quality'],
+            'timing_mode': video['timing'],
+        },
+    }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Assets y specs de render")
+    parser.add_argument("--assets", default=DEFAULT_ASSET_FOLDER,
+                        help=f"Carpeta de assets (default: {DEFAULT_ASSET_FOLDER})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="Agrega archivos al almacén y muestra sus hashes")
+    add.add_argument("files", nargs="+", help="Archivos a agregar")
+
+    show = commands.add_parser("hash", help="Valida una spec y muestra su hash")
+    show.add_argument("spec", help="Archivo JSON de la spec")
+
+    args = parser.parse_args()
+
+    if args.command == "add":
+        store = AssetStore(args.assets)
+        for path in args.files:
+            print(f"{store.add_file(path)}  {path}")
+        return
+
+    with open(args.spec, "r", encoding="utf-8") as f:
+        spec = json.load(f)
+    try:
+        print(spec_hash(spec))
+    except SpecError as e:
+        print(f"Error: {e}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Generador de frames del slideshow a partir de la línea de tiempo.
+
+Las imágenes se preprocesan una sola vez a frames uint8 de la resolución final
+(modo "cover": escalar para cubrir y recortar centrado). Cada frame del video se
+obtiene localizando el slot activo en la línea de tiempo y, dentro de una
+transición, aplicando el kernel correspondiente de `transitions`. Las imágenes
+con movimiento Ken Burns se calculan por lotes de frames en paralelo.
+`FrameCache` comparte los frames preprocesados entre varios renders (lotes).
+
+Con un `FrameWindow` los frames no se preparan todos antes del render: cada
+imagen se carga justo antes de su slot (la siguiente se adelanta en segundo
+plano) y se libera al terminar, junto con su movimiento. La memoria depende
+de la ventana activa y no de la cantidad de imágenes.
+"""
+
+import multiprocessing
+import os
+import threading
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+from moviepy import VideoClip
+
+from motion import MAX_SOURCE_SCALE, KenBurns
+from transitions import TransitionBuffers, get_transition
+
+# Frames de movimiento calculados por lote y threads usados para calcularlos
+MOTION_BATCH = 8
+MOTION_WORKERS = int(os.environ.get('MOTION_WORKERS', min(4, multiprocessing.cpu_count())))
+
+
+def prepare_frame(image_path: str, resolution: tuple[int, int]) -> np.ndarray:
+    """Carga una imagen y la escala/recorta para cubrir exactamente la resolución."""
+    width, height = resolution
+
+    with Image.open(image_path) as img:
+        if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+            # Las zonas transparentes se ven negras, igual que sobre el fondo del video
+            img = img.convert('RGBA')
+            background = Image.new('RGBA', img.size, (0, 0, 0, 255))
+            img = Image.alpha_composite(background, img)
+        img = img.convert('RGB')
+
+        scale = max(width / img.width, height / img.height)
+        new_size = (max(width, round(img.width * scale)), max(height, round(img.height * scale)))
+        img = img.resize(new_size, Image.Resampling.LANCZOS)
+
+        left = (new_size[0] - width) // 2
+        top = (new_size[1] - height) // 2
+        img = img.crop((left, top, left + width, top + height))
+
+        frame = np.asarray(img, dtype=np.uint8)
+
+    frame.flags.writeable = False
+    return frame
+
+
+class FrameCache:
+    """
+    Frames preprocesados compartidos entre renders que usan las mismas imágenes.
+
+    Cada frame se calcula una sola vez aunque lo pidan varios hilos a la vez.
+    Los renders reservan (`retain`) las imágenes que van a usar y las liberan
+    (`release`) al terminar; un frame se descarta cuando nadie más lo necesita.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._frames = {}
+        self._key_locks = {}
+        self._refs = {}
+
+    def retain(self, keys) -> None:
+        """Reserva frames (image_path, resolución) para un render."""
+        with self._lock:
+            for key in keys:
+                self._refs[key] = self._refs.get(key, 0) + 1
+
+    def release(self, keys) -> None:
+        """Libera las reservas de un render y descarta los frames sin uso."""
+        with self._lock:
+            for key in keys:
+                self._refs[key] = self._refs.get(key, 1) - 1
+                if self._refs[key] <= 0:
+                    del self._refs[key]
+                    self._frames.pop(key, None)
+                    self._key_locks.pop(key, None)
+
+    def get(self, image_path: str, resolution: tuple[int, int]) -> np.ndarray:
+        """Frame de la imagen en la resolución dada (lo calcula si falta)."""
+        key = (image_path, tuple(resolution))
+        with self._lock:
+            frame = self._frames.get(key)
+            if frame is not None:
+                return frame
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Solo un hilo calcula cada frame; los demás esperan y lo reutilizan
+        with key_lock:
+            with self._lock:
+                frame = self._frames.get(key)
+            if frame is None:
+                frame = prepare_frame(image_path, resolution)
+                with self._lock:
+                    if key in self._refs:
+                        self._frames[key] = frame
+        return frame
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+
+class MemoryBudgetExceeded(Exception):
+    """La ventana activa del render no cabe en su presupuesto de memoria."""
+    pass
+
+
+class FrameWindow:
+    """
+    Frames de los slots cargados justo a tiempo y liberados después de su slot.
+
+    Se indexa como la lista de frames (`window[i]`). `make_slideshow_clip`
+    llama a `advance` al cambiar de slot: se descartan los frames que ya no
+    se usan y se adelanta la carga del siguiente en un hilo. Si los frames
+    residentes (más `extra_bytes`, la memoria de movimiento del slideshow)
+    superan `budget_bytes`, se lanza MemoryBudgetExceeded.
+    """
+
+    def __init__(self, images: list[str], resolution: tuple[int, int], loader=None,
+                 budget_bytes: int = 0):
+        self.images = images
+        self.resolution = tuple(resolution)
+        self.loader = loader or (lambda path: prepare_frame(path, self.resolution))
+        self.budget_bytes = budget_bytes
+        self.extra_bytes = 0
+        self.resident_bytes = 0
+        self.peak_bytes = 0
+        self._frames = {}
+        self._pending = {}
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def __len__(self) -> int:
+        return len(self.images)
+
+    def __getitem__(self, idx: int) -> np.ndarray:
+        frame = self._frames.get(idx)
+        if frame is None:
+            future = self._pending.pop(idx, None)
+            frame = future.result() if future else self.loader(self.images[idx])
+            self._frames[idx] = frame
+            self.account()
+        return frame
+
+    def account(self) -> None:
+        """Actualiza la memoria residente y verifica el presupuesto."""
+        self.resident_bytes = sum(frame.nbytes for frame in self._frames.values()) + self.extra_bytes
+        self.peak_bytes = max(self.peak_bytes, self.resident_bytes)
+        if self.budget_bytes and self.resident_bytes > self.budget_bytes:
+            raise MemoryBudgetExceeded(
+                f'La ventana activa usa {self.resident_bytes / 2**20:.0f} MB '
+                f'(presupuesto {self.budget_bytes / 2**20:.0f} MB)'
+            )
+
+    def advance(self, keep: set[int], upcoming: int = None) -> None:
+        """Conserva solo los slots de `keep` y adelanta la carga de `upcoming`."""
+        for idx in [idx for idx in self._frames if idx not in keep]:
+            del self._frames[idx]
+        for idx in [idx for idx in self._pending if idx not in keep and idx != upcoming]:
+            self._pending.pop(idx).cancel()
+        if upcoming is not None and upcoming not in self._frames and upcoming not in self._pending:
+            self._pending[upcoming] = self._executor.submit(self.loader, self.images[upcoming])
+        self.account()
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._frames.clear()
+        self._pending.clear()
+
+
+def estimate_window_bytes(timeline: dict) -> int:
+    """
+    Memoria estimada de la ventana activa del slideshow: frames de los slots
+    activos y del siguiente, buffers de transición, frame retenido y, con
+    movimiento, el origen pre-escalado y un lote de frames por slot activo.
+    """
+    width, height = timeline['resolution']
+    frame_bytes = width * height * 3
+    active = 2 if timeline['transition']['overlap'] else 1
+
+    # TransitionBuffers: out, scratch y black (uint8) más acc y tmp (uint16)
+    buffer_bytes = 7 * frame_bytes
+    total = (active + 1) * frame_bytes + buffer_bytes + 2 * frame_bytes
+    if any(slot.get('motion') for slot in timeline['slots']):
+        total += active * int((MAX_SOURCE_SCALE ** 2 + MOTION_BATCH) * frame_bytes)
+    return total
+
+
+def make_slideshow_clip(timeline: dict, frames: list[np.ndarray]) -> VideoClip:
+    """
+    Crea el clip del slideshow (sin intro/outro ni subtítulos).
+
+    Args:
+        timeline: Línea de tiempo del render (ver timeline.build_timeline)
+        frames: Un frame preprocesado por slot, en el mismo orden, o un
+            FrameWindow que los carga y libera a medida que avanza el video
+    """
+    width, height = timeline['resolution']
+    slots = timeline['slots']
+    starts = [slot['start'] for slot in slots]
+    transition = get_transition(timeline['transition']['type'])
+    transition_duration = timeline['transition']['duration']
+    overlap = timeline['transition']['overlap']
+    buffers = TransitionBuffers(height, width)
+    fps = timeline['fps']
+
+    # Movimientos Ken Burns (se crean al llegar a su slot) y lote actual de
+    # frames con movimiento por slot: {índice de frame: frame}
+    movers = {}
+    motion_batches = {}
+    window = frames if isinstance(frames, FrameWindow) else None
+    current = {'idx': None}
+
+    def motion_bytes() -> int:
+        """Memoria de los movimientos vivos (orígenes pre-escalados y lotes)."""
+        sources = sum(mover.source.width * mover.source.height * 3 for mover in movers.values())
+        return sources + sum(len(batch) * width * height * 3 for batch in motion_batches.values())
+
+    def enter_slot(idx: int) -> None:
+        """Libera los slots que ya no se ven y adelanta el siguiente."""
+        keep = {idx, idx - 1} if overlap else {idx}
+        for released in [i for i in movers if i not in keep]:
+            del movers[released]
+            motion_batches.pop(released, None)
+        window.extra_bytes = motion_bytes()
+        window.advance(keep, idx + 1 if idx + 1 < len(slots) else None)
+
+    def slot_frame(idx: int, t: float) -> np.ndarray:
+        """Frame de un slot en el instante t (con movimiento si corresponde)."""
+        slot = slots[idx]
+        if not slot.get('motion'):
+            return frames[idx]
+
+        if idx not in movers:
+            movers[idx] = KenBurns(frames[idx], slot['motion']['preset'], slot['motion']['quality'])
+
+        frame_index = round(t * fps)
+        batch = motion_batches.get(idx)
+        if batch is None or frame_index not in batch:
+            # Calcular de una vez los próximos frames del slot
+            times = [t + k / fps for k in range(MOTION_BATCH) if t + k / fps < slot['end']]
+            progresses = [(time - slot['start']) / (slot['end'] - slot['start']) for time in times]
+            rendered = movers[idx].render_batch(progresses, workers=MOTION_WORKERS)
+            batch = {frame_index + k: frame for k, frame in enumerate(rendered)}
+            motion_batches[idx] = batch
+            if window is not None:
+                window.extra_bytes = motion_bytes()
+                window.account()
+        return batch[frame_index]
+
+    def frame_function(t):
+        idx = bisect_right(starts, t) - 1
+        if idx < 0 or t >= slots[idx]['end']:
+            return buffers.black
+
+        if window is not None and idx != current['idx']:
+            current['idx'] = idx
+            enter_slot(idx)
+
+        slot = slots[idx]
+        frame = slot_frame(idx, t)
+        if not slot['effects'] or transition is None:
+            return frame
+
+        kernel = transition['kernel']
+        if overlap:
+            # Ventana de transición: desde que empieza este slot hasta que termina el anterior
+            if idx > 0 and t < slots[idx - 1]['end']:
+                progress = (t - slot['start']) / transition_duration
+                return kernel(slot_frame(idx - 1, t), frame, progress, buffers)
+            return frame
+
+        local_t = t - slot['start']
+        if 'in' in transition['edges'] and local_t < transition_duration:
+            return kernel(buffers.black, frame, local_t / transition_duration, buffers)
+        remaining = slot['end'] - t
+        if 'out' in transition['edges'] and remaining < transition_duration:
+            return kernel(frame, buffers.black, 1 - remaining / transition_duration, buffers)
+        return frame
+
+    return VideoClip(frame_function, duration=timeline['main_duration'])
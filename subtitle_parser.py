@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Subtítulos SRT y WebVTT.
+
+El parser lee el archivo línea por línea (sin cargarlo completo ni usar una
+expresión regular sobre todo el contenido), acepta saltos de línea CRLF,
+espacios al final de las líneas, BOM y los bloques propios de WebVTT
+(cabecera, NOTE, STYLE, REGION, ajustes de cue). Cada subtítulo es un `Cue`
+compacto y `CueIndex` encuentra los subtítulos activos en un instante t con
+búsqueda binaria.
+"""
+
+import re
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+
+# Extensiones de subtítulos aceptadas
+SUBTITLE_EXTENSIONS = {'.srt', '.vtt'}
+
+# Bloques de WebVTT que no son subtítulos
+VTT_SKIPPED_BLOCKS = ('WEBVTT', 'NOTE', 'STYLE', 'REGION')
+
+_TAG_PATTERN = re.compile(r'<[^>]+>')
+
+
+class Cue:
+    """Un subtítulo: inicio y fin en segundos y texto en una sola línea."""
+
+    __slots__ = ('start', 'end', 'text')
+
+    def __init__(self, start: float, end: float, text: str):
+        self.start = start
+        self.end = end
+        self.text = text
+
+    def __repr__(self) -> str:
+        return f'Cue({self.start:.3f}, {self.end:.3f}, {self.text!r})'
+
+
+def parse_timestamp(value: str) -> float:
+    """Convierte 'HH:MM:SS,mmm', 'HH:MM:SS.mmm' o 'MM:SS.mmm' a segundos."""
+    clock, _, millis = value.strip().replace(',', '.').partition('.')
+    parts = [int(part) for part in clock.split(':')]
+    seconds = 0
+    for part in parts:
+        seconds = seconds * 60 + part
+    return seconds + (int(millis.ljust(3, '0')[:3]) / 1000 if millis else 0)
+
+
+def _parse_timing(line: str) -> tuple[float, float] | None:
+    """Lee una línea 'inicio --> fin [ajustes]'; None si no es una línea de tiempos."""
+    start, arrow, rest = line.partition('-->')
+    if not arrow:
+        return None
+    end = rest.split()[0] if rest.split() else ''
+    try:
+        return parse_timestamp(start), parse_timestamp(end)
+    except ValueError:
+        return None
+
+
+def _make_cue(timing: tuple[float, float], lines: list[str]) -> Cue:
+    """Crea el Cue de un bloque, sin etiquetas y con las líneas unidas."""
+    text = ' '.join(line.strip() for line in lines if line.strip())
+    return Cue(timing[0], timing[1], _TAG_PATTERN.sub('', text).strip())
+
+
+def iter_cues(lines):
+    """
+    Genera los subtítulos de un iterable de líneas (SRT o WebVTT).
+
+    Un bloque termina en una línea vacía (o solo con espacios). La línea de
+    tiempos puede ir precedida de un número (SRT) o un identificador (WebVTT).
+    """
+    timing = None
+    text_lines = []
+    skipping = False
+
+    for raw_line in lines:
+        line = raw_line.rstrip()
+
+        if not line:
+            if timing:
+                yield _make_cue(timing, text_lines)
+            timing, text_lines, skipping = None, [], False
+            continue
+
+        if skipping:
+            continue
+
+        if timing is None:
+            parsed = _parse_timing(line)
+            if parsed:
+                timing = parsed
+            elif line.startswith(VTT_SKIPPED_BLOCKS):
+                skipping = True
+            # Otras líneas antes de los tiempos: número o identificador del cue
+            continue
+
+        text_lines.append(line)
+
+    if timing:
+        yield _make_cue(timing, text_lines)
+
+
+def parse_subtitles(path: str) -> list[Cue]:
+    """Lee un archivo .srt o .vtt y retorna sus subtítulos ordenados por inicio."""
+    with open(path, 'r', encoding='utf-8-sig', errors='replace') as f:
+        cues = [cue for cue in iter_cues(f) if cue.end > cue.start]
+    cues.sort(key=lambda cue: cue.start)
+    return cues
+
+
+def find_subtitle_file(folder: str) -> str | None:
+    """Busca el primer archivo de subtítulos (.srt o .vtt) en una carpeta."""
+    folder_path = Path(folder)
+    if not folder_path.exists():
+        return None
+
+    for file in sorted(folder_path.iterdir()):
+        if file.suffix.lower() in SUBTITLE_EXTENSIONS:
+            return str(file)
+
+    return None
+
+
+class CueIndex:
+    """
+    Índice de subtítulos por tiempo.
+
+    `active(t)` retorna los subtítulos que se muestran en t (varios si se
+    superponen) en O(log n + k): solo pueden estar activos los que empezaron
+    hace menos que la duración del subtítulo más largo.
+    """
+
+    __slots__ = ('order', 'starts', 'ends', 'longest')
+
+    def __init__(self, cues: list[Cue]):
+        self.order = sorted(range(len(cues)), key=lambda i: cues[i].start)
+        self.starts = [cues[i].start for i in self.order]
+        self.ends = [cues[i].end for i in self.order]
+        self.longest = max((cue.end - cue.start for cue in cues), default=0)
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def active(self, t: float) -> list[int]:
+        """Posiciones (en la lista original) de los subtítulos con inicio <= t < fin, en orden."""
+        first = bisect_left(self.starts, t - self.longest)
+        last = bisect_right(self.starts, t)
+        return sorted(self.order[i] for i in range(first, last) if t < self.ends[i])
@@ -0,0 +1,79 @@
+"""Almacén de frames mapeado en memoria."""
+
+import numpy as np
+import pytest
+
+from frame_store import FRAME_STORE_ALIGNMENT, FrameStore
+
+RESOLUTION = (8, 6)
+
+
+def fake_loader(image_path):
+    """Frame distinto y determinista por imagen."""
+    width, height = RESOLUTION
+    seed = sum(image_path.encode())
+    return (np.arange(height * width * 3, dtype=np.uint16).reshape(height, width, 3) + seed).astype(np.uint8)
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'frames.bin')
+    images = ['a.png', 'b.png', 'c.png']
+    store = FrameStore.build(path, images, RESOLUTION, loader=fake_loader)
+    assert len(store) == 3
+    assert store.resolution == RESOLUTION
+    for slot, image_path in enumerate(images):
+        np.testing.assert_array_equal(store[slot], fake_loader(image_path))
+        np.testing.assert_array_equal(store.frame(image_path), fake_loader(image_path))
+
+    reopened = FrameStore(path)
+    for slot, image_path in enumerate(images):
+        np.testing.assert_array_equal(reopened[slot], fake_loader(image_path))
+    assert not (tmp_path / 'frames.bin.part').exists()
+
+
+def test_repeated_images_are_stored_once(tmp_path):
+    calls = []
+
+    def loader(image_path):
+        calls.append(image_path)
+        return fake_loader(image_path)
+
+    images = ['a.png', 'b.png', 'a.png', 'a.png']
+    store = FrameStore.build(str(tmp_path / 'frames.bin'), images, RESOLUTION, loader=loader)
+    assert calls == ['a.png', 'b.png']
+    assert len(store) == 4
+    assert store.nbytes == 2 * RESOLUTION[0] * RESOLUTION[1] * 3
+    np.testing.assert_array_equal(store[3], store[0])
+
+
+def test_frames_are_read_only_and_page_aligned(tmp_path):
+    path = str(tmp_path / 'frames.bin')
+    store = FrameStore.build(path, ['a.png'], RESOLUTION, loader=fake_loader)
+    assert store._array.offset % FRAME_STORE_ALIGNMENT == 0
+    with pytest.raises(ValueError):
+        store[0][0, 0, 0] = 1
+
+
+def test_progress_and_resolution_check(tmp_path):
+    progress = []
+    store = FrameStore.build(str(tmp_path / 'frames.bin'), ['a.png', 'b.png'], RESOLUTION,
+                             loader=fake_loader, on_progress=lambda i, total: progress.append((i, total)))
+    assert progress == [(1, 2), (2, 2)]
+    store.frame('a.png', RESOLUTION)
+    with pytest.raises(ValueError):
+        store.frame('a.png', (16, 12))
+
+
+def test_wrong_frame_shape_leaves_no_file(tmp_path):
+    path = tmp_path / 'frames.bin'
+    with pytest.raises(ValueError):
+        FrameStore.build(str(path), ['a.png'], RESOLUTION, loader=lambda _: np.zeros((2, 2, 3), np.uint8))
+    assert not path.exists()
+    assert not (tmp_path / 'frames.bin.part').exists()
+
+
+def test_invalid_file_is_rejected(tmp_path):
+    path = tmp_path / 'frames.bin'
+    path.write_bytes(b'NOTFRAME' + bytes(64))
+    with pytest.raises(ValueError):
+        FrameStore(str(path))
@@ -0,0 +1,160 @@
+"""Cache de videos terminados: claves, LRU y renders en curso."""
+
+import os
+import threading
+import time
+
+import pytest
+
+from render_cache import RenderCache, render_key
+
+
+def make_file(path, size, fill=b'x'):
+    path.write_bytes(fill * size)
+    return str(path)
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    folder = tmp_path / 'inputs'
+    folder.mkdir()
+    return {
+        'images': [make_file(folder / 'a.png', 10, b'a'), make_file(folder / 'b.png', 10, b'b')],
+        'audio': make_file(folder / 'song.mp3', 10, b's'),
+        'font': make_file(folder / 'font.ttf', 10, b'f'),
+    }
+
+
+def key_for(inputs, **options):
+    options.setdefault('subtitle_config', {'font_path': inputs['font'], 'font_size': 75})
+    return render_key(inputs['images'], inputs['audio'], None, options, {'codec': 'libx264'})
+
+
+def test_render_key_depends_on_content_not_paths(inputs, tmp_path):
+    key = key_for(inputs, fps=4)
+    assert key == key_for(inputs, fps=4)
+    assert key != key_for(inputs, fps=5)
+
+    # Misma fuente en otra ruta: misma clave
+    moved = make_file(tmp_path / 'otra.ttf', 10, b'f')
+    assert key == key_for(inputs, fps=4, subtitle_config={'font_path': moved, 'font_size': 75})
+
+    # Mismo nombre con otro contenido: otra clave
+    make_file(tmp_path / 'inputs' / 'a.png', 11, b'a')
+    assert key != key_for(inputs, fps=4)
+
+
+def test_lru_eviction_by_size(tmp_path):
+    cache = RenderCache(str(tmp_path / 'cache'), max_bytes=250)
+    for name in ('k1', 'k2'):
+        cache.put(name, make_file(tmp_path / f'{name}.mp4', 100))
+
+    # Usar k1 lo protege: el siguiente put descarta k2
+    assert cache.acquire('k1', str(tmp_path / 'out.mp4')) == (True, False)
+    cache.put('k3', make_file(tmp_path / 'k3.mp4', 100))
+    assert list(cache._entries) == ['k1', 'k3']
+    assert cache.total_bytes == 200
+    assert not (tmp_path / 'cache' / 'k2.mp4').exists()
+
+    # Un video más grande que el cache no se guarda
+    cache.put('big', make_file(tmp_path / 'big.mp4', 300))
+    assert 'big' not in cache._entries
+
+
+def test_base_files_are_evicted_with_the_video(tmp_path):
+    cache = RenderCache(str(tmp_path / 'cache'), max_bytes=300)
+    cache.put('k1', make_file(tmp_path / 'k1.mp4', 100),
+              make_file(tmp_path / 'k1_video.mp4', 50), {'frames': [1, 2]})
+    base = cache.export_base('k1', str(tmp_path / 'base.mp4'))
+    assert base == {'timeline': {'frames': [1, 2]}, 'video_file': str(tmp_path / 'base.mp4')}
+    assert os.path.getsize(tmp_path / 'base.mp4') == 50
+
+    cache.put('k2', make_file(tmp_path / 'k2.mp4', 200))
+    assert list(cache._entries) == ['k2']
+    assert sorted(os.listdir(tmp_path / 'cache')) == ['k2.mp4']
+    assert cache.export_base('k1', str(tmp_path / 'base2.mp4')) is None
+
+
+def test_put_without_base_drops_stale_base(tmp_path):
+    cache = RenderCache(str(tmp_path / 'cache'), max_bytes=1000)
+    cache.put('k1', make_file(tmp_path / 'v1.mp4', 100), make_file(tmp_path / 'o1.mp4', 50), {'a': 1})
+    cache.put('k1', make_file(tmp_path / 'v2.mp4', 120))
+    assert cache.export_base('k1', str(tmp_path / 'base.mp4')) is None
+    assert sorted(os.listdir(tmp_path / 'cache')) == ['k1.mp4']
+
+
+def test_acquire_miss_then_hit(tmp_path):
+    cache = RenderCache(str(tmp_path / 'cache'), max_bytes=1000)
+    out = tmp_path / 'out.mp4'
+    assert cache.acquire('k1', str(out)) == (False, True)
+    cache.put('k1', make_file(tmp_path / 'v.mp4', 100))
+    cache.release('k1')
+    assert cache.acquire('k1', str(out)) == (True, False)
+    assert out.read_bytes() == b'x' * 100
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_missing_file_counts_as_miss(tmp_path):
+    cache = RenderCache(str(tmp_path / 'cache'), max_bytes=1000)
+    cache.put('k1', make_file(tmp_path / 'v.mp4', 100))
+    os.remove(tmp_path / 'cache' / 'k1.mp4')
+    assert cache.acquire('k1', str(tmp_path / 'out.mp4')) == (False, True)
+    assert 'k1' not in cache._entries
+
+
+def test_identical_requests_wait_for_the_render_in_flight(tmp_path):
+    cache = RenderCache(str(tmp_path / 'cache'), max_bytes=1000)
+    assert cache.acquire('k1', str(tmp_path / 'first.mp4')) == (False, True)
+
+    waiting = threading.Event()
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(
+        cache.acquire('k1', str(tmp_path / 'second.mp4'), on_wait=waiting.set)
+    ))
+    waiter.start()
+    assert waiting.wait(5)
+    assert not results
+
+    cache.put('k1', make_file(tmp_path / 'v.mp4', 100))
+    cache.release('k1')
+    waiter.join(5)
+    assert results == [(True, False)]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_waiter_renders_if_owner_fails(tmp_path):
+    cache = RenderCache(str(tmp_path / 'cache'), max_bytes=1000)
+    cache.acquire('k1', str(tmp_path / 'first.mp4'))
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(cache.acquire('k1', str(tmp_path / 'second.mp4'))))
+    waiter.start()
+    cache.release('k1')
+    waiter.join(5)
+    assert results == [(False, True)]
+
+
+def test_cancel_while_waiting(tmp_path):
+    cache = RenderCache(str(tmp_path / 'cache'), max_bytes=1000)
+    cache.acquire('k1', str(tmp_path / 'first.mp4'))
+    cancel = threading.Event()
+    cancel.set()
+    assert cache.acquire('k1', str(tmp_path / 'second.mp4'), cancel_event=cancel) == (False, False)
+    assert 'k1' in cache._in_flight
+
+
+def test_reopen_rescans_entries(tmp_path):
+    root = str(tmp_path / 'cache')
+    cache = RenderCache(root, max_bytes=1000)
+    cache.put('old', make_file(tmp_path / 'old.mp4', 100), make_file(tmp_path / 'o.mp4', 50), {'a': 1})
+    cache.put('new', make_file(tmp_path / 'new.mp4', 100))
+    old_time = time.time() - 60
+    os.utime(os.path.join(root, 'old.mp4'), (old_time, old_time))
+
+    reopened = RenderCache(root, max_bytes=1000)
+    assert list(reopened._entries) == ['old', 'new']
+    assert reopened._entries['old'] > 150
+
+    # Con menos espacio se descarta primero el más viejo
+    smaller = RenderCache(root, max_bytes=150)
+    assert list(smaller._entries) == ['new']
+    assert sorted(os.listdir(root)) == ['new.mp4']
@@ -0,0 +1,114 @@
+"""Specs de render: normalización, hash canónico y almacén de assets."""
+
+import io
+
+import pytest
+
+from render_spec import SPEC_DEFAULTS, AssetStore, SpecError, merge_spec, normalize_spec, spec_hash
+
+IMAGE = 'a' * 64
+AUDIO = 'b' * 64
+
+
+def minimal_spec(**extra):
+    return {'images': [IMAGE, IMAGE], 'audio': AUDIO, **extra}
+
+
+def test_normalize_fills_defaults():
+    spec = normalize_spec(minimal_spec())
+    assert spec['version'] == 1
+    assert spec['subtitles'] is None
+    assert spec['video'] == SPEC_DEFAULTS['video']
+    assert spec['subtitle_style'] == SPEC_DEFAULTS['subtitle_style']
+    assert spec['intro'] is None and spec['outro'] is None
+
+
+def test_equivalent_specs_have_the_same_hash():
+    base = spec_hash(minimal_spec())
+    explicit = minimal_spec(
+        version=1,
+        subtitles=None,
+        video={'fps': '4', 'resolution': ['1080', 1920], 'transition': {'duration': '0.5'}},
+        subtitle_style={'size': 75.0, 'stroke_width': '2'},
+        intro={'text': '   '},
+        outro=None,
+    )
+    assert spec_hash(explicit) == base
+    reordered = dict(reversed(list(minimal_spec(video={'fps': 4, 'motion': 'none'}).items())))
+    assert spec_hash(reordered) == base
+
+
+def test_title_values_are_normalized():
+    a = spec_hash(minimal_spec(intro={'text': ' Hola ', 'duration': '3', 'size': '60'}))
+    b = spec_hash(minimal_spec(intro={'text': 'Hola', 'duration': 3.0, 'size': 60}))
+    assert a == b
+
+
+@pytest.mark.parametrize('extra', [
+    {'video': {'fps': 5}},
+    {'images': [IMAGE]},
+    {'subtitles': 'c' * 64},
+    {'subtitle_style': {'position': 'bottom'}},
+    {'outro': {'text': 'Fin'}},
+])
+def test_different_specs_have_different_hashes(extra):
+    assert spec_hash(minimal_spec(**extra)) != spec_hash(minimal_spec())
+
+
+def test_normalize_is_idempotent():
+    assert normalize_spec(normalize_spec(minimal_spec())) == normalize_spec(minimal_spec())
+    assert spec_hash(minimal_spec()) == spec_hash(normalize_spec(minimal_spec()))
+
+
+@pytest.mark.parametrize('spec', [
+    [],
+    minimal_spec(extra=1),
+    minimal_spec(version=2),
+    {'images': [], 'audio': AUDIO},
+    {'images': ['no-es-hash'], 'audio': AUDIO},
+    {'images': [IMAGE]},
+    minimal_spec(subtitles='x'),
+    minimal_spec(video={'codec': 'h265'}),
+    minimal_spec(video={'transition': 'crossfade'}),
+    minimal_spec(video={'fps': 0}),
+    minimal_spec(video={'resolution': [1080]}),
+    minimal_spec(subtitle_style={'size': 'grande'}),
+    minimal_spec(intro='Hola'),
+    minimal_spec(intro={'text': 'Hola', 'type': 'fade'}),
+    minimal_spec(intro={'text': 'Hola', 'duration': 0}),
+    minimal_spec(intro={'text': 'Hola', 'duration': 'larga'}),
+    minimal_spec(outro={'text': 'Fin', 'bg_image': 'fondo.png'}),
+])
+def test_invalid_specs(spec):
+    with pytest.raises(SpecError):
+        normalize_spec(spec)
+
+
+def test_merge_spec_combines_objects_by_field():
+    base = minimal_spec(video={'fps': 4, 'transition': {'type': 'crossfade', 'duration': 0.5}})
+    merged = merge_spec(base, {'video': {'transition': {'duration': 1}}, 'images': [IMAGE]})
+    assert merged['video'] == {'fps': 4, 'transition': {'type': 'crossfade', 'duration': 1}}
+    assert merged['images'] == [IMAGE]
+    assert base['video']['transition']['duration'] == 0.5
+    assert base['images'] == [IMAGE, IMAGE]
+
+
+def test_asset_store_deduplicates_by_content(tmp_path):
+    store = AssetStore(str(tmp_path / 'assets'))
+    source = tmp_path / 'foto.PNG'
+    source.write_bytes(b'imagen')
+    digest = store.add_file(str(source))
+    assert store.add_stream(io.BytesIO(b'imagen'), 'otra.jpg') == digest
+    assert [p.name for p in (tmp_path / 'assets').iterdir()] == [f'{digest}.png']
+    assert store.require(digest, 'images').endswith(f'{digest}.png')
+
+    store.copy_to(digest, str(tmp_path / 'copia.png'))
+    assert (tmp_path / 'copia.png').read_bytes() == b'imagen'
+
+
+def test_asset_store_missing_assets(tmp_path):
+    store = AssetStore(str(tmp_path / 'assets'))
+    assert store.path('c' * 64) is None
+    assert store.path('../etc/passwd') is None
+    with pytest.raises(SpecError):
+        store.require('c' * 64, 'audio')
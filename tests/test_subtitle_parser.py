@@ -0,0 +1,97 @@
+"""Parser de subtítulos SRT/WebVTT e índice por tiempo."""
+
+import pytest
+
+from subtitle_parser import Cue, CueIndex, find_subtitle_file, iter_cues, parse_subtitles, parse_timestamp
+
+
+def write(tmp_path, name, content: bytes) -> str:
+    path = tmp_path / name
+    path.write_bytes(content)
+    return str(path)
+
+
+def as_tuples(cues):
+    return [(cue.start, cue.end, cue.text) for cue in cues]
+
+
+@pytest.mark.parametrize('value, seconds', [
+    ('00:00:01,500', 1.5),
+    ('01:02:03.004', 3723.004),
+    ('02:03.25', 123.25),
+    ('00:00:07', 7),
+])
+def test_parse_timestamp(value, seconds):
+    assert parse_timestamp(value) == pytest.approx(seconds)
+
+
+def test_srt_with_crlf_bom_and_trailing_spaces(tmp_path):
+    content = (
+        '﻿1\r\n00:00:01,000 --> 00:00:02,500  \r\nHola  \r\nmundo\r\n\r\n'
+        '2\r\n00:00:03,000 --> 00:00:04,000\r\n<i>Adiós</i>\r\n'
+    ).encode('utf-8')
+    cues = parse_subtitles(write(tmp_path, 'a.srt', content))
+    assert as_tuples(cues) == [(1.0, 2.5, 'Hola mundo'), (3.0, 4.0, 'Adiós')]
+
+
+def test_vtt_blocks_identifiers_and_cue_settings(tmp_path):
+    content = (
+        'WEBVTT - título\n\n'
+        'STYLE\n::cue { color: red }\n\n'
+        'NOTE un comentario\nde dos líneas\n\n'
+        'intro\n00:01.000 --> 00:02.000 align:start position:10%\nPrimera\n\n'
+        '00:00:03.000 --> 00:00:05.000 line:0\n<v Ana>Segunda</v>\n'
+    ).encode('utf-8')
+    cues = parse_subtitles(write(tmp_path, 'a.vtt', content))
+    assert as_tuples(cues) == [(1.0, 2.0, 'Primera'), (3.0, 5.0, 'Segunda')]
+
+
+def test_empty_and_inverted_cues_are_dropped_and_sorted(tmp_path):
+    content = (
+        '1\n00:00:05,000 --> 00:00:06,000\nTarde\n\n'
+        '2\n00:00:03,000 --> 00:00:02,000\nAl revés\n\n'
+        '3\n00:00:01,000 --> 00:00:02,000\nTemprano\n'
+    ).encode('utf-8')
+    cues = parse_subtitles(write(tmp_path, 'a.srt', content))
+    assert as_tuples(cues) == [(1.0, 2.0, 'Temprano'), (5.0, 6.0, 'Tarde')]
+
+
+def test_iter_cues_accepts_any_iterable_of_lines():
+    lines = ['1', '00:00:00,000 --> 00:00:01,000', 'uno', '   ', '2', '00:00:01,000 --> 00:00:02,000', 'dos']
+    assert as_tuples(iter_cues(lines)) == [(0.0, 1.0, 'uno'), (1.0, 2.0, 'dos')]
+
+
+def test_find_subtitle_file(tmp_path):
+    assert find_subtitle_file(str(tmp_path / 'no_existe')) is None
+    (tmp_path / 'notas.txt').write_text('x')
+    assert find_subtitle_file(str(tmp_path)) is None
+    (tmp_path / 'b.vtt').write_text('WEBVTT')
+    (tmp_path / 'a.SRT').write_text('')
+    assert find_subtitle_file(str(tmp_path)).endswith('a.SRT')
+
+
+def test_cue_index_returns_active_cues_in_order():
+    cues = [Cue(4, 6, 'c'), Cue(0, 2, 'a'), Cue(1, 5, 'b')]
+    index = CueIndex(cues)
+    assert len(index) == 3
+    assert index.active(0.5) == [1]
+    assert index.active(1.5) == [1, 2]
+    assert index.active(4.5) == [0, 2]
+    assert index.active(6.5) == []
+
+
+def test_cue_index_edges_are_half_open():
+    index = CueIndex([Cue(1, 2, 'a'), Cue(2, 3, 'b')])
+    assert index.active(1.0) == [0]
+    assert index.active(2.0) == [1]
+    assert index.active(3.0) == []
+    assert index.active(0.999) == []
+
+
+def test_cue_index_finds_long_cues_that_started_early():
+    cues = [Cue(0, 100, 'largo')] + [Cue(i, i + 0.5, str(i)) for i in range(1, 50)]
+    assert CueIndex(cues).active(30.2) == [0, 30]
+
+
+def test_empty_cue_index():
+    assert CueIndex([]).active(1.0) == []
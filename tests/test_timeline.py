@@ -0,0 +1,167 @@
+"""Línea de tiempo del render: intervalos a re-renderizar y frames repetidos."""
+
+import pytest
+
+from subtitle_parser import Cue
+from timeline import IntervalIndex, align_to_keyframes, build_timeline, dirty_intervals, hold_frame_keys, keyframe_frames
+
+
+@pytest.fixture
+def images(tmp_path):
+    paths = []
+    for i in range(4):
+        path = tmp_path / f'img{i}.jpg'
+        path.write_bytes(f'imagen {i}'.encode())
+        paths.append(str(path))
+    return paths
+
+
+def make_timeline(images, duration=20.0, transition='crossfade', subtitles=None, style=None,
+                  intro=None, outro=None, resolution=(1080, 1920), fps=4):
+    return build_timeline(
+        images, duration, resolution, fps, transition, 0.5,
+        True, True, subtitles or [], style or {'font_size': 75}, intro, outro,
+    )
+
+
+def test_same_timeline_is_clean(images):
+    assert dirty_intervals(make_timeline(images), make_timeline(images)) == []
+
+
+def test_without_previous_renders_everything(images):
+    assert dirty_intervals(None, make_timeline(images)) is None
+
+
+@pytest.mark.parametrize('change', [
+    {'resolution': (720, 1280)},
+    {'fps': 8},
+    {'duration': 21.0},
+    {'transition': 'fade_black'},
+])
+def test_global_changes_render_everything(images, change):
+    assert dirty_intervals(make_timeline(images), make_timeline(images, **change)) is None
+
+
+def test_changed_image_dirties_only_its_slot(images, tmp_path):
+    previous = make_timeline(images)
+    other = tmp_path / 'otra.jpg'
+    other.write_bytes(b'otra imagen')
+    current = make_timeline(images[:2] + [str(other)] + images[3:])
+
+    slot = current['slots'][2]
+    assert dirty_intervals(previous, current) == [(slot['start'], slot['end'])]
+
+
+def test_image_count_change_renders_everything(images):
+    assert dirty_intervals(make_timeline(images), make_timeline(images[:3])) is None
+
+
+def test_changed_cue_dirties_old_and_new_windows(images):
+    previous = make_timeline(images, subtitles=[Cue(1, 2, 'hola'), Cue(10, 12, 'chau')])
+    current = make_timeline(images, subtitles=[Cue(1, 2, 'hola'), Cue(11, 13, 'chau')])
+    assert dirty_intervals(previous, current) == [(10, 13)]
+
+
+def test_subtitle_style_dirties_the_whole_song(images):
+    cues = [Cue(1, 2, 'hola')]
+    previous = make_timeline(images, subtitles=cues, style={'font_size': 75})
+    current = make_timeline(images, subtitles=cues, style={'font_size': 60})
+    assert dirty_intervals(previous, current) == [(0, 20.0)]
+
+
+def test_intro_text_change_dirties_the_intro_only(images):
+    previous = make_timeline(images, intro={'text': 'A', 'duration': 2}, subtitles=[Cue(1, 2, 'hola')])
+    current = make_timeline(images, intro={'text': 'B', 'duration': 2}, subtitles=[Cue(1, 2, 'otra')])
+    # El subtítulo se desplaza por la duración del intro
+    assert dirty_intervals(previous, current) == [(0, 2), (3, 4)]
+
+
+def test_intro_duration_change_renders_everything(images):
+    previous = make_timeline(images, intro={'text': 'A', 'duration': 2})
+    current = make_timeline(images, intro={'text': 'A', 'duration': 3})
+    assert dirty_intervals(previous, current) is None
+
+
+def test_adding_an_outro_renders_everything(images):
+    assert dirty_intervals(make_timeline(images), make_timeline(images, outro={'text': 'Fin', 'duration': 2})) is None
+
+
+def test_outro_change_dirties_the_end(images):
+    previous = make_timeline(images, outro={'text': 'Fin', 'duration': 2})
+    current = make_timeline(images, outro={'text': 'The end', 'duration': 2})
+    assert dirty_intervals(previous, current) == [(20.0, 22.0)]
+
+
+def test_dirty_ranges_expand_to_keyframes(images):
+    timeline = make_timeline(images, intro={'text': 'A', 'duration': 2})
+    keyframes = keyframe_frames(timeline, gop_frames=8)
+    # Intro de 8 frames y canción desde el frame 8, con keyframes cada 8
+    assert keyframes[:4] == [0, 8, 16, 24]
+    assert align_to_keyframes([(2.5, 3.1)], keyframes, 4) == [(8, 16)]
+    assert align_to_keyframes([(0, 2), (3.9, 4.1)], keyframes, 4) == [(0, 24)]
+
+
+def test_hold_keys_repeat_inside_a_static_span(images):
+    key_at = hold_frame_keys(make_timeline(images))
+    # Primer slot: fundido de 0 a 0.5 s, imagen fija hasta el siguiente fundido
+    assert key_at(1.0) == key_at(2.0) == key_at(3.75)
+    assert key_at(0.25) == ('frame', 1)
+    assert key_at(0.25) != key_at(1.0)
+
+
+def test_hold_keys_change_with_each_typewriter_step(images):
+    key_at = hold_frame_keys(make_timeline(images, subtitles=[Cue(1.0, 3.0, 'hola mundo')]))
+    before, during, after = key_at(0.75), key_at(2.9), key_at(3.5)
+    assert len({before, during, after}) == 3
+    assert key_at(2.9) == key_at(2.95)
+
+
+def test_hold_keys_are_unique_for_moving_slots(images):
+    timeline = build_timeline(
+        images, 20.0, (1080, 1920), 4, 'crossfade', 0.5, True, True,
+        motions=[{'preset': 'zoomIn', 'quality': 'fast'}] + [None] * 3,
+    )
+    key_at = hold_frame_keys(timeline)
+    assert key_at(1.0) != key_at(2.0)
+    assert key_at(6.0) == key_at(7.0)
+
+
+def test_hold_keys_are_unique_on_boundaries(images):
+    timeline = make_timeline(images, subtitles=[Cue(1.0, 3.0, 'hola')])
+    key_at = hold_frame_keys(timeline)
+    # El frame que cae justo sobre el inicio del subtítulo no comparte clave
+    assert key_at(1.0) == ('frame', 4)
+
+
+def brute_force_active(intervals, t):
+    return [i for i, (start, end) in enumerate(intervals) if start <= t < end]
+
+
+def test_interval_index_at_bucket_edges():
+    intervals = [(0.0, 0.25), (0.25, 0.5), (0.1, 1.0), (0.75, 0.75), (0.5, 0.75)]
+    index = IntervalIndex(intervals, bucket_size=0.25)
+    for t in (0.0, 0.1, 0.2499, 0.25, 0.5, 0.7499, 0.75, 0.9999, 1.0):
+        assert index.active(t) == brute_force_active(intervals, t), t
+
+
+def test_interval_index_outside_range():
+    index = IntervalIndex([(0.0, 1.0), (1.0, 2.0)], bucket_size=0.25)
+    assert index.active(-0.01) == []
+    assert index.active(2.0) == []
+    assert index.active(100.0) == []
+    assert IntervalIndex([], bucket_size=0.25).active(0.0) == []
+
+
+def test_interval_index_keeps_original_order():
+    intervals = [(0.5, 3.0), (0.0, 4.0), (0.6, 0.7), (0.55, 2.0)]
+    index = IntervalIndex(intervals, bucket_size=0.25)
+    assert len(index) == 4
+    assert index.active(0.65) == [0, 1, 2, 3]
+
+
+def test_interval_index_matches_brute_force():
+    intervals = [((i * 7) % 23 / 4, (i * 7) % 23 / 4 + (i % 5) * 0.3) for i in range(40)]
+    index = IntervalIndex(intervals, bucket_size=0.25)
+    for step in range(-4, 120):
+        t = step / 16
+        assert index.active(t) == brute_force_active(intervals, t), t
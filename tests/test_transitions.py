@@ -0,0 +1,100 @@
+"""Kernels de transición contra una referencia float (máscara por píxel)."""
+
+import numpy as np
+import pytest
+
+from transitions import TRANSITIONS, TransitionBuffers, get_transition
+
+HEIGHT, WIDTH = 24, 40
+
+
+def float_mask_blend(a, b, progress):
+    """Referencia: mezcla con una máscara float, redondeada al entero más cercano."""
+    mask = np.full(a.shape[:2], progress, dtype=np.float64)[:, :, None]
+    return np.rint(b * mask + a * (1 - mask)).astype(np.uint8)
+
+
+@pytest.fixture
+def frames():
+    rng = np.random.default_rng(0)
+    a = rng.integers(0, 256, (HEIGHT, WIDTH, 3), dtype=np.uint8)
+    b = rng.integers(0, 256, (HEIGHT, WIDTH, 3), dtype=np.uint8)
+    return a, b
+
+
+@pytest.fixture
+def buffers():
+    return TransitionBuffers(HEIGHT, WIDTH)
+
+
+def max_error(result, expected):
+    return int(np.abs(result.astype(np.int16) - expected.astype(np.int16)).max())
+
+
+@pytest.mark.parametrize('progress', [0.0, 0.1, 0.25, 0.5, 0.77, 1.0])
+def test_crossfade_matches_float_mask(frames, buffers, progress):
+    a, b = frames
+    result = get_transition('crossfade')['kernel'](a, b, progress, buffers)
+    # Alfa entero de 8 bits: a lo sumo una unidad de diferencia
+    assert max_error(result, float_mask_blend(a, b, progress)) <= 1
+
+
+@pytest.mark.parametrize('progress', [0.0, 0.2, 0.5, 0.8, 1.0])
+def test_fade_goes_through_black(frames, buffers, progress):
+    a, b = frames
+    result = get_transition('fade')['kernel'](a, b, progress, buffers)
+    black = np.zeros_like(a)
+    if progress < 0.5:
+        expected = float_mask_blend(a, black, progress * 2)
+    else:
+        expected = float_mask_blend(black, b, progress * 2 - 1)
+    assert max_error(result, expected) <= 1
+
+
+@pytest.mark.parametrize('name', ['fadein', 'fadeout'])
+def test_edge_fades_blend_with_black(frames, buffers, name):
+    a, _ = frames
+    transition = get_transition(name)
+    assert transition['overlap'] is False
+    result = transition['kernel'](buffers.black, a, 0.3, buffers)
+    assert max_error(result, float_mask_blend(np.zeros_like(a), a, 0.3)) <= 1
+
+
+@pytest.mark.parametrize('progress', [0.0, 0.25, 0.5, 1.0])
+def test_slides_and_wipes_are_exact(frames, buffers, progress):
+    a, b = frames
+    cols = int(round(progress * WIDTH))
+    rows = int(round(progress * HEIGHT))
+    expected = {
+        'slide_left': np.concatenate([a[:, cols:], b[:, :cols]], axis=1),
+        'slide_right': np.concatenate([b[:, WIDTH - cols:], a[:, :WIDTH - cols]], axis=1),
+        'slide_up': np.concatenate([a[rows:], b[:rows]], axis=0),
+        'slide_down': np.concatenate([b[HEIGHT - rows:], a[:HEIGHT - rows]], axis=0),
+        'wipe_left': np.concatenate([a[:, :WIDTH - cols], b[:, WIDTH - cols:]], axis=1),
+        'wipe_right': np.concatenate([b[:, :cols], a[:, cols:]], axis=1),
+    }
+    for name, reference in expected.items():
+        result = get_transition(name)['kernel'](a, b, progress, buffers)
+        np.testing.assert_array_equal(result, reference, err_msg=name)
+
+
+def test_zoom_ends_on_the_new_image(frames, buffers):
+    a, b = frames
+    kernel = get_transition('zoom')['kernel']
+    np.testing.assert_array_equal(kernel(a, b, 0.0, buffers), a)
+    np.testing.assert_array_equal(kernel(a, b, 1.0, buffers), b)
+
+
+@pytest.mark.parametrize('name', sorted(TRANSITIONS))
+def test_kernels_keep_shape_and_inputs(frames, buffers, name):
+    a, b = frames
+    a_copy, b_copy = a.copy(), b.copy()
+    result = TRANSITIONS[name]['kernel'](a, b, 0.4, buffers)
+    assert result.shape == (HEIGHT, WIDTH, 3) and result.dtype == np.uint8
+    np.testing.assert_array_equal(a, a_copy)
+    np.testing.assert_array_equal(b, b_copy)
+
+
+def test_unknown_transition_is_none():
+    assert get_transition('none') is None
+    assert get_transition('desconocida') is None
@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+Modelo de línea de tiempo del video.
+
+Describe qué se muestra en cada instante del video final (intro, slots de
+imágenes, transiciones, subtítulos y outro) como un diccionario serializable,
+sin depender de MoviePy. Comparando la línea de tiempo de un render anterior
+con la nueva se obtienen los intervalos que realmente cambiaron, de modo que
+solo esos tramos se re-renderizan y se empalman en el video anterior.
+"""
+
+import hashlib
+import math
+from bisect import bisect_right
+
+# Cambiar esta versión cuando cambie la forma de renderizar los frames,
+# para que los videos anteriores no se reutilicen con otro aspecto.
+TIMELINE_VERSION = 3
+
+# Claves cuyo cambio afecta a todo el video
+GLOBAL_KEYS = ('version', 'resolution', 'fps', 'duration', 'transition')
+
+# Parámetros del efecto typewriter de los subtítulos
+SUBTITLE_TYPEWRITER_RATIO = 0.7
+SUBTITLE_MAX_STEPS = 30
+
+# Proporción del intro/outro usada para escribir el texto con typewriter
+TITLE_TYPEWRITER_RATIO = 0.6
+
+# Margen (segundos) alrededor de cada cambio visual en el que no se reutilizan frames
+HOLD_EPSILON = 1e-6
+
+
+def file_digest(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Calcula el hash SHA-256 del contenido de un archivo."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def build_timeline(images: list[str], audio_duration: float, resolution: tuple[int, int],
+                   fps: int, transition_type: str, transition_duration: float,
+                   needs_overlap: bool, has_effects: bool, subtitles: list = None,
+                   subtitle_config: dict = None, intro_config: dict = None,
+                   outro_config: dict = None, motions: list[dict] = None,
+                   cut_points: list[float] = None) -> dict:
+    """
+    Construye la línea de tiempo de un render.
+
+    Los tiempos de los slots y subtítulos son relativos al inicio de la canción;
+    el video final los desplaza por la duración del intro. `motions` indica el
+    movimiento Ken Burns de cada imagen (None = imagen fija). `cut_points` son
+    los instantes de cambio de imagen (len(images) - 1, p. ej. sobre los beats);
+    sin ellos la canción se reparte en partes iguales.
+    """
+    num_images = len(images)
+    duration_per_image = audio_duration / num_images
+    overlap = needs_overlap and transition_duration > 0
+
+    if cut_points:
+        # Cada imagen empieza en su corte; con solapamiento la anterior se
+        # extiende la duración de la transición
+        starts = [0.0] + list(cut_points)
+        ends = [
+            min(audio_duration, start + transition_duration) if overlap else start
+            for start in starts[1:]
+        ] + [audio_duration]
+        shortest = min(b - a for a, b in zip(starts, starts[1:] + [audio_duration]))
+    else:
+        step = duration_per_image - transition_duration if overlap else duration_per_image
+        starts = [i * step for i in range(num_images)]
+        ends = [start + duration_per_image for start in starts]
+        shortest = duration_per_image
+
+    effects = has_effects and transition_duration > 0 and shortest > transition_duration * 2
+
+    slots = []
+    for i, image_path in enumerate(images):
+        slots.append({
+            'index': i,
+            'start': starts[i],
+            'end': ends[i],
+            'digest': file_digest(image_path),
+            'effects': effects,
+            'motion': motions[i] if motions else None,
+        })
+
+    intro = _title_entry(intro_config)
+    outro = _title_entry(outro_config)
+    intro_duration = intro['duration'] if intro else 0
+    outro_duration = outro['duration'] if outro else 0
+
+    return {
+        'version': TIMELINE_VERSION,
+        'resolution': list(resolution),
+        'fps': fps,
+        'duration': intro_duration + audio_duration + outro_duration,
+        'main_duration': audio_duration,
+        'transition': {
+            'type': transition_type,
+            'duration': transition_duration,
+            'overlap': overlap,
+        },
+        'intro': intro,
+        'outro': outro,
+        'slots': slots,
+        'subtitles': {
+            'style': dict(subtitle_config or {}),
+            'cues': [
+                {'start': cue.start, 'end': cue.end, 'text': cue.text}
+                for cue in (subtitles or [])
+            ],
+        },
+    }
+
+
+def _title_entry(config: dict) -> dict | None:
+    """Resume la configuración de un intro/outro incluyendo el hash de su imagen de fondo."""
+    if not config:
+        return None
+    entry = {key: value for key, value in config.items() if key != 'bg_image'}
+    bg_image = config.get('bg_image')
+    entry['bg_digest'] = file_digest(bg_image) if bg_image else None
+    return entry
+
+
+def typewriter_steps(text: str, start: float, end: float,
+                     ratio: float = SUBTITLE_TYPEWRITER_RATIO,
+                     max_steps: int = SUBTITLE_MAX_STEPS) -> list[tuple[float, float, int]]:
+    """
+    Divide un subtítulo en pasos del efecto typewriter.
+
+    En lugar de un paso por caracter, agrupa caracteres para crear como máximo
+    `max_steps` pasos. Retorna tuplas (inicio, fin, caracteres visibles); el
+    último paso mantiene el texto completo hasta el final del subtítulo.
+    """
+    duration = end - start
+    typewriter_duration = duration * ratio
+    hold_duration = duration * (1 - ratio)
+
+    num_chars = len(text)
+    char_step = max(1, num_chars // max_steps)
+
+    # Siempre incluimos el último caracter para mostrar el texto completo
+    positions = list(range(char_step, num_chars, char_step))
+    if not positions or positions[-1] != num_chars:
+        positions.append(num_chars)
+
+    time_per_step = typewriter_duration / len(positions)
+
+    steps = []
+    for idx, char_pos in enumerate(positions):
+        step_start = start + idx * time_per_step
+        step_duration = time_per_step + hold_duration if idx == len(positions) - 1 else time_per_step
+        steps.append((step_start, step_start + step_duration, char_pos))
+    return steps
+
+
+class IntervalIndex:
+    """
+    Índice de intervalos por cubetas de tiempo fijas (p. ej. una por frame).
+
+    Cada cubeta guarda los intervalos que la tocan, así que `active(t)` solo
+    revisa esos pocos candidatos: el costo no crece con la cantidad total de
+    intervalos. Los índices se retornan en el orden original (orden de capas).
+    """
+
+    __slots__ = ('starts', 'ends', 'bucket_size', 'buckets')
+
+    def __init__(self, intervals: list[tuple[float, float]], bucket_size: float):
+        self.starts = [start for start, _ in intervals]
+        self.ends = [end for _, end in intervals]
+        self.bucket_size = bucket_size
+
+        count = int(max(self.ends, default=0) / bucket_size) + 1
+        buckets = [[] for _ in range(count)]
+        for i, (start, end) in enumerate(intervals):
+            if end <= start:
+                continue
+            for bucket in range(max(0, int(start / bucket_size)), min(count - 1, int(end / bucket_size)) + 1):
+                buckets[bucket].append(i)
+        self.buckets = [tuple(bucket) for bucket in buckets]
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def active(self, t: float) -> list[int]:
+        """Índices de los intervalos con inicio <= t < fin."""
+        bucket = int(t / self.bucket_size) if t >= 0 else -1
+        if bucket < 0 or bucket >= len(self.buckets):
+            return []
+        return [i for i in self.buckets[bucket] if self.starts[i] <= t < self.ends[i]]
+
+
+def main_offset(timeline: dict) -> float:
+    """Instante del video final en que empieza la canción (después del intro)."""
+    return timeline['intro']['duration'] if timeline['intro'] else 0
+
+
+def merge_intervals(intervals: list[tuple[float, float]]) -> list[tuple[float, float]]:
+    """Ordena y une intervalos que se solapan o se tocan."""
+    merged = []
+    for start, end in sorted(intervals):
+        if end <= start:
+            continue
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def dirty_intervals(previous: dict, current: dict) -> list[tuple[float, float]] | None:
+    """
+    Calcula los intervalos del video final afectados al pasar de `previous` a `current`.
+
+    Retorna None cuando el cambio es global (resolución, fps, duración, transición,
+    número de imágenes, duración del intro...) y hay que renderizar todo el video.
+    Una lista vacía significa que el video anterior se puede reutilizar tal cual.
+    """
+    if not previous:
+        return None
+
+    for key in GLOBAL_KEYS:
+        if previous.get(key) != current.get(key):
+            return None
+
+    intervals = []
+
+    # Intro y outro: si cambia su duración se desplaza todo lo demás
+    for key in ('intro', 'outro'):
+        old, new = previous.get(key), current.get(key)
+        if bool(old) != bool(new):
+            return None
+        if old and old['duration'] != new['duration']:
+            return None
+        if old != new:
+            if key == 'intro':
+                intervals.append((0, new['duration']))
+            else:
+                intervals.append((current['duration'] - new['duration'], current['duration']))
+
+    offset = main_offset(current)
+
+    # Imágenes: cambiar una imagen solo ensucia su slot (que ya incluye los
+    # solapamientos de transición con sus vecinos)
+    old_slots, new_slots = previous['slots'], current['slots']
+    if len(old_slots) != len(new_slots):
+        return None
+    for old, new in zip(old_slots, new_slots):
+        if old['start'] != new['start'] or old['end'] != new['end']:
+            return None
+        if old != new:
+            intervals.append((offset + new['start'], offset + new['end']))
+
+    # Subtítulos: un cambio de estilo afecta a toda la canción; un cambio de
+    # texto o tiempos solo a la ventana de las líneas afectadas
+    old_subs, new_subs = previous['subtitles'], current['subtitles']
+    if old_subs['style'] != new_subs['style']:
+        intervals.append((offset, offset + current['main_duration']))
+    else:
+        old_cues = {(c['start'], c['end'], c['text']) for c in old_subs['cues']}
+        new_cues = {(c['start'], c['end'], c['text']) for c in new_subs['cues']}
+        for start, end, _ in old_cues ^ new_cues:
+            intervals.append((offset + start, offset + end))
+
+    return merge_intervals(intervals)
+
+
+def title_is_still(config: dict) -> bool:
+    """Indica si un intro/outro no tiene animaciones (todos sus frames son iguales)."""
+    return config.get('animation_in', 'none') == 'none' and config.get('animation_out', 'none') == 'none'
+
+
+def total_frames(timeline: dict) -> int:
+    """Número de frames del video final."""
+    return int(timeline['duration'] * timeline['fps'])
+
+
+def render_segments(timeline: dict) -> list[dict]:
+    """
+    Tramos del video final que se codifican por separado (intro, canción, outro).
+
+    Los límites están en índices de frame: el frame n muestra el instante n / fps,
+    así que cada tramo empieza en el primer frame cuyo instante cae dentro de él.
+    Cada tramo empieza con un keyframe; los títulos sin animación son frames fijos.
+    """
+    fps = timeline['fps']
+    total = total_frames(timeline)
+
+    def to_frame(t: float) -> int:
+        return min(total, max(0, math.ceil(t * fps - 1e-9)))
+
+    intro, outro = timeline['intro'], timeline['outro']
+    main_start = to_frame(main_offset(timeline))
+    main_end = to_frame(timeline['duration'] - outro['duration']) if outro else total
+
+    segments = []
+    if intro:
+        segments.append({'kind': 'intro', 'start': 0, 'end': main_start, 'still': title_is_still(intro)})
+    segments.append({'kind': 'main', 'start': main_start, 'end': main_end, 'still': False})
+    if outro:
+        segments.append({'kind': 'outro', 'start': main_end, 'end': total, 'still': title_is_still(outro)})
+    return [segment for segment in segments if segment['end'] > segment['start']]
+
+
+def keyframe_frames(timeline: dict, gop_frames: int) -> list[int]:
+    """Frames del video final donde el encoder coloca keyframes (GOP fijo por tramo)."""
+    keyframes = set()
+    for segment in render_segments(timeline):
+        keyframes.update(range(segment['start'], segment['end'], gop_frames))
+        keyframes.add(segment['end'])
+    return sorted(keyframes)
+
+
+def align_to_keyframes(intervals: list[tuple[float, float]], keyframes: list[int],
+                       fps: int) -> list[tuple[int, int]]:
+    """Convierte intervalos en segundos a rangos de frames expandidos a los keyframes que los contienen."""
+    aligned = []
+    for start, end in intervals:
+        start_frame = math.floor(start * fps + 1e-9)
+        end_frame = math.ceil(end * fps - 1e-9)
+        aligned_start = keyframes[max(0, bisect_right(keyframes, start_frame) - 1)]
+        idx = bisect_right(keyframes, end_frame - 1)
+        aligned_end = keyframes[min(idx, len(keyframes) - 1)]
+        aligned.append((aligned_start, aligned_end))
+    return merge_intervals(aligned)
+
+
+def _title_windows(config: dict, start: float) -> list[tuple[float, float]]:
+    """Ventanas animadas de un intro/outro que empieza en `start`."""
+    duration = config['duration']
+    animation_duration = min(1.0, duration / 3)
+    animation_in = config.get('animation_in', 'none')
+    animation_out = config.get('animation_out', 'none')
+
+    windows = []
+    if animation_in == 'typewriter':
+        windows.append((start, start + duration * TITLE_TYPEWRITER_RATIO))
+    elif animation_in != 'none':
+        windows.append((start, start + animation_duration))
+    if animation_out != 'none':
+        windows.append((start + duration - animation_duration, start + duration))
+    return windows
+
+
+def visual_segments(timeline: dict) -> tuple[list[float], list[bool]]:
+    """
+    Divide el video final en tramos donde nada cambia salvo dentro de animaciones.
+
+    Retorna los límites ordenados de los tramos y, por cada tramo, si es
+    dinámico (transición o animación: cada frame es distinto) o estático
+    (imagen fija con el mismo subtítulo: todos los frames son idénticos).
+    """
+    boundaries = {0.0, timeline['duration']}
+    windows = []
+
+    offset = main_offset(timeline)
+    boundaries.update((offset, offset + timeline['main_duration']))
+
+    if timeline['intro']:
+        windows += _title_windows(timeline['intro'], 0)
+    if timeline['outro']:
+        windows += _title_windows(timeline['outro'], timeline['duration'] - timeline['outro']['duration'])
+
+    transition_duration = timeline['transition']['duration']
+    for slot in timeline['slots']:
+        start, end = offset + slot['start'], offset + slot['end']
+        boundaries.update((start, end))
+        if slot.get('motion'):
+            windows.append((start, end))
+        if slot['effects']:
+            windows += [(start, start + transition_duration), (end - transition_duration, end)]
+
+    style = timeline['subtitles']['style']
+    for cue in timeline['subtitles']['cues']:
+        if not cue['text']:
+            continue
+        start, end = offset + cue['start'], offset + cue['end']
+        if style.get('typewriter_enabled', True):
+            for step_start, step_end, _ in typewriter_steps(cue['text'], start, end):
+                boundaries.update((step_start, step_end))
+        else:
+            boundaries.update((start, end))
+
+    for start, end in windows:
+        boundaries.update((start, end))
+
+    boundaries = sorted(boundaries)
+    windows = merge_intervals(windows)
+    window_starts = [start for start, _ in windows]
+
+    dynamic = []
+    for start, end in zip(boundaries, boundaries[1:] + [math.inf]):
+        middle = (start + end) / 2 if end != math.inf else start
+        idx = bisect_right(window_starts, middle) - 1
+        dynamic.append(idx >= 0 and middle < windows[idx][1])
+
+    return boundaries, dynamic
+
+
+def hold_frame_keys(timeline: dict):
+    """
+    Retorna una función t -> clave del contenido visual del frame en el instante t.
+
+    Dos instantes con la misma clave muestran exactamente el mismo frame, por lo
+    que basta con componerlo una vez. Los frames de tramos dinámicos y los que
+    caen justo sobre un cambio reciben una clave única.
+    """
+    boundaries, dynamic = visual_segments(timeline)
+    fps = timeline['fps']
+
+    def key_at(t: float):
+        idx = bisect_right(boundaries, t) - 1
+        near_boundary = (
+            (idx >= 0 and t - boundaries[idx] < HOLD_EPSILON)
+            or (idx + 1 < len(boundaries) and boundaries[idx + 1] - t < HOLD_EPSILON)
+        )
+        if idx < 0 or dynamic[idx] or near_boundary:
+            return ('frame', round(t * fps))
+        return ('hold', idx)
+
+    return key_at
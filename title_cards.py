@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Tarjetas de título (intro/outro) renderizadas a partir de un fondo y un sprite.
+
+El fondo (color o imagen de fondo recortada) se compone una sola vez como frame
+uint8 y el texto se rasteriza una sola vez como sprite RGB + alfa. Las
+animaciones (fade, slide, zoom, typewriter) son operaciones baratas por frame
+sobre el sprite: desplazar, escalar el alfa o redimensionar solo el sprite.
+Una tarjeta sin animaciones es un frame fijo y se codifica como tal.
+"""
+
+import numpy as np
+from PIL import Image
+from moviepy import TextClip, VideoClip
+
+from slideshow import prepare_frame
+from timeline import TITLE_TYPEWRITER_RATIO
+
+# Escala inicial (zoom in) y final (zoom out) del texto
+ZOOM_MIN_SCALE = 0.3
+
+
+def hex_to_rgb(hex_color: str) -> tuple[int, int, int]:
+    """Convierte un color hexadecimal a RGB."""
+    hex_color = hex_color.lstrip('#')
+    return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+
+
+def title_background(config: dict, resolution: tuple[int, int]) -> np.ndarray:
+    """Frame de fondo de la tarjeta: imagen de fondo en modo cover o color sólido."""
+    if config.get('bg_image'):
+        try:
+            return prepare_frame(config['bg_image'], resolution)
+        except OSError:
+            pass
+    width, height = resolution
+    background = np.empty((height, width, 3), dtype=np.uint8)
+    background[:] = hex_to_rgb(config['bg_color'])
+    background.flags.writeable = False
+    return background
+
+
+def render_text_sprite(text: str, config: dict, resolution: tuple[int, int]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Rasteriza el texto una sola vez.
+
+    Retorna (rgb uint8, alfa uint16 en 0..256) del tamaño del texto.
+    """
+    txt_clip = TextClip(
+        text=text,
+        font_size=config['font_size'],
+        color=config['font_color'],
+        font=config['font_path'],
+        method='caption',
+        size=(resolution[0] - 100, None),
+        text_align='center',
+        margin=(10, int(config['font_size'] * 0.3)),
+    )
+    return clip_sprite(txt_clip)
+
+
+def clip_sprite(txt_clip: TextClip) -> tuple[np.ndarray, np.ndarray]:
+    """Convierte un TextClip en sprite (rgb uint8, alfa uint16 en 0..256) y lo cierra."""
+    rgb = np.ascontiguousarray(txt_clip.get_frame(0), dtype=np.uint8)
+    if txt_clip.mask is not None:
+        alpha = np.rint(txt_clip.mask.get_frame(0) * 256).astype(np.uint16)
+    else:
+        alpha = np.full(rgb.shape[:2], 256, dtype=np.uint16)
+    txt_clip.close()
+    return rgb, alpha
+
+
+def blit(out: np.ndarray, rgb: np.ndarray, alpha: np.ndarray, x: int, y: int, opacity: int = 256) -> None:
+    """Mezcla un sprite sobre `out` en (x, y) con alfa entero, recortando a los bordes."""
+    height, width = out.shape[:2]
+    sprite_h, sprite_w = rgb.shape[:2]
+    x0, y0 = max(0, x), max(0, y)
+    x1, y1 = min(width, x + sprite_w), min(height, y + sprite_h)
+    if x0 >= x1 or y0 >= y1 or opacity <= 0:
+        return
+
+    src = (slice(y0 - y, y1 - y), slice(x0 - x, x1 - x))
+    a = alpha[src][:, :, None]
+    if opacity < 256:
+        a = (a * opacity) >> 8
+    region = out[y0:y1, x0:x1]
+    region[...] = (rgb[src] * a + region * (256 - a) + 128) >> 8
+
+
+def _scaled_sprite(rgb: np.ndarray, alpha: np.ndarray, scale: float) -> tuple[np.ndarray, np.ndarray]:
+    """Redimensiona solo el sprite (no el frame completo) para el zoom."""
+    width = max(1, round(rgb.shape[1] * scale))
+    height = max(1, round(rgb.shape[0] * scale))
+    rgba = np.dstack([rgb, np.minimum(alpha, 255).astype(np.uint8)])
+    resized = np.asarray(Image.fromarray(rgba, 'RGBA').resize((width, height), Image.Resampling.BILINEAR))
+    resized_alpha = resized[:, :, 3].astype(np.uint16)
+    resized_alpha[resized_alpha == 255] = 256
+    return np.ascontiguousarray(resized[:, :, :3]), resized_alpha
+
+
+def _sprite_state(animation: str, progress: float, entering: bool,
+                  base_x: int, base_y: int, sprite_size: tuple[int, int],
+                  resolution: tuple[int, int]) -> tuple[int, int, int, float]:
+    """
+    Posición, opacidad y escala del sprite para una animación de entrada o salida.
+
+    `progress` va de 0 a 1 dentro de la animación; para la entrada 0 es el
+    estado inicial (fuera/transparente/pequeño) y para la salida 1 es el final.
+    """
+    width, height = resolution
+    sprite_w, sprite_h = sprite_size
+    # Fracción de "visibilidad": 1 = en su lugar, 0 = fuera
+    visible = progress if entering else 1 - progress
+
+    x, y, opacity, scale = base_x, base_y, 256, 1.0
+    if animation == 'fade':
+        opacity = int(round(256 * visible))
+    elif animation == 'slide_left':
+        x = round(-sprite_w + (base_x + sprite_w) * visible)
+    elif animation == 'slide_right':
+        x = round(width - (width - base_x) * visible)
+    elif animation == 'slide_top':
+        y = round(-sprite_h + (base_y + sprite_h) * visible)
+    elif animation == 'slide_bottom':
+        y = round(height - (height - base_y) * visible)
+    elif animation == 'zoom':
+        scale = ZOOM_MIN_SCALE + (1 - ZOOM_MIN_SCALE) * visible
+    return x, y, opacity, scale
+
+
+def make_title_clip(config: dict, resolution: tuple[int, int]) -> VideoClip:
+    """Crea el clip de una tarjeta de título (intro/outro) con fondo de color o imagen y animaciones."""
+    width, height = resolution
+    duration = config['duration']
+    text = config['text']
+    animation_in = config.get('animation_in', 'none')
+    animation_out = config.get('animation_out', 'none')
+    animation_duration = min(1.0, duration / 3)  # Duracion de animacion: 1s o 1/3 del total
+
+    background = title_background(config, resolution)
+
+    # Sprites del texto: uno solo, o uno por caracter para typewriter (creados al usarse)
+    sprites = {}
+
+    def sprite_for(chars: int) -> tuple[np.ndarray, np.ndarray]:
+        if chars not in sprites:
+            sprites[chars] = render_text_sprite(text[:chars], config, resolution)
+        return sprites[chars]
+
+    time_per_char = duration * TITLE_TYPEWRITER_RATIO / len(text) if text else duration
+    zoom_cache = {}
+
+    def frame_function(t):
+        if animation_in == 'typewriter':
+            chars = min(len(text), int(t / time_per_char) + 1)
+        else:
+            chars = len(text)
+        rgb, alpha = sprite_for(chars)
+        sprite_h, sprite_w = rgb.shape[:2]
+        base_x, base_y = (width - sprite_w) // 2, (height - sprite_h) // 2
+
+        x, y, opacity, scale = base_x, base_y, 256, 1.0
+        if animation_in not in ('none', 'typewriter') and t < animation_duration:
+            x, y, opacity, scale = _sprite_state(
+                animation_in, t / animation_duration, True, base_x, base_y, (sprite_w, sprite_h), resolution
+            )
+        elif animation_out != 'none' and t > duration - animation_duration:
+            progress = (t - (duration - animation_duration)) / animation_duration
+            x, y, opacity, scale = _sprite_state(
+                animation_out, progress, False, base_x, base_y, (sprite_w, sprite_h), resolution
+            )
+
+        if scale != 1.0:
+            key = (chars, round(scale, 2))
+            if key not in zoom_cache:
+                zoom_cache.clear()
+                zoom_cache[key] = _scaled_sprite(rgb, alpha, key[1])
+            rgb, alpha = zoom_cache[key]
+            x = (width - rgb.shape[1]) // 2
+            y = (height - rgb.shape[0]) // 2
+
+        frame = background.copy()
+        blit(frame, rgb, alpha, x, y, opacity)
+        return frame
+
+    return VideoClip(frame_function, duration=duration)
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Kernels de transición vectorizados.
+
+Cada transición calcula un frame a partir de dos frames uint8 ya preprocesados
+(HxWx3 a la resolución final) y un progreso entre 0 y 1, escribiendo en buffers
+preasignados. Los fundidos usan mezcla alfa entera (sin máscaras float) y los
+deslizamientos solo copian rebanadas, sin remuestrear.
+
+Para agregar una transición nueva basta con registrar su kernel:
+
+    @register_transition('mi_transicion')
+    def mi_transicion(a, b, progress, buffers):
+        ...
+        return buffers.out
+"""
+
+import numpy as np
+
+# Registro de transiciones: nombre -> {'kernel', 'overlap', 'edges'}
+TRANSITIONS = {}
+
+
+class TransitionBuffers:
+    """Buffers reutilizables para calcular frames de transición sin asignar memoria."""
+
+    def __init__(self, height: int, width: int):
+        self.out = np.zeros((height, width, 3), dtype=np.uint8)
+        self.acc = np.zeros((height, width, 3), dtype=np.uint16)
+        self.tmp = np.zeros((height, width, 3), dtype=np.uint16)
+        self.scratch = np.zeros((height, width, 3), dtype=np.uint8)
+        self.black = np.zeros((height, width, 3), dtype=np.uint8)
+        self.black.flags.writeable = False
+
+
+def register_transition(name: str, overlap: bool = True, edges: tuple[str, ...] = ()):
+    """
+    Registra un kernel de transición.
+
+    Args:
+        name: Nombre de la transición (valor de transition_type)
+        overlap: Si True, la transición mezcla dos imágenes consecutivas que se
+            solapan; si False, cada imagen se funde con negro en sus bordes
+        edges: Para transiciones sin solapamiento, bordes de cada imagen donde
+            se aplica ('in' al inicio, 'out' al final)
+    """
+    def decorator(kernel):
+        TRANSITIONS[name] = {'kernel': kernel, 'overlap': overlap, 'edges': edges}
+        return kernel
+    return decorator
+
+
+def get_transition(transition_type: str) -> dict | None:
+    """Retorna la transición registrada con ese nombre ('none' o desconocida -> None)."""
+    return TRANSITIONS.get(transition_type)
+
+
+def _alpha(progress: float) -> int:
+    """Convierte un progreso 0..1 en un alfa entero 0..256."""
+    return min(256, max(0, int(round(progress * 256))))
+
+
+def blend(a: np.ndarray, b: np.ndarray, alpha: int, buffers: TransitionBuffers) -> np.ndarray:
+    """Mezcla entera: (a * (256 - alpha) + b * alpha) / 256, escrita en buffers.out."""
+    if alpha <= 0:
+        return a
+    if alpha >= 256:
+        return b
+    np.multiply(a, 256 - alpha, out=buffers.acc, dtype=np.uint16)
+    np.multiply(b, alpha, out=buffers.tmp, dtype=np.uint16)
+    buffers.acc += buffers.tmp
+    buffers.acc += 128  # redondeo
+    np.right_shift(buffers.acc, 8, out=buffers.acc)
+    np.copyto(buffers.out, buffers.acc, casting='unsafe')
+    return buffers.out
+
+
+def scale(a: np.ndarray, alpha: int, buffers: TransitionBuffers) -> np.ndarray:
+    """Oscurece un frame: a * alpha / 256, escrito en buffers.out."""
+    if alpha >= 256:
+        return a
+    if alpha <= 0:
+        return buffers.black
+    np.multiply(a, alpha, out=buffers.acc, dtype=np.uint16)
+    buffers.acc += 128
+    np.right_shift(buffers.acc, 8, out=buffers.acc)
+    np.copyto(buffers.out, buffers.acc, casting='unsafe')
+    return buffers.out
+
+
+@register_transition('crossfade')
+def crossfade(a, b, progress, buffers):
+    """Fundido cruzado entre las dos imágenes."""
+    return blend(a, b, _alpha(progress), buffers)
+
+
+@register_transition('fade')
+def fade(a, b, progress, buffers):
+    """Fundido a negro de la primera imagen y desde negro de la segunda."""
+    if progress < 0.5:
+        return scale(a, _alpha(1 - progress * 2), buffers)
+    return scale(b, _alpha(progress * 2 - 1), buffers)
+
+
+@register_transition('fadein', overlap=False, edges=('in',))
+@register_transition('fadeout', overlap=False, edges=('out',))
+def fade_edge(a, b, progress, buffers):
+    """Fundido de una imagen con negro (a o b es el frame negro)."""
+    return blend(a, b, _alpha(progress), buffers)
+
+
+def _shift(size: int, progress: float) -> int:
+    """Desplazamiento entero en píxeles para un progreso dado."""
+    return min(size, max(0, int(round(progress * size))))
+
+
+@register_transition('slide_left')
+def slide_left(a, b, progress, buffers):
+    """La imagen nueva entra por la derecha empujando la anterior hacia la izquierda."""
+    width = a.shape[1]
+    shift = _shift(width, progress)
+    out = buffers.out
+    out[:, :width - shift] = a[:, shift:]
+    out[:, width - shift:] = b[:, :shift]
+    return out
+
+
+@register_transition('slide_right')
+def slide_right(a, b, progress, buffers):
+    """La imagen nueva entra por la izquierda empujando la anterior hacia la derecha."""
+    width = a.shape[1]
+    shift = _shift(width, progress)
+    out = buffers.out
+    out[:, shift:] = a[:, :width - shift]
+    out[:, :shift] = b[:, width - shift:]
+    return out
+
+
+@register_transition('slide_up')
+def slide_up(a, b, progress, buffers):
+    """La imagen nueva entra por abajo empujando la anterior hacia arriba."""
+    height = a.shape[0]
+    shift = _shift(height, progress)
+    out = buffers.out
+    out[:height - shift] = a[shift:]
+    out[height - shift:] = b[:shift]
+    return out
+
+
+@register_transition('slide_down')
+def slide_down(a, b, progress, buffers):
+    """La imagen nueva entra por arriba empujando la anterior hacia abajo."""
+    height = a.shape[0]
+    shift = _shift(height, progress)
+    out = buffers.out
+    out[shift:] = a[:height - shift]
+    out[:shift] = b[height - shift:]
+    return out
+
+
+@register_transition('wipe_left')
+def wipe_left(a, b, progress, buffers):
+    """La imagen nueva se descubre de derecha a izquierda sin moverse."""
+    width = a.shape[1]
+    edge = width - _shift(width, progress)
+    out = buffers.out
+    out[:, :edge] = a[:, :edge]
+    out[:, edge:] = b[:, edge:]
+    return out
+
+
+@register_transition('wipe_right')
+def wipe_right(a, b, progress, buffers):
+    """La imagen nueva se descubre de izquierda a derecha sin moverse."""
+    width = a.shape[1]
+    edge = _shift(width, progress)
+    out = buffers.out
+    out[:, :edge] = b[:, :edge]
+    out[:, edge:] = a[:, edge:]
+    return out
+
+
+# Tablas de índices para el zoom, por (alto, ancho, escala cuantizada)
+_zoom_index_cache = {}
+
+# Aumento máximo de la imagen saliente en la transición zoom
+ZOOM_MAX_SCALE = 1.3
+
+
+def _zoom_indices(height: int, width: int, factor: float) -> tuple[np.ndarray, np.ndarray]:
+    """Índices de filas/columnas (vecino más cercano) para ampliar desde el centro."""
+    key = (height, width, round(factor, 3))
+    if key not in _zoom_index_cache:
+        rows = ((np.arange(height) - height / 2) / factor + height / 2).astype(np.intp)
+        cols = ((np.arange(width) - width / 2) / factor + width / 2).astype(np.intp)
+        _zoom_index_cache[key] = (np.clip(rows, 0, height - 1), np.clip(cols, 0, width - 1))
+    return _zoom_index_cache[key]
+
+
+@register_transition('zoom')
+def zoom(a, b, progress, buffers):
+    """La imagen anterior se amplía desde el centro mientras se funde con la nueva."""
+    rows, cols = _zoom_indices(a.shape[0], a.shape[1], 1 + (ZOOM_MAX_SCALE - 1) * progress)
+    # Dos gathers separables (filas y columnas) en lugar de indexación 2D
+    np.take(a, rows, axis=0, out=buffers.scratch)
+    np.take(buffers.scratch, cols, axis=1, out=buffers.out)
+    return blend(buffers.out, b, _alpha(progress), buffers)
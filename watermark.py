@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+Motor de marca de agua de audio.
+
+La marca de agua se repite cada `interval` segundos sobre la canción. El mp3 de
+la marca de agua se decodifica una sola vez por frecuencia de muestreo y queda
+residente como PCM float32 (se recarga si el archivo cambia en disco). La pista
+periódica se arma en NumPy a partir de ese PCM y se envía por stdin a ffmpeg,
+que solo la suma a la canción con un mezclador de 2 entradas: el grafo tiene
+siempre el mismo tamaño y ningún trabajo vuelve a decodificar la marca de agua.
+
+También se puede usar como CLI para procesar catálogos completos:
+
+    python watermark.py canciones/ -o previews/ --workers 4
+
+NumPy se importa recién al armar la pista, así que importar el módulo (desde
+la aplicación web) no lo carga.
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from media_probe import AUDIO_EXTENSIONS, probe_media
+
+if TYPE_CHECKING:
+    import numpy as np
+
+FFMPEG = shutil.which('ffmpeg')
+
+WATERMARK_FILE = Path(__file__).parent / 'marca_agua.mp3'
+
+# Frecuencias de muestreo que se precargan al iniciar
+PRELOAD_SAMPLE_RATES = (44100, 48000)
+
+# Muestras por bloque al enviar la pista de marca de agua a ffmpeg
+TRACK_CHUNK_SAMPLES = 1 << 16
+
+# Bytes máximos por bloque al transmitir el mp3 mientras se codifica
+STREAM_CHUNK_BYTES = 1 << 14
+
+# Bitrate constante al transmitir: un mp3 VBR escrito a un pipe queda sin
+# cabecera Xing y los reproductores calculan mal su duración
+STREAM_BITRATE = '192k'
+
+# Archivos procesados en paralelo (cada uno lanza sus propios procesos de ffmpeg)
+WATERMARK_WORKERS = int(os.environ.get('WATERMARK_WORKERS', max(2, multiprocessing.cpu_count())))
+
+# PCM de la marca de agua: (ruta, frecuencia) -> (mtime_ns, tamaño, muestras)
+_pcm_cache = {}
+_pcm_lock = threading.Lock()
+
+
+def watermark_pcm(watermark_path: str, sample_rate: int) -> np.ndarray:
+    """
+    Marca de agua decodificada a PCM float32 mono en `sample_rate`.
+
+    Se decodifica una sola vez por frecuencia y se reutiliza mientras el
+    archivo en disco no cambie (mtime y tamaño).
+    """
+    import numpy as np
+
+    stat = os.stat(watermark_path)
+    key = (str(watermark_path), sample_rate)
+    with _pcm_lock:
+        entry = _pcm_cache.get(key)
+        if entry and entry[:2] == (stat.st_mtime_ns, stat.st_size):
+            return entry[2]
+
+        result = subprocess.run(
+            [FFMPEG, '-v', 'error', '-i', str(watermark_path),
+             '-f', 'f32le', '-ac', '1', '-ar', str(sample_rate), '-'],
+            capture_output=True, timeout=60, check=True
+        )
+        samples = np.frombuffer(result.stdout, dtype=np.float32)
+        _pcm_cache[key] = (stat.st_mtime_ns, stat.st_size, samples)
+        return samples
+
+
+def preload_watermark(watermark_path: str = str(WATERMARK_FILE),
+                      sample_rates: tuple[int, ...] = PRELOAD_SAMPLE_RATES) -> None:
+    """Decodifica la marca de agua para las frecuencias más comunes."""
+    for sample_rate in sample_rates:
+        watermark_pcm(watermark_path, sample_rate)
+
+
+def watermark_track(samples: np.ndarray, period: int, count: int, volume: float,
+                    chunk: int = TRACK_CHUNK_SAMPLES):
+    """
+    Genera por bloques la pista periódica de marca de agua (float32).
+
+    La marca de agua empieza cada `period` muestras, `count` veces; si dura más
+    que el periodo, las copias se superponen y se suman.
+    """
+    import numpy as np
+
+    length = len(samples)
+    total = (count - 1) * period + length
+    for start in range(0, total, chunk):
+        end = min(total, start + chunk)
+        block = np.zeros(end - start, dtype=np.float32)
+        first = max(0, (start - length) // period)
+        last = min(count - 1, (end - 1) // period)
+        for copy in range(first, last + 1):
+            offset = copy * period
+            lo, hi = max(start, offset), min(end, offset + length)
+            if lo < hi:
+                block[lo - start:hi - start] += samples[lo - offset:hi - offset]
+        block *= volume
+        yield block
+
+
+def probe_audio(path: str) -> dict:
+    """Duración (s), frecuencia de muestreo y canales del primer stream de audio."""
+    info = probe_media(path)
+    if not info['sample_rate']:
+        raise ValueError(f'El archivo no tiene audio: {path}')
+    return {
+        'duration': info['duration'],
+        'sample_rate': info['sample_rate'],
+        'channels': info['channels'] or 1,
+    }
+
+
+def trimmed_duration(duration: float, trim: int) -> float:
+    """Duración de la salida: la canción recortada a `trim` segundos (0 = completa)."""
+    return min(duration, float(trim)) if trim > 0 else duration
+
+
+def start_mix(input_path: str, watermark_path: str, output: str, interval: float, volume: float,
+              duration: float, sample_rate: int, stderr,
+              channels: int = 1) -> tuple[subprocess.Popen, threading.Thread]:
+    """
+    Lanza la mezcla de ffmpeg y un hilo que le envía la pista de marca de agua por stdin.
+
+    La canción se recorta a `duration` segundos en la misma pasada. Si `output`
+    es 'pipe:1', el mp3 se escribe en el stdout del proceso a medida que se codifica.
+    La pista se envía con los `channels` de la canción (la marca de agua mono
+    repetida en cada canal) y la salida se fija en esos canales (el mp3 admite
+    hasta 2), así la mezcla conserva el layout de la canción.
+    """
+    import numpy as np
+
+    count = max(1, int(duration // interval))
+    samples = watermark_pcm(watermark_path, sample_rate)
+    period = int(round(interval * sample_rate))
+
+    ffmpeg_cmd = [
+        FFMPEG,
+        '-y',
+        '-t', str(duration),
+        '-i', input_path,
+        '-f', 'f32le', '-ar', str(sample_rate), '-ac', str(channels), '-i', 'pipe:0',
+        '-filter_complex', '[0:a][1:a]amix=inputs=2:duration=first:dropout_transition=0:normalize=0[out]',
+        '-map', '[out]',
+        '-ac', str(min(channels, 2)),
+        '-c:a', 'libmp3lame',
+    ]
+    if output == 'pipe:1':
+        ffmpeg_cmd += ['-b:a', STREAM_BITRATE, '-f', 'mp3', '-flush_packets', '1']
+    else:
+        ffmpeg_cmd += ['-q:a', '2']
+    ffmpeg_cmd.append(output)
+
+    proc = subprocess.Popen(
+        ffmpeg_cmd, stdin=subprocess.PIPE, stderr=stderr,
+        stdout=subprocess.PIPE if output == 'pipe:1' else None
+    )
+
+    def feed_track():
+        try:
+            for block in watermark_track(samples, period, count, volume):
+                if channels > 1:
+                    # Muestras intercaladas: la misma muestra en cada canal
+                    block = np.repeat(block, channels)
+                proc.stdin.write(block.tobytes())
+        except (BrokenPipeError, ValueError):
+            # La canción terminó antes que la pista (amix duration=first) o se canceló
+            pass
+        finally:
+            try:
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    writer = threading.Thread(target=feed_track, daemon=True)
+    writer.start()
+    return proc, writer
+
+
+def read_stderr(stderr) -> str:
+    """Últimas líneas de error de ffmpeg guardadas en un archivo temporal."""
+    stderr.seek(0)
+    return stderr.read().decode(errors='replace')[-500:]
+
+
+def mix_watermark(input_path: str, watermark_path: str, output_path: str,
+                  interval: float, volume: float, duration: float, sample_rate: int,
+                  channels: int = 1) -> None:
+    """
+    Mezcla la marca de agua cada `interval` segundos en los primeros `duration`
+    segundos de la canción (la canción se recorta en la misma pasada).
+    """
+    # stderr a un archivo temporal: ffmpeg no se bloquea mientras se le escribe stdin
+    with tempfile.TemporaryFile() as stderr:
+        proc, writer = start_mix(input_path, watermark_path, output_path, interval, volume,
+                                 duration, sample_rate, stderr, channels)
+        writer.join()
+        returncode = proc.wait(timeout=600)
+        error = read_stderr(stderr)
+
+    if returncode != 0:
+        raise Exception(f'FFmpeg error: {error}')
+
+
+def stream_watermark(input_path: str, watermark_path: str, interval: float, volume: float,
+                     trim: int = 60, tee_path: str = None):
+    """
+    Igual que watermark_audio, pero genera el mp3 por bloques a medida que ffmpeg lo codifica.
+
+    Si se indica `tee_path`, los mismos bytes se guardan en disco para
+    descargarlos después. Si el consumidor deja de leer (cliente desconectado),
+    ffmpeg se detiene y el archivo parcial se elimina.
+    """
+    info = probe_audio(input_path)
+    duration = trimmed_duration(info['duration'], trim)
+
+    with tempfile.TemporaryFile() as stderr:
+        proc, writer = start_mix(input_path, watermark_path, 'pipe:1', interval, volume,
+                                 duration, info['sample_rate'], stderr, info['channels'])
+        tee = open(tee_path, 'wb') if tee_path else None
+        completed = False
+        try:
+            while True:
+                chunk = proc.stdout.read1(STREAM_CHUNK_BYTES)
+                if not chunk:
+                    break
+                if tee:
+                    tee.write(chunk)
+                yield chunk
+
+            writer.join()
+            if proc.wait(timeout=600) != 0:
+                raise Exception(f'FFmpeg error: {read_stderr(stderr)}')
+            completed = True
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            proc.stdout.close()
+            if tee:
+                tee.close()
+                if not completed:
+                    os.remove(tee_path)
+
+
+def watermark_audio(input_path: str, output_path: str, watermark_path: str,
+                    interval: float, volume: float, trim: int = 60, on_progress=None) -> None:
+    """
+    Aplica la marca de agua a una canción, recortándola a `trim` segundos (0 = completa).
+
+    El recorte se hace en la misma pasada de ffmpeg que la mezcla, sin archivos
+    intermedios. `on_progress(progress, message)` se llama en cada etapa si se indica.
+    """
+    def report(progress, message):
+        if on_progress:
+            on_progress(progress, message)
+
+    report(10, 'Obteniendo duración del audio...')
+    info = probe_audio(input_path)
+
+    # Recortar la canción si se especificó un límite
+    duration = trimmed_duration(info['duration'], trim)
+
+    # Pista de marca de agua desde el PCM residente (mezclador de 2 entradas)
+    report(30, 'Mezclando marca de agua...')
+    mix_watermark(input_path, watermark_path, output_path, interval, volume, duration,
+                  info['sample_rate'], info['channels'])
+
+
+def collect_audio_files(paths: list[str]) -> list[Path]:
+    """Expande carpetas a sus archivos de audio (ordenados) y conserva los archivos sueltos."""
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(p for p in path.iterdir() if p.suffix.lower() in AUDIO_EXTENSIONS))
+        else:
+            files.append(path)
+    return files
+
+
+def main():
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(
+        description="Aplica la marca de agua a una o varias canciones"
+    )
+    parser.add_argument(
+        "inputs",
+        nargs="+",
+        help="Archivos de audio o carpetas con canciones"
+    )
+    parser.add_argument(
+        "-o", "--output-dir",
+        default="watermarked",
+        help="Carpeta de salida (default: watermarked)"
+    )
+    parser.add_argument(
+        "-i", "--interval",
+        type=float,
+        default=10,
+        help="Segundos entre marcas de agua (default: 10)"
+    )
+    parser.add_argument(
+        "-v", "--volume",
+        type=float,
+        default=0.3,
+        help="Volumen de la marca de agua (default: 0.3)"
+    )
+    parser.add_argument(
+        "-t", "--trim",
+        type=int,
+        default=60,
+        help="Recortar cada canción a N segundos, 0 = completa (default: 60)"
+    )
+    parser.add_argument(
+        "-w", "--workers",
+        type=int,
+        default=WATERMARK_WORKERS,
+        help=f"Canciones procesadas en paralelo (default: {WATERMARK_WORKERS})"
+    )
+    parser.add_argument(
+        "--watermark",
+        default=str(WATERMARK_FILE),
+        help="Archivo de marca de agua (default: marca_agua.mp3)"
+    )
+
+    args = parser.parse_args()
+
+    files = collect_audio_files(args.inputs)
+    if not files:
+        print("Error: No se encontraron archivos de audio")
+        raise SystemExit(1)
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    start = time.time()
+    failed = 0
+
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = {}
+        for path in files:
+            output_path = output_dir / f'watermarked_{path.stem}.mp3'
+            future = executor.submit(
+                watermark_audio, str(path), str(output_path), args.watermark,
+                args.interval, args.volume, args.trim
+            )
+            futures[future] = path
+
+        for done, future in enumerate(as_completed(futures), 1):
+            path = futures[future]
+            try:
+                future.result()
+                print(f"[{done}/{len(files)}] {path.name}: OK")
+            except Exception as e:
+                failed += 1
+                print(f"[{done}/{len(files)}] {path.name}: Error: {e}")
+
+    print(f"{len(files) - failed} de {len(files)} canciones procesadas en {time.time() - start:.1f}s")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()